@@ -3,8 +3,6 @@ Figure 10A and 10B: tSNR and R-squared plots, respectively
 """
 
 # other 3rd party imports
-import subprocess
-import h5py
 import numpy as np
 import pandas as pd
 import scipy.stats as stats
@@ -13,6 +11,8 @@ import scipy.stats as stats
 from submm.constants import PATHS
 from submm.utils.plot_utils import bar_with_err
 from submm.utils.os_utils import savefig
+from submm.utils.metric_utils import load_signal_metrics
+from submm.utils.anova import run_anova
 
 # MPL imports
 import matplotlib
@@ -33,12 +33,7 @@ def load_tsnr(partition="VTC_lateral"):
         This is computed on stone and transferred over, not computed
             over vertices here. See analyses/02_tsnr .
     """
-
-    data_path = f"{PATHS['tsnr']}"
-    with h5py.File(data_path, "r") as f:
-        tsnr = f["tsnr_struct"][partition][:]
-
-    return tsnr
+    return load_signal_metrics()["tSNR"].sel(partition=partition).values
 
 
 def load_R2(partition="VTC_lateral"):
@@ -51,17 +46,7 @@ def load_R2(partition="VTC_lateral"):
             across the partition specified
 
     """
-
-    data_path = f"{PATHS['r2']}"
-    with h5py.File(data_path, "r") as f:
-        odd_r2 = f["r2_struct"]["odd"][partition][:] / 100.0  # convert back to fraction
-        even_r2 = f["r2_struct"]["even"][partition][:] / 100.0
-        stacked_r2 = np.stack((odd_r2, even_r2))[
-            :, :, :7
-        ]  # remove the 8th subject (3T data) if it exists
-        r2 = np.mean(stacked_r2, axis=0)
-
-    return r2
+    return load_signal_metrics()["R2"].sel(partition=partition).values
 
 
 def plot_vals(
@@ -176,12 +161,7 @@ def main():
         data = prepare_dataframe(lateral, medial)
 
         # call the R script
-        fpath = f"{PATHS['r_scripts']}/data/metrics_by_depth.csv"
-        data.to_csv(fpath)
-        subprocess.call(
-            f"Rscript --vanilla {PATHS['r_scripts']}/metrics_by_depth_script.r {fpath}",
-            shell=True,
-        )
+        run_anova(data, "metrics_by_depth")
 
     savefig(f"{PATHS['figures']}/figure_10ab_tsnr_r2.png")
     plt.close(fig)
@@ -1,13 +1,11 @@
 """
 Figure 10C: mean betas across categories and depths
 """
-import subprocess
 import argparse
 
 # Repo imports
 import numpy as np
 import pandas as pd
-import h5py
 from submm.constants import (
     PATHS,
     FSID_SESSIONS,
@@ -18,6 +16,9 @@ from submm.constants import (
 )
 from submm.utils.stats import sem
 from submm.utils.os_utils import mkdirquiet, savefig
+from submm.utils.metric_utils import load_metric_means
+from submm.utils.anova import run_anova
+from submm.utils.results_store import start_run
 
 # MPL imports
 import matplotlib
@@ -31,19 +32,21 @@ def load_means(
 ):
     """
     Retrieve metric means for the specified metric
-    """
-
-    data = np.zeros((len(FSID_SESSIONS), len(CONTRASTS), 3))
 
-    mm_path = PATHS["metric_means_r2control"] if r2_control else PATHS["metric_means"]
-    with h5py.File(mm_path, "r") as f:
-        for i, FSID_SESSION in enumerate(FSID_SESSIONS):
-            for j, contrast in enumerate(CONTRASTS):
-                data[i, j, :] = f["means"][FSID_SESSION]["GLM_vanilla"][metric][
-                    partition
-                ][contrast][abs_string][:].squeeze()
+    The whole metric means file is read once (and cached) by load_metric_means, so
+    this only indexes into memory.
 
-    return data
+    Returns
+        data (n_sessions, n_contrasts, 3): sessions x categories x depths
+    """
+    means = load_metric_means(r2_control=r2_control)
+    return means.sel(
+        session=FSID_SESSIONS,
+        contrast=CONTRASTS,
+        metric=metric,
+        partition=partition,
+        abs=abs_string,
+    ).values
 
 
 def plot_means(ax, means, metric=""):
@@ -154,11 +157,7 @@ def main():
     )
 
     data = prepare_dataframe(lateral_betas, medial_betas)
-    fpath = f"{PATHS['r_scripts']}/data/raw_betas.csv"
-    data.to_csv(fpath)
-    subprocess.call(
-        f"Rscript --vanilla {PATHS['r_scripts']}/raw_betas_script.r {fpath}", shell=True
-    )
+    run_anova(data, "raw_betas")
 
     for abs_string in ["abs", "noabs"]:
         for metric in METRICS + ["beta"]:
@@ -180,4 +179,5 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--r2_control", action="store_true")
     ARGS, _ = parser.parse_known_args()
+    start_run(vars(ARGS))
     main()
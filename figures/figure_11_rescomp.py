@@ -5,14 +5,14 @@ Figure 11: RDMs and fits for different resolutions
 import numpy as np
 import pandas as pd
 
-# python imports
-import subprocess
-
 # module imports
 from submm.constants import PATHS, PARTITIONS, PARTITION_COLORS
-from submm.utils.rsm_utils import load_rsms, fit_rdm, get_lower_tri
+from submm.utils.designs import get_design
+from submm.utils.rsm_utils import load_rsms, fit_rdms, get_lower_tri
 from submm.utils.os_utils import savefig
 from submm.utils.plot_utils import bar_with_err, blueblackred
+from submm.utils.disk_cache import disk_cached
+from submm.utils.anova import run_anovas, print_anova
 
 # MPL imports
 import matplotlib
@@ -21,31 +21,6 @@ matplotlib.use("Agg")
 import matplotlib.pyplot as plt  # noqa:E402
 
 
-def build_regressors(add_intercept=True):
-    """
-    Provides regressor matrix for linear fits
-    """
-    regressor_indices = [
-        np.repeat(np.arange(5), 6),  # domains
-        np.repeat(np.arange(10), 3),  # categories
-        np.tile(np.arange(3), 10),  # depths
-    ]
-
-    regressors = []
-    for indices in regressor_indices:
-        base = np.zeros((30, 30))
-        xx, yy = np.meshgrid(indices, indices)
-        base[xx == yy] = 1
-
-        regressors.append(get_lower_tri(1 - base, with_diagonal=True))
-
-    if add_intercept:
-        ones_matrix = np.ones((30, 30))
-        regressors.append(get_lower_tri(ones_matrix, with_diagonal=True))
-
-    return np.array(regressors)
-
-
 def plot_partition_weights(axes, partition_weights):
     """
     Produces plot showing fit betas for each partition across subjects
@@ -105,23 +80,26 @@ def plot_beta_scatter(ax, partition_weights):
     ax.set_ylabel(r"$\beta_{Domains}$")
 
 
+@disk_cached(
+    "figure_11_partition_weights",
+    files=lambda args: [PATHS["rsms"]],
+    depends_on=[
+        "submm.utils.rsm_utils",
+        "submm.utils.rsm_cube",
+        "submm.utils.designs",
+        "submm.utils.labelled",
+    ],
+)
 def get_partition_weights(thresh="thr_75", glm_dir="GLM_vanilla", noise_type="none"):
     rsms = load_rsms(thresh=thresh, glm_dir=glm_dir, noise_type=noise_type)
     rdms = {partition: 1 - x for (partition, x) in rsms.items()}
-    regressors = build_regressors()
+    regressors = get_design(30, with_diagonal=True)
 
     # fit domain, category, and depth weights to each rdm
     partition_weights = {}
     for partition in PARTITIONS:
-        partition_rdms = rdms[partition]
-
-        weights_list = []
-        for rdm in partition_rdms:
-            lower_tri_rdm = get_lower_tri(rdm, with_diagonal=True)
-            weights = fit_rdm(lower_tri_rdm, regressors, method="lsq")
-            weights_list.append(weights)
-
-        partition_weights[partition] = np.stack(weights_list)
+        lower_tri_rdms = get_lower_tri(rdms[partition], with_diagonal=True)
+        partition_weights[partition] = fit_rdms(lower_tri_rdms, regressors)
 
     return partition_weights, rdms
 
@@ -211,19 +189,6 @@ def prepare_dataframe(partition_weight_dict):
     return pd.DataFrame(data=data)
 
 
-def run_ANOVA(partition_weight_dict, key1, key2):
-    hires_lowres_dict = {
-        key1: partition_weight_dict[key1],
-        key2: partition_weight_dict[key2],
-    }
-    data = prepare_dataframe(hires_lowres_dict)
-    fpath = f"{PATHS['r_scripts']}/data/rescomp.csv"
-    data.to_csv(fpath)
-    subprocess.call(
-        f"Rscript --vanilla {PATHS['r_scripts']}/rescomp_script.r {fpath}", shell=True
-    )
-
-
 def do_stats(partition_weight_dict):
     """
     Conducts two ANOVAs with
@@ -236,11 +201,22 @@ def do_stats(partition_weight_dict):
         1. Data sources are hi-res and low-res
         2. Data sources are hi-res and low-res with noise
     """
-    print("~~~~~~~~~~~~~~~~0.8mm vs. 2.4mm~~~~~~~~~~~~~~~")
-    run_ANOVA(partition_weight_dict, "high_resolution", "low_resolution")
+    comparisons = {
+        "0.8mm vs. 2.4mm": ("high_resolution", "low_resolution"),
+        "0.8mm vs. 2.4mm+noise": ("high_resolution", "low_resolution_noise"),
+    }
+    jobs = [
+        (
+            prepare_dataframe({key: partition_weight_dict[key] for key in keys}),
+            "rescomp",
+        )
+        for keys in comparisons.values()
+    ]
 
-    print("~~~~~~~~~~~~~~~~0.8mm vs. 2.4mm+noise~~~~~~~~~~~~~~~")
-    run_ANOVA(partition_weight_dict, "high_resolution", "low_resolution_noise")
+    # both ANOVAs are fit at once, then printed in order
+    for description, result in zip(comparisons, run_anovas(jobs)):
+        print(f"~~~~~~~~~~~~~~~~{description}~~~~~~~~~~~~~~~")
+        print_anova(result)
 
 
 def main():
@@ -6,9 +6,11 @@ Figure 12: Comparison of different GLM metrics
 import numpy as np
 
 from submm.constants import PATHS, PARTITION_COLORS
-from submm.utils.rsm_utils import load_rsms, fit_rdm, get_lower_tri
+from submm.utils.designs import get_design
+from submm.utils.rsm_utils import load_rsms, fit_rdms, get_lower_tri
 import submm.utils.plot_utils as plot_utils
 from submm.utils.os_utils import mkdirquiet, savefig
+from submm.utils.disk_cache import disk_cached
 
 # MPL imports
 import matplotlib
@@ -18,47 +20,23 @@ import matplotlib.pyplot as plt  # noqa:E402
 import matplotlib.cm  # noqa:E402
 
 
-def build_regressors(add_intercept=True):
-    """
-    Provides regressor matrix for linear fits
-    """
-    regressor_indices = [
-        np.repeat(np.arange(5), 6),  # domains
-        np.repeat(np.arange(10), 3),  # categories
-        np.tile(np.arange(3), 10),  # depths
-    ]
-
-    regressors = []
-    for indices in regressor_indices:
-        base = np.zeros((30, 30))
-        xx, yy = np.meshgrid(indices, indices)
-        base[xx == yy] = 1
-
-        regressors.append(get_lower_tri(1 - base, with_diagonal=True))
-
-    if add_intercept:
-        ones_matrix = np.ones((30, 30))
-        regressors.append(get_lower_tri(ones_matrix, with_diagonal=True))
-
-    return np.array(regressors)
-
-
+@disk_cached(
+    "figure_12_partition_weights",
+    depends_on=[
+        "submm.utils.rsm_utils",
+        "submm.utils.designs",
+        "submm.utils.labelled",
+    ],
+)
 def get_partition_weights(rsms):
     rdms = {partition: 1 - x for (partition, x) in rsms.items()}
-    regressors = build_regressors()
+    regressors = get_design(30, with_diagonal=True)
 
     # fit domain, category, and depth weights to each rdm
     partition_weights = {}
     for partition in ["VTC_lateral", "VTC_medial"]:
-        partition_rdms = rdms[partition]
-
-        weights_list = []
-        for rdm in partition_rdms:
-            lower_tri_rdm = get_lower_tri(rdm, with_diagonal=True)
-            weights = fit_rdm(lower_tri_rdm, regressors, method="lsq")
-            weights_list.append(weights)
-
-        partition_weights[partition] = np.stack(weights_list)
+        lower_tri_rdms = get_lower_tri(rdms[partition], with_diagonal=True)
+        partition_weights[partition] = fit_rdms(lower_tri_rdms, regressors)
 
     return partition_weights
 
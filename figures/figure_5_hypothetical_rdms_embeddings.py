@@ -7,6 +7,7 @@ import numpy as np
 
 from submm.constants import PATHS, DPI
 import submm.utils.plot_utils as plot_utils
+from submm.utils.designs import get_layout
 
 import matplotlib
 
@@ -51,9 +52,10 @@ def main():
     """
     Entry point for script
     """
-    depths = np.tile(np.arange(3), 10)
-    domains = np.repeat(np.arange(5), 6)
-    categories = np.repeat(np.arange(10), 3)
+    layout = get_layout()
+    depths = layout.depth_labels
+    domains = layout.domain_labels
+    categories = layout.category_labels
 
     # choose amount of noise to prevent points from perfectly overlapping
     levels = [
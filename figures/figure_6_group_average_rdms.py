@@ -10,6 +10,7 @@ from submm.constants import PATHS
 from submm.utils.rsm_utils import load_rsms
 import submm.utils.plot_utils as plot_utils
 from submm.utils.os_utils import mkdirquiet, savefig
+from submm.utils.disk_cache import disk_cached
 
 # MPL imports
 import matplotlib
@@ -19,6 +20,7 @@ import matplotlib.pyplot as plt  # noqa:E402
 import matplotlib.cm  # noqa:E402
 
 
+@disk_cached("figure_6_mds_anchor", libraries=["sklearn"])
 def get_MDS_anchor(rsms, partition="VTC_lateral", participant_idx=0):
     """
     Indicates with partition and subject to use as the "anchor" to align
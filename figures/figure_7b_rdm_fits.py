@@ -8,14 +8,24 @@ from tabulate import tabulate  # noqa:E401
 
 # python imports
 import argparse
-import subprocess
 
 # module imports
 from submm.constants import PATHS, PARTITIONS, PARTITION_COLORS, PRIMARY_METRIC
-from submm.utils.rsm_utils import load_rsms, fit_rdm, get_lower_tri
+from submm.utils.designs import get_design
+from submm.utils.rsm_utils import (
+    load_rsms,
+    fit_rdms,
+    get_lower_tri,
+    stack_fit_statistics,
+)
 from submm.utils.stats import sem
+from submm.utils.bootstrap import bootstrap_ci
+from submm.utils.noise_ceiling import NOISE_CEILING_STATISTICS, with_noise_ceiling
 from submm.utils.os_utils import mkdirquiet, savefig
 from submm.utils.plot_utils import bar_with_err
+from submm.utils.disk_cache import disk_cached
+from submm.utils.anova import run_anovas, print_anova
+from submm.utils.results_store import start_run, record_result
 
 # MPL imports
 import matplotlib
@@ -24,31 +34,6 @@ matplotlib.use("Agg")
 import matplotlib.pyplot as plt  # noqa:E402
 
 
-def build_regressors(add_intercept=True):
-    """
-    Provides regressor matrix for linear fits
-    """
-    regressor_indices = [
-        np.repeat(np.arange(5), 6),  # domains
-        np.repeat(np.arange(10), 3),  # categories
-        np.tile(np.arange(3), 10),  # depths
-    ]
-
-    regressors = []
-    for indices in regressor_indices:
-        base = np.zeros((30, 30))
-        xx, yy = np.meshgrid(indices, indices)
-        base[xx == yy] = 1
-
-        regressors.append(get_lower_tri(1 - base, with_diagonal=True))
-
-    if add_intercept:
-        ones_matrix = np.ones((30, 30))
-        regressors.append(get_lower_tri(ones_matrix, with_diagonal=True))
-
-    return np.array(regressors)
-
-
 def plot_partition_weights(axes, partition_weights):
     """
     Produces plot showing fit betas for each partition across subjects
@@ -131,6 +116,19 @@ def plot_beta_scatter(ax, partition_weights):
     ax.set_ylim([0, ax.get_ylim()[1]])
 
 
+@disk_cached(
+    "figure_7b_partition_weights",
+    files=lambda args: [
+        PATHS["rsms_r2_control"] if args["r2_control"] else PATHS["rsms"]
+    ],
+    depends_on=[
+        "submm.utils.rsm_utils",
+        "submm.utils.rsm_cube",
+        "submm.utils.designs",
+        "submm.utils.labelled",
+        "submm.utils.noise_ceiling",
+    ],
+)
 def get_partition_weights(
     thresh="thr_75",
     glm_dir="GLM_vanilla",
@@ -146,22 +144,21 @@ def get_partition_weights(
         noise_type=noise_type,
     )
     rdms = {partition: 1 - x for (partition, x) in rsms.items()}
-    regressors = build_regressors()
+    regressors = get_design(30, with_diagonal=True)
 
     # fit domain, category, and depth weights to each rdm
-    partition_weights = {}
+    partition_fits, lower_tri_rdms = {}, {}
     for partition in PARTITIONS:
-        partition_rdms = rdms[partition]
-
-        weights_list = []
-        for rdm in partition_rdms:
-            lower_tri_rdm = get_lower_tri(rdm, with_diagonal=True)
-            weights = fit_rdm(lower_tri_rdm, regressors, method="lsq")
-            weights_list.append(weights)
-
-        partition_weights[partition] = np.stack(weights_list)
+        lower_tri_rdms[partition] = get_lower_tri(rdms[partition], with_diagonal=True)
+        partition_fits[partition] = fit_rdms(
+            lower_tri_rdms[partition], regressors, return_fit=True
+        )
 
-    return partition_weights
+    partition_weights = {
+        partition: fit.weights for (partition, fit) in partition_fits.items()
+    }
+    fit_statistics = stack_fit_statistics(partition_fits)
+    return partition_weights, with_noise_ceiling(fit_statistics, lower_tri_rdms)
 
 
 def make_plots(partition_weights, save_dir):
@@ -258,10 +255,18 @@ def print_partition_weight_table(partition_weights):
 
         row = [partition_name]
         headers = ["ROI", "Domain", "Category", "Depth", "Intercept"]
-        for mn, se in zip(mean_across_subjects, sem_across_subjects):
+        for regressor, mn, se in zip(
+            headers[1:], mean_across_subjects, sem_across_subjects
+        ):
             row.append(
                 f"{mn:.5f} \u00B1 {se:.5f}"
             )  # u00B1 is the unicode symbol for +/-
+            record_result(
+                "mean_sem",
+                {"mean": mn, "sem": se},
+                label=f"{regressor} weight",
+                partition=partition_name,
+            )
 
         table_rows.append(row)
 
@@ -287,40 +292,26 @@ def do_stats(partition_weights):
     # make table of weights by partition (for Kalanit)
     print_partition_weight_table(partition_weights)
 
-    # ANOVA 1: Raw weights
-    decorated_box(description="Domain, Category, Depth: All ROIs")
-    data = prepare_dataframe(partition_weights, regressor_indices=[0, 1, 2])
-    # call the R script
-    fpath = f"{PATHS['r_scripts']}/data/rdm_fit_weights.csv"
-    data.to_csv(fpath)
-    subprocess.call(
-        f"Rscript --vanilla {PATHS['r_scripts']}/rdm_fit_weights_script.r {fpath}",
-        shell=True,
-    )
-
-    # ANOVA 2: Raw weights (domain and category only)
-    decorated_box(description="Domain, Category only: All ROIs")
-    data = prepare_dataframe(partition_weights, regressor_indices=[0, 1])
-    # call the R script
-    fpath = f"{PATHS['r_scripts']}/data/rdm_fit_weights.csv"
-    data.to_csv(fpath)
-    subprocess.call(
-        f"Rscript --vanilla {PATHS['r_scripts']}/rdm_fit_weights_script.r {fpath}",
-        shell=True,
-    )
+    anovas = {
+        # ANOVA 1: Raw weights
+        "Domain, Category, Depth: All ROIs": prepare_dataframe(
+            partition_weights, regressor_indices=[0, 1, 2]
+        ),
+        # ANOVA 2: Raw weights (domain and category only)
+        "Domain, Category only: All ROIs": prepare_dataframe(
+            partition_weights, regressor_indices=[0, 1]
+        ),
+        # ANOVA 3: Raw weights, lateral and medial only, domain and category only
+        "Domain, Category: VTC_lateral and VTC_medial": prepare_dataframe(
+            partition_weights, regressor_indices=[0, 1], roi_indices=[0, 1]
+        ),
+    }
 
-    # ANOVA 3: Raw weights, lateral and medial only, domain and category only
-    decorated_box(description="Domain, Category: VTC_lateral and VTC_medial")
-    data = prepare_dataframe(
-        partition_weights, regressor_indices=[0, 1], roi_indices=[0, 1]
-    )
-    # call the R script
-    fpath = f"{PATHS['r_scripts']}/data/rdm_fit_weights.csv"
-    data.to_csv(fpath)
-    subprocess.call(
-        f"Rscript --vanilla {PATHS['r_scripts']}/rdm_fit_weights_script.r {fpath}",
-        shell=True,
-    )
+    # fit all three at once, then print them in order
+    jobs = [(data, "rdm_fit_weights") for data in anovas.values()]
+    for description, result in zip(anovas, run_anovas(jobs)):
+        decorated_box(description=description)
+        print_anova(result)
 
 
 def main():
@@ -341,7 +332,24 @@ def main():
     # do the RDM fits and get weights and variance explained for each RDM in
     # each partition
     args_kv_pairs = vars(ARGS)
-    partition_weights = get_partition_weights(**args_kv_pairs)
+    partition_weights, fit_statistics = get_partition_weights(**args_kv_pairs)
+
+    r2 = fit_statistics.sel(statistic="r2")
+    r2_ci = bootstrap_ci(r2, axis=-1)
+    ceiling = fit_statistics.sel(statistic=NOISE_CEILING_STATISTICS)
+    print(
+        "Variance explained (R^2) across subjects [95% BCa bootstrap CI], "
+        "noise ceiling (lower - upper):"
+    )
+    for partition in PARTITIONS:
+        x = r2.sel(partition=partition)
+        low = r2_ci.low.sel(partition=partition)
+        high = r2_ci.high.sel(partition=partition)
+        ceiling_low, ceiling_high = np.mean(ceiling.sel(partition=partition), axis=1)
+        print(
+            f"{partition}: {np.mean(x):.3f} +/- {sem(x):.3f} [{low:.3f}, {high:.3f}], "
+            f"noise ceiling {ceiling_low:.3f} - {ceiling_high:.3f}"
+        )
 
     # make and save plots
     make_plots(partition_weights, save_dir)
@@ -366,4 +374,5 @@ if __name__ == "__main__":
     )
     parser.add_argument("--r2_control", action="store_true")
     ARGS, _ = parser.parse_known_args()
+    start_run(vars(ARGS))
     main()
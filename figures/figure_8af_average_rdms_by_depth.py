@@ -35,9 +35,7 @@ def main():
         print(f"Plotting metric: {metric}")
         rsms = load_rsms(metric=metric)
         mean_rdms_by_depth = {
-            partition: np.mean(
-                [1 - split_by_depth(rsm) for rsm in partition_rsms], axis=0
-            )
+            partition: np.mean(1 - split_by_depth(partition_rsms), axis=0)
             for (partition, partition_rsms) in rsms.items()
         }
 
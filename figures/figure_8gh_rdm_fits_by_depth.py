@@ -7,14 +7,29 @@ import pandas as pd
 
 # python imports
 import argparse
-import subprocess
 
 # module imports
 from submm.constants import PATHS, PARTITION_COLORS, PARTITION_NAMES, PARTITIONS
-from submm.utils.rsm_utils import load_rsms, fit_rdm, get_lower_tri, split_by_depth
-from submm.utils.stats import sem, report_ttest_2_sample, report_ttest_1_sample
+from submm.utils.designs import get_design
+from submm.utils.rsm_utils import (
+    load_rsms,
+    fit_rdms,
+    get_lower_tri,
+    split_by_depth,
+    stack_fit_statistics,
+)
+from submm.utils.stats import (
+    sem,
+    report_ttest_2_sample,
+    report_ttest_1_sample,
+)
+from submm.utils.bootstrap import bootstrap_ci
+from submm.utils.noise_ceiling import NOISE_CEILING_STATISTICS, with_noise_ceiling
 from submm.utils.os_utils import mkdirquiet, savefig
 from submm.utils.plot_utils import bar_with_err
+from submm.utils.disk_cache import disk_cached
+from submm.utils.anova import run_anova
+from submm.utils.results_store import start_run
 
 # MPL imports
 import matplotlib
@@ -23,30 +38,6 @@ matplotlib.use("Agg")
 import matplotlib.pyplot as plt  # noqa:E402
 
 
-def build_regressors(add_intercept=True):
-    """
-    Provides regressor matrix for linear fits
-    """
-    regressor_indices = [
-        np.repeat(np.arange(5), 2),  # domains
-        np.arange(10),  # categories
-    ]
-
-    regressors = []
-    for indices in regressor_indices:
-        base = np.zeros((10, 10))
-        xx, yy = np.meshgrid(indices, indices)
-        base[xx == yy] = 1
-
-        regressors.append(get_lower_tri(1 - base, with_diagonal=True))
-
-    if add_intercept:
-        ones_matrix = np.ones((10, 10))
-        regressors.append(get_lower_tri(ones_matrix, with_diagonal=True))
-
-    return np.array(regressors)
-
-
 def plot_partition_weights(axes, partition_weights):
     """
     Produces plot showing fit betas for each partition across subjects
@@ -159,6 +150,19 @@ def plot_beta_scatter(ax, partition_weights):
     ax.set_ylabel(r"$\beta_{Domains}$")
 
 
+@disk_cached(
+    "figure_8gh_partition_weights",
+    files=lambda args: [
+        PATHS["rsms_r2_control"] if args["r2_control"] else PATHS["rsms"]
+    ],
+    depends_on=[
+        "submm.utils.rsm_utils",
+        "submm.utils.rsm_cube",
+        "submm.utils.designs",
+        "submm.utils.labelled",
+        "submm.utils.noise_ceiling",
+    ],
+)
 def get_partition_weights(
     thresh="thr_75", glm_dir="GLM_vanilla", r2_control=False, noise_type="none"
 ):
@@ -166,28 +170,26 @@ def get_partition_weights(
         thresh=thresh, glm_dir=glm_dir, r2_control=r2_control, noise_type=noise_type
     )
     rdms_by_depth = {
-        partition: np.array([1 - split_by_depth(rsm) for rsm in partition_rsms])
+        partition: 1 - split_by_depth(partition_rsms)
         for (partition, partition_rsms) in rsms.items()
     }
-    regressors = build_regressors()
+    regressors = get_design(10, with_diagonal=True)
 
-    partition_weights = {}
+    # fit all subjects and depths at once: (subjects x depths x cells) -> weights
+    partition_fits, lower_tri_rdms = {}, {}
     for partition in PARTITIONS:
-        partition_rdms = rdms_by_depth[partition]
-        subject_weights = []
-        for subject_rdms in partition_rdms:
-            depth_weights = []
-            for depth_rdm in subject_rdms:
-                weights = fit_rdm(
-                    get_lower_tri(depth_rdm, with_diagonal=True),
-                    regressors,
-                    method="lsq",
-                )
-                depth_weights.append(weights)
-            subject_weights.append(np.stack(depth_weights))
-        partition_weights[partition] = np.stack(subject_weights)
+        lower_tri_rdms[partition] = get_lower_tri(
+            rdms_by_depth[partition], with_diagonal=True
+        )
+        partition_fits[partition] = fit_rdms(
+            lower_tri_rdms[partition], regressors, return_fit=True
+        )
 
-    return partition_weights
+    partition_weights = {
+        partition: fit.weights for (partition, fit) in partition_fits.items()
+    }
+    fit_statistics = stack_fit_statistics(partition_fits)
+    return partition_weights, with_noise_ceiling(fit_statistics, lower_tri_rdms)
 
 
 def make_plots(partition_weights, save_dir):
@@ -373,28 +375,25 @@ def do_stats_slopes(partition_weights):
 
     # normal t-tests
     print("Lateral slope vs. Medial slope")
-    report_ttest_2_sample(lateral_data.slopes, medial_data.slopes)
+    report_ttest_2_sample(
+        lateral_data.slopes, medial_data.slopes, label="Lateral slope vs. Medial slope"
+    )
 
     # normal t-tests against 0
     print("lateral domain slopes")
-    report_ttest_1_sample(lateral_domain_data.slopes)
+    report_ttest_1_sample(lateral_domain_data.slopes, label="lateral domain slopes")
 
     print("medial domain slopes")
-    report_ttest_1_sample(medial_domain_data.slopes)
+    report_ttest_1_sample(medial_domain_data.slopes, label="medial domain slopes")
 
     print("lateral category slopes")
-    report_ttest_1_sample(lateral_category_data.slopes)
+    report_ttest_1_sample(lateral_category_data.slopes, label="lateral category slopes")
 
     print("medial category slopes")
-    report_ttest_1_sample(medial_category_data.slopes)
+    report_ttest_1_sample(medial_category_data.slopes, label="medial category slopes")
 
     # call the R script
-    fpath = f"{PATHS['r_scripts']}/data/rdm_fit_slopes.csv"
-    data.to_csv(fpath)
-    subprocess.call(
-        f"Rscript --vanilla {PATHS['r_scripts']}/rdm_fit_slopes_script.r {fpath}",
-        shell=True,
-    )
+    run_anova(data, "rdm_fit_slopes")
 
 
 def do_stats_diffs(partition_weights):
@@ -407,39 +406,35 @@ def do_stats_diffs(partition_weights):
 
     # normal t-tests
     print("Lateral diffs vs. Medial diffs")
-    report_ttest_2_sample(lateral_data.diffs, medial_data.diffs)
+    report_ttest_2_sample(
+        lateral_data.diffs, medial_data.diffs, label="Lateral diffs vs. Medial diffs"
+    )
     print("Lateral diffs vs. hOc1 diffs")
-    report_ttest_2_sample(lateral_data.diffs, hOc1_data.diffs)
+    report_ttest_2_sample(
+        lateral_data.diffs, hOc1_data.diffs, label="Lateral diffs vs. hOc1 diffs"
+    )
     print("Medial diffs vs. hOc1 diffs")
-    report_ttest_2_sample(medial_data.diffs, hOc1_data.diffs)
+    report_ttest_2_sample(
+        medial_data.diffs, hOc1_data.diffs, label="Medial diffs vs. hOc1 diffs"
+    )
 
     # normal t-tests against 0
     print("lateral diffs")
-    report_ttest_1_sample(lateral_data.diffs)
+    report_ttest_1_sample(lateral_data.diffs, label="lateral diffs")
     print("medial diffs")
-    report_ttest_1_sample(medial_data.diffs)
+    report_ttest_1_sample(medial_data.diffs, label="medial diffs")
     print("hOc1 diffs")
-    report_ttest_1_sample(hOc1_data.diffs)
+    report_ttest_1_sample(hOc1_data.diffs, label="hOc1 diffs")
 
     # call the R script
-    fpath = f"{PATHS['r_scripts']}/data/rdm_fit_diffs.csv"
-    data.to_csv(fpath)
-    subprocess.call(
-        f"Rscript --vanilla {PATHS['r_scripts']}/rdm_fit_diffs_script.r {fpath}",
-        shell=True,
-    )
+    run_anova(data, "rdm_fit_diffs")
 
 
 def do_stats_betas(partition_weights):
     data = prepare_dataframe_betas(partition_weights)
 
     # call the R script
-    fpath = f"{PATHS['r_scripts']}/data/rdm_fits_by_depth.csv"
-    data.to_csv(fpath)
-    subprocess.call(
-        f"Rscript --vanilla {PATHS['r_scripts']}/rdm_fits_by_depth_script.r {fpath}",
-        shell=True,
-    )
+    run_anova(data, "rdm_fits_by_depth")
 
 
 def do_stats(partition_weights):
@@ -462,7 +457,28 @@ def main():
 
     # do the RDM fits and get weights and variance explained for each partition RDM
     args_kv_pairs = vars(ARGS)
-    partition_weights = get_partition_weights(**args_kv_pairs)
+    partition_weights, fit_statistics = get_partition_weights(**args_kv_pairs)
+
+    # subjects are the first unlabelled axis, depths the second
+    r2 = fit_statistics.sel(statistic="r2")
+    r2_ci = bootstrap_ci(r2, axis=1)
+    ceiling = fit_statistics.sel(statistic=NOISE_CEILING_STATISTICS)
+    print(
+        "Variance explained (R^2) across subjects [95% BCa bootstrap CI], "
+        "noise ceiling (lower - upper):"
+    )
+    for partition in PARTITIONS:
+        x = r2.sel(partition=partition)
+        low = r2_ci.low.sel(partition=partition)
+        high = r2_ci.high.sel(partition=partition)
+        ceiling_low, ceiling_high = np.mean(ceiling.sel(partition=partition), axis=1)
+        for depth_idx, depth_name in enumerate(["superficial", "middle", "deep"]):
+            print(
+                f"{partition}, {depth_name}: {np.mean(x[:, depth_idx]):.3f} +/- "
+                f"{sem(x[:, depth_idx]):.3f} "
+                f"[{low[depth_idx]:.3f}, {high[depth_idx]:.3f}], noise ceiling "
+                f"{ceiling_low[depth_idx]:.3f} - {ceiling_high[depth_idx]:.3f}"
+            )
 
     # make and save plots
     make_plots(partition_weights, save_dir)
@@ -482,4 +498,5 @@ if __name__ == "__main__":
     )
     parser.add_argument("--r2_control", action="store_true")
     ARGS, _ = parser.parse_known_args()
+    start_run(vars(ARGS))
     main()
@@ -9,13 +9,15 @@ import pandas as pd
 
 # python imports
 import argparse
-import subprocess
 
 # module imports
 from submm.constants import PATHS, PARTITIONS, DOMAIN_COLORS
+from submm.utils.designs import get_layout
 from submm.utils.rsm_utils import load_rsms, split_by_depth
 from submm.utils.os_utils import savefig
 from submm.utils.plot_utils import bar_with_err
+from submm.utils.anova import run_anova
+from submm.utils.results_store import start_run
 
 # MPL imports
 import matplotlib
@@ -133,39 +135,28 @@ def prepare_dataframe(partition_weights, roi_indices=None):
 def get_partition_weights(glm_dir="GLM_vanilla", noise_type="none"):
     rsms = load_rsms(glm_dir=glm_dir, noise_type=noise_type)
     rdms_by_depth = {
-        partition: np.array([1 - split_by_depth(rsm) for rsm in partition_rsms])
+        partition: 1 - split_by_depth(partition_rsms)
         for (partition, partition_rsms) in rsms.items()
     }
 
-    # fit domain, category, and depth weights to each rdm
+    # for each domain, average the within-category (diagonal) and between-category
+    # (off-diagonal) entries of its block of the RDM at each depth
+    blocks = get_layout().single_depth().domain_blocks
+    n_per_block = blocks.shape[1]
+    off_diagonal = ~np.eye(n_per_block, dtype=bool)
+
     partition_weights = {}
     for partition in PARTITIONS:
+        # subjects x depths x domains x categories x categories
         partition_rdms = rdms_by_depth[partition]
-        subject_weights = []
-
-        for subject_rdms in partition_rdms:
-            depth_weights = []
-
-            for depth_rdm in subject_rdms:
-                domain_weights_list = []
+        domain_rdms = partition_rdms[..., blocks[:, :, None], blocks[:, None, :]]
 
-                for domain_idx in range(5):
-                    start = domain_idx * 2
-                    end = start + 2
-                    domain_rdm = depth_rdm[start:end, start:end]
+        within_category_mean = np.diagonal(domain_rdms, axis1=-2, axis2=-1).mean(-1)
+        between_category_mean = domain_rdms[..., off_diagonal].mean(-1)
 
-                    within_category_mean = np.mean((domain_rdm[0, 0], domain_rdm[1, 1]))
-                    between_category_mean = np.mean(
-                        (domain_rdm[0, 1], domain_rdm[1, 0])
-                    )
-
-                    domain_weights_list.append(
-                        [within_category_mean, between_category_mean]
-                    )
-
-                depth_weights.append(np.stack(domain_weights_list))
-            subject_weights.append(np.stack(depth_weights))
-        partition_weights[partition] = np.stack(subject_weights)
+        partition_weights[partition] = np.stack(
+            (within_category_mean, between_category_mean), axis=-1
+        )
 
     return partition_weights
 
@@ -199,12 +190,7 @@ def main():
     data = prepare_dataframe(partition_weights)
     # call the R script
 
-    fpath = f"{PATHS['r_scripts']}/data/fits_by_domain.csv"
-    data.to_csv(fpath)
-    subprocess.call(
-        f"Rscript --vanilla {PATHS['r_scripts']}/fits_by_domain_script.r {fpath}",
-        shell=True,
-    )
+    run_anova(data, "fits_by_domain")
 
 
 if __name__ == "__main__":
@@ -214,4 +200,5 @@ if __name__ == "__main__":
     )
     parser.add_argument("--noise_type", type=str, default="none")
     ARGS, _ = parser.parse_known_args()
+    start_run(vars(ARGS))
     main()
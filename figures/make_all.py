@@ -0,0 +1,102 @@
+"""
+Runs all figure scripts back to back in one Python process, so that loaded data, the
+artifact cache and the pool of R workers (see submm.utils.r_worker) are shared by
+every figure rather than started again for each script
+"""
+
+import os
+import runpy
+import sys
+
+# (description, script, arguments)
+FIGURES = [
+    ("Figure 1A: Stimuli", "figure_1a_stimuli.py", []),
+    ("Figure 3AC: 3T znorm maps", "figure_3ac_3t_znorm_maps.py", []),
+    ("Figure 3B: 3T RDM comparison", "figure_3b_rdm_comparison.py", []),
+    ("Figure 4A: 7T znorm maps", "figure_4a_znorm_maps.py", []),
+    (
+        "Figure 4B: 7T znorm maps across depth",
+        "figure_4b_znorm_maps_both_hemis.py",
+        [],
+    ),
+    (
+        "Figure 5: hypothetical RSMs and embeddings",
+        "figure_5_hypothetical_rdms_embeddings.py",
+        [],
+    ),
+    (
+        "Figure 6: group averaged RDMs and MDS embeddings",
+        "figure_6_group_average_rdms.py",
+        [],
+    ),
+    (
+        "Figure 6: group averaged RDMs and MDS embeddings (simulated 2.4mm)",
+        "figure_6_group_average_rdms.py",
+        ["--glm_dir", "GLM_vanilla_sim2pt4"],
+    ),
+    ("Figure 7A: rdm fit diagram", "figure_7a_rdm_fit_diagram.py", []),
+    ("Figure 7B: rdm fits", "figure_7b_rdm_fits.py", []),
+    (
+        "Figure 7B: rdm fits (simulated 2.4mm)",
+        "figure_7b_rdm_fits.py",
+        ["--glm_dir", "GLM_vanilla_sim2pt4"],
+    ),
+    (
+        "Figure 7B: rdm fits (simulated 2.4mm with noise)",
+        "figure_7b_rdm_fits.py",
+        ["--glm_dir", "GLM_vanilla_sim2pt4", "--noise_type", "gaussian"],
+    ),
+    (
+        "Figure 7B: rdm fits (R-squared control)",
+        "figure_7b_rdm_fits.py",
+        ["--r2_control"],
+    ),
+    ("Figure 7B: rdm fits (thresh_0)", "figure_7b_rdm_fits.py", ["--thresh", "thr_0"]),
+    (
+        "Figure 8: Group-averaged RDMs by depth",
+        "figure_8af_average_rdms_by_depth.py",
+        [],
+    ),
+    ("Figure 8GH: RDM fits by depth", "figure_8gh_rdm_fits_by_depth.py", []),
+    (
+        "Figure 8GH: RDM fits by depth (simulated 2.4mm)",
+        "figure_8gh_rdm_fits_by_depth.py",
+        ["--glm_dir", "GLM_vanilla_sim2pt4"],
+    ),
+    (
+        "Figure 8GH: RDM fits by depth (simulated 2.4mm with noise)",
+        "figure_8gh_rdm_fits_by_depth.py",
+        ["--glm_dir", "GLM_vanilla_sim2pt4", "--noise_type", "gaussian"],
+    ),
+    (
+        "Figure 8GH: RDM fits by depth (R-squared control)",
+        "figure_8gh_rdm_fits_by_depth.py",
+        ["--r2_control"],
+    ),
+    (
+        "Figure 8GH: RDM fits by depth (thresh_0)",
+        "figure_8gh_rdm_fits_by_depth.py",
+        ["--thresh", "thr_0"],
+    ),
+    ("Figure 9: rdm fits by domain", "figure_9_rdm_fits_by_domain.py", []),
+    ("Figure 10A, 10B: tSNR and R2", "figure_10ab_tsnr_R2.py", []),
+    ("Figure 10C: Metric means", "figure_10c_metric_means.py", []),
+    ("Figure 11: Resolution comparison for fits", "figure_11_rescomp.py", []),
+    ("Figure 12: Metric comparison", "figure_12_metric_comparison.py", []),
+]
+
+
+def main():
+    """
+    Runs each script as if it were called from the command line, e.g.,
+    python figure_7b_rdm_fits.py --r2_control
+    """
+    figures_dir = os.path.dirname(os.path.abspath(__file__))
+    for description, script, args in FIGURES:
+        print(f"--------------------{description}...")
+        sys.argv = [script] + args
+        runpy.run_path(f"{figures_dir}/{script}", run_name="__main__")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,4 +14,5 @@ setup(
         "tabulate==0.8.6",
         "Pillow==6.2.1",
     ],
+    extras_require={"parquet": ["pyarrow>=0.15.0"]},
 )
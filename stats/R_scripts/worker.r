@@ -0,0 +1,93 @@
+#!/usr/bin/env Rscript
+
+# Long-lived worker that runs the scripts in this directory on data streamed over
+# stdin, started by submm/utils/r_worker.py.
+#
+# Each request is two lines (path of the script, size in bytes of the CSV payload)
+# followed by the payload. Each reply is a status line ("ok" or "error"), the sizes
+# in bytes of the printed output and of the ANOVA table, one per line, followed by
+# the output and the table (as CSV).
+#
+# The scripts are run unchanged: commandArgs and read.csv are replaced so that they
+# read the payload, and aov is wrapped to keep the table of the fitted model.
+
+suppressPackageStartupMessages({
+  library(nlme)
+  library(sjstats)
+  require(multcomp, quietly = TRUE)
+})
+
+run_script <- function(script, payload) {
+  fitted <- new.env()
+
+  overrides <- new.env(parent = globalenv())
+  overrides$commandArgs <- function(trailingOnly = FALSE) "payload.csv"
+  overrides$read.csv <- function(file, ...) utils::read.csv(text = payload, ...)
+  overrides$aov <- function(...) {
+    # evaluate the original call where the script made it, so data= is found
+    call <- sys.call()
+    call[[1]] <- quote(stats::aov)
+    model <- eval(call, parent.frame())
+
+    table <- as.data.frame(summary(model)[[1]], check.names = FALSE)
+    rownames(table) <- trimws(rownames(table))
+    table$eta_sq <- table[["Sum Sq"]] / sum(table[["Sum Sq"]])
+    fitted$table <- table
+    model
+  }
+
+  # warnings go with the rest of the output instead of piling up until exit
+  printed <- capture.output(
+    withCallingHandlers(
+      source(script, local = new.env(parent = overrides), print.eval = TRUE),
+      warning = function(w) {
+        cat("Warning:", conditionMessage(w), "\n")
+        invokeRestart("muffleWarning")
+      }
+    )
+  )
+
+  table <- ""
+  if (!is.null(fitted$table)) {
+    table <- paste(capture.output(write.csv(fitted$table)), collapse = "\n")
+  }
+  list(status = "ok", printed = paste(printed, collapse = "\n"), table = table)
+}
+
+send <- function(output, result) {
+  printed <- enc2utf8(result$printed)
+  table <- enc2utf8(result$table)
+  cat(
+    result$status, "\n",
+    nchar(printed, type = "bytes"), "\n",
+    nchar(table, type = "bytes"), "\n",
+    printed, table,
+    sep = "", file = output
+  )
+  flush(output)
+}
+
+main <- function() {
+  input <- file("stdin", open = "rb")
+  output <- stdout()
+
+  repeat {
+    script <- readLines(input, n = 1)
+    if (length(script) == 0) {
+      # stdin was closed, the pool is shutting down
+      break
+    }
+    n_bytes <- as.integer(readLines(input, n = 1))
+    payload <- readChar(input, n_bytes, useBytes = TRUE)
+
+    result <- tryCatch(
+      run_script(script, payload),
+      error = function(e) {
+        list(status = "error", printed = conditionMessage(e), table = "")
+      }
+    )
+    send(output, result)
+  }
+}
+
+main()
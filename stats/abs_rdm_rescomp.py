@@ -3,14 +3,14 @@ Compute and compare absolute RDM magnitude at 0.8mm and 2.4mm
 """
 
 import argparse
-import subprocess
 
 import numpy as np
 import pandas as pd
 
-from submm.constants import PATHS
 from submm.utils.rsm_utils import load_rsms, get_lower_tri
 from submm.utils.stats import report_ttest_2_sample
+from submm.utils.anova import run_anova
+from submm.utils.results_store import start_run
 
 
 def prepare_dataframe(hires_rdms, lowres_rdms):
@@ -82,16 +82,14 @@ def main():
 
     print("Hires RDM Magnitude vs. Lowres")
     report_ttest_2_sample(
-        hires_data.magnitudes, lowres_data.magnitudes, print_mean_var=True
+        hires_data.magnitudes,
+        lowres_data.magnitudes,
+        print_mean_var=True,
+        label="Hires RDM Magnitude vs. Lowres",
     )
 
     # run analysis of variance
-    fpath = f"{PATHS['r_scripts']}/data/mean_abs_rdm.csv"
-    data.to_csv(fpath)
-    subprocess.call(
-        f"Rscript --vanilla {PATHS['r_scripts']}/mean_abs_rdm_script.r {fpath}",
-        shell=True,
-    )
+    run_anova(data, "mean_abs_rdm")
 
 
 if __name__ == "__main__":
@@ -100,4 +98,5 @@ if __name__ == "__main__":
         "--use_noisy_lowres", dest="use_noisy_lowres", action="store_true"
     )
     ARGS, _ = parser.parse_known_args()
+    start_run(vars(ARGS))
     main()
@@ -37,13 +37,23 @@ def main():
 
         print(f"\nCorrelations between {pair[0]} and {pair[1]}")
         pair_corrs[name] = np.array(subject_corrs)
-        report_ttest_1_sample(np.array(subject_corrs), print_mean_var=True)
+        report_ttest_1_sample(
+            np.array(subject_corrs), print_mean_var=True, label=f"{name} correlation"
+        )
 
     print(f"\nt-test between lateral-medial and lateral-V1")
-    report_ttest_2_sample(pair_corrs["lateral-medial"], pair_corrs["lateral-V1"])
+    report_ttest_2_sample(
+        pair_corrs["lateral-medial"],
+        pair_corrs["lateral-V1"],
+        label="lateral-medial vs. lateral-V1 correlation",
+    )
 
     print(f"\nt-test between lateral-medial and medial-V1")
-    report_ttest_2_sample(pair_corrs["lateral-medial"], pair_corrs["medial-V1"])
+    report_ttest_2_sample(
+        pair_corrs["lateral-medial"],
+        pair_corrs["medial-V1"],
+        label="lateral-medial vs. medial-V1 correlation",
+    )
 
 
 if __name__ == "__main__":
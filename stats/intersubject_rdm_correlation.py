@@ -2,43 +2,103 @@
 Compute correlations between RDMs across subjects
 """
 
+import argparse
+import itertools
+
 import numpy as np
+from tabulate import tabulate
+
+from submm.constants import PATHS, PARTITIONS, PRIMARY_METRIC
+from submm.utils.rsm_utils import get_lower_tri
+from submm.utils.similarity import SIMILARITY_METHODS, intersubject_similarity
+from submm.utils.stats import report_ttest_1_sample, report_ttest_2_sample, sem
+from submm.utils.results_store import start_run
+
+
+def print_sweep_table(similarity):
+    """
+    Prints the mean and standard error of the pairwise intersubject similarities for
+    every leaf of the RSM file, one row per setting and one column per partition
+
+    Inputs
+        similarity (LabelledArray): from intersubject_similarity, with every level
+    """
+    setting_dims = [dim for dim in similarity.dims if dim != "partition"]
+    partitions = similarity.coords["partition"]
+
+    table_rows = []
+    for setting in itertools.product(*[similarity.coords[d] for d in setting_dims]):
+        setting_similarity = similarity.sel(**dict(zip(setting_dims, setting)))
 
-from submm.constants import PATHS, FSID_SESSIONS, PARTITIONS, PRIMARY_METRIC
-from submm.utils.rsm_utils import load_rsms, get_lower_tri
-from submm.utils.stats import report_ttest_1_sample, report_ttest_2_sample
+        row = list(setting)
+        for partition in partitions:
+            pairwise = get_lower_tri(setting_similarity.sel(partition=partition))
+            if np.any(np.isnan(pairwise)):
+                row.append("")
+                continue
+            row.append(f"{np.mean(pairwise):.3f} +/- {sem(pairwise):.3f}")
+        table_rows.append(row)
+
+    print(tabulate(table_rows, headers=setting_dims + partitions, tablefmt="github"))
 
 
 def main():
     """
     Entry point for analysis
     """
+    if ARGS.sweep:
+        print(f"Mean intersubject RDM similarity ({ARGS.method}) for every setting")
+        print_sweep_table(intersubject_similarity(PATHS["rsms"], method=ARGS.method))
+        return
 
-    rsms = load_rsms()
-    rdms = {partition: 1 - x for (partition, x) in rsms.items()}
+    similarity = intersubject_similarity(
+        PATHS["rsms"],
+        method=ARGS.method,
+        glm_dir="GLM_vanilla",
+        metric=PRIMARY_METRIC,
+        noise_type="none",
+        thresh="thr_75",
+        partition=PARTITIONS,
+    )
 
     intersubject_corr_dict = {}
-    for partition_name, partition_rdms in rdms.items():
-        lower_tris = np.array(
-            [
-                get_lower_tri(subject_rdm, with_diagonal=True)
-                for subject_rdm in partition_rdms
-            ]
-        )
-        lower_tri_corrs = np.corrcoef(lower_tris)
-
+    for partition_name in PARTITIONS:
         # reduce symmetric corrmat by taking lower triangle (without diagonal)
-        pairwise_intersubject_corrs = get_lower_tri(lower_tri_corrs)
+        pairwise_intersubject_corrs = get_lower_tri(
+            similarity.sel(partition=partition_name)
+        )
         intersubject_corr_dict[partition_name] = pairwise_intersubject_corrs
 
         print(f"Mean intersub RDM corr in {partition_name}")
-        report_ttest_1_sample(pairwise_intersubject_corrs, print_mean_var=True)
+        report_ttest_1_sample(
+            pairwise_intersubject_corrs,
+            print_mean_var=True,
+            label="intersubject RDM correlation",
+            partition=partition_name,
+        )
 
     print(f"Lateral vs. medial difference")
     report_ttest_2_sample(
-        intersubject_corr_dict["VTC_lateral"], intersubject_corr_dict["VTC_medial"]
+        intersubject_corr_dict["VTC_lateral"],
+        intersubject_corr_dict["VTC_medial"],
+        label="intersubject RDM correlation: VTC_lateral vs. VTC_medial",
     )
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--method",
+        type=str,
+        choices=SIMILARITY_METHODS,
+        help="similarity between subjects' RDMs",
+        default="pearson",
+    )
+    parser.add_argument(
+        "--sweep",
+        action="store_true",
+        help="summarize every GLM, metric, noise type and threshold",
+    )
+    ARGS, _ = parser.parse_known_args()
+    start_run(vars(ARGS))
     main()
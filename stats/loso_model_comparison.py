@@ -0,0 +1,82 @@
+"""
+Leave-one-subject-out comparison of nested domain/category/depth models of the RDMs
+"""
+
+import argparse
+
+import numpy as np
+from tabulate import tabulate
+
+from submm.constants import PARTITIONS, PRIMARY_METRIC
+from submm.utils.designs import get_design
+from submm.utils.labelled import LabelledArray
+from submm.utils.model_comparison import loso_model_comparison
+from submm.utils.stats import sem
+
+
+def print_score_table(scores):
+    """
+    Prints mean and standard error of the held-out R^2 for each model and partition
+
+    Inputs
+        scores (LabelledArray): (model, partition) x subjects
+    """
+    table_rows = []
+    for model in scores.coords["model"]:
+        row = [model]
+        for partition in scores.coords["partition"]:
+            x = scores.sel(model=model, partition=partition)
+            row.append(f"{np.mean(x):.3f} ± {sem(x):.3f}")
+        table_rows.append(row)
+
+    headers = ["Model"] + scores.coords["partition"]
+    print(tabulate(table_rows, headers=headers, tablefmt="github"))
+
+
+def main():
+    """
+    Entry point for analysis
+    """
+    design = get_design(10 if ARGS.by_depth else 30, with_diagonal=True)
+    scores = loso_model_comparison(
+        design,
+        metrics=[ARGS.metric],
+        partitions=PARTITIONS,
+        by_depth=ARGS.by_depth,
+        thresh=ARGS.thresh,
+        glm_dir=ARGS.glm_dir,
+        noise_type=ARGS.noise_type,
+        r2_control=ARGS.r2_control,
+    ).sel(metric=ARGS.metric)
+
+    if not ARGS.by_depth:
+        print("\nHeld-out R^2 (leave one subject out)")
+        print_score_table(scores)
+        return
+
+    for depth_idx, depth_name in enumerate(["superficial", "middle", "deep"]):
+        print(f"\nHeld-out R^2 (leave one subject out), {depth_name}")
+        depth_scores = LabelledArray(
+            scores.values[..., depth_idx], scores.dims, scores.coords
+        )
+        print_score_table(depth_scores)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--glm_dir", type=str, help="GLM type to use", default="GLM_vanilla"
+    )
+    parser.add_argument("--noise_type", type=str, default="none")
+    parser.add_argument(
+        "--thresh", type=str, help="bias_mask_threshold to use", default="thr_75"
+    )
+    parser.add_argument(
+        "--metric", type=str, help="metric to get RDMs for", default=PRIMARY_METRIC
+    )
+    parser.add_argument("--r2_control", action="store_true")
+    parser.add_argument(
+        "--by_depth", action="store_true", help="fit the RDM at each depth separately"
+    )
+    ARGS, _ = parser.parse_known_args()
+    main()
@@ -0,0 +1,92 @@
+"""
+Lower and upper noise ceilings of the RDMs of each partition, metric and threshold
+"""
+
+import argparse
+import itertools
+
+import numpy as np
+from tabulate import tabulate
+
+from submm.constants import PARTITIONS, PRIMARY_METRIC
+from submm.utils.noise_ceiling import noise_ceilings
+
+
+def print_ceiling_table(ceilings, depth_names=None):
+    """
+    Prints the mean lower and upper noise ceiling across subjects, one row per
+    metric and threshold (and depth) and one column per partition
+
+    Inputs
+        ceilings (LabelledArray): (bound, metric, partition, thresh) x subjects
+            (x depths)
+        depth_names (list): names of the depths if ceilings are by depth
+    """
+    # mean across subjects: (bound, metric, partition, thresh, depth)
+    means = np.mean(ceilings.values, axis=4)
+    headers = ["Metric", "Threshold", "Depth"]
+    if depth_names is None:
+        means = means[..., None]
+        depth_names = [None]
+        headers.remove("Depth")
+
+    table_rows = []
+    metrics, threshes = ceilings.coords["metric"], ceilings.coords["thresh"]
+    for metric_idx, thresh_idx, depth_idx in itertools.product(
+        range(len(metrics)), range(len(threshes)), range(len(depth_names))
+    ):
+        depth = depth_names[depth_idx]
+        row = [metrics[metric_idx], threshes[thresh_idx]]
+        row += [depth] if depth is not None else []
+        for partition_idx in range(len(ceilings.coords["partition"])):
+            lower, upper = means[:, metric_idx, partition_idx, thresh_idx, depth_idx]
+            row.append(f"{lower:.3f} - {upper:.3f}")
+        table_rows.append(row)
+
+    headers += ceilings.coords["partition"]
+    print(tabulate(table_rows, headers=headers, tablefmt="github"))
+
+
+def main():
+    """
+    Entry point for analysis
+    """
+    ceilings = noise_ceilings(
+        metrics=ARGS.metrics,
+        partitions=PARTITIONS,
+        by_depth=ARGS.by_depth,
+        method=ARGS.method,
+        glm_dir=ARGS.glm_dir,
+        noise_type=ARGS.noise_type,
+        r2_control=ARGS.r2_control,
+    )
+
+    print(f"\nNoise ceiling ({ARGS.method} r, lower - upper), mean across subjects")
+    depth_names = ["superficial", "middle", "deep"] if ARGS.by_depth else None
+    print_ceiling_table(ceilings, depth_names)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--glm_dir", type=str, help="GLM type to use", default="GLM_vanilla"
+    )
+    parser.add_argument("--noise_type", type=str, default="none")
+    parser.add_argument(
+        "--metrics",
+        type=str,
+        nargs="+",
+        help="metrics to get RDMs for",
+        default=[PRIMARY_METRIC],
+    )
+    parser.add_argument("--r2_control", action="store_true")
+    parser.add_argument(
+        "--by_depth",
+        action="store_true",
+        help="compute the ceiling of the RDM at each depth separately",
+    )
+    parser.add_argument(
+        "--method", type=str, choices=["pearson", "spearman"], default="pearson"
+    )
+    ARGS, _ = parser.parse_known_args()
+    main()
@@ -0,0 +1,119 @@
+"""
+Permutation tests of the domain, category, and depth weights fit to each RDM
+"""
+
+import argparse
+
+import numpy as np
+from tabulate import tabulate
+
+from submm.constants import PARTITIONS, PRIMARY_METRIC
+from submm.utils.designs import get_design
+from submm.utils.permutation import (
+    apply_contrasts,
+    get_pairwise_contrasts,
+    permutation_null,
+    permutation_p_values,
+)
+from submm.utils.rsm_utils import load_rsms, fit_rdms, get_lower_tri, split_by_depth
+
+
+def print_p_value_table(observed, p_values, names):
+    """
+    Prints the observed mean across subjects and permutation p-value of each
+    statistic for each partition
+
+    Inputs
+        observed (partitions x statistics)
+        p_values (partitions x statistics)
+        names (list): name of each statistic
+    """
+    table_rows = []
+    for partition, partition_observed, partition_p in zip(
+        PARTITIONS, observed, p_values
+    ):
+        row = [partition]
+        for value, p in zip(partition_observed, partition_p):
+            row.append(f"{value:.4f} (p = {p:.4f})")
+        table_rows.append(row)
+
+    print(tabulate(table_rows, headers=["ROI"] + names, tablefmt="github"))
+
+
+def main():
+    """
+    Entry point for analysis
+    """
+    rsms = load_rsms(
+        metric=ARGS.metric,
+        thresh=ARGS.thresh,
+        glm_dir=ARGS.glm_dir,
+        r2_control=ARGS.r2_control,
+    )
+
+    # partitions x subjects (x depths) x conditions x conditions
+    rdms = np.array([1 - rsms[partition] for partition in PARTITIONS])
+    if ARGS.by_depth:
+        rdms = split_by_depth(rdms)
+    # the diagonal is never moved by a permutation, so fit off-diagonal cells only
+    design = get_design(rdms.shape[-1], with_diagonal=False)
+
+    observed = fit_rdms(get_lower_tri(rdms, with_diagonal=False), design)
+    null = permutation_null(
+        rdms, design, n_permutations=ARGS.n_permutations, seed=ARGS.seed
+    )
+
+    # test the mean across subjects (axis 2 of the null, axis 1 of observed), the
+    # intercept isn't an effect of condition labels so it isn't tested
+    effects = [i for i, name in enumerate(design.names) if name != "intercept"]
+    contrasts = get_pairwise_contrasts(design)
+    statistics = {
+        "weights": (
+            observed[..., effects],
+            null[..., effects],
+            [design.names[i] for i in effects],
+        ),
+        "differences": (
+            apply_contrasts(observed, contrasts),
+            apply_contrasts(null, contrasts),
+            list(contrasts.keys()),
+        ),
+    }
+    for description, (obs, nul, names) in statistics.items():
+        p_values = permutation_p_values(obs.mean(axis=1), nul.mean(axis=2))
+        mean_observed = obs.mean(axis=1)
+
+        if not ARGS.by_depth:
+            print(f"\nPermutation tests of mean {description} across subjects")
+            print_p_value_table(mean_observed, p_values, names)
+            continue
+
+        for depth_idx, depth_name in enumerate(["superficial", "middle", "deep"]):
+            print(
+                f"\nPermutation tests of mean {description} across subjects, "
+                f"{depth_name}"
+            )
+            print_p_value_table(
+                mean_observed[:, depth_idx], p_values[:, depth_idx], names
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--glm_dir", type=str, help="GLM type to use", default="GLM_vanilla"
+    )
+    parser.add_argument(
+        "--thresh", type=str, help="bias_mask_threshold to use", default="thr_75"
+    )
+    parser.add_argument(
+        "--metric", type=str, help="metric to get RDMs for", default=PRIMARY_METRIC
+    )
+    parser.add_argument("--r2_control", action="store_true")
+    parser.add_argument(
+        "--by_depth", action="store_true", help="fit the RDM at each depth separately"
+    )
+    parser.add_argument("--n_permutations", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    ARGS, _ = parser.parse_known_args()
+    main()
@@ -2,11 +2,17 @@
 Computes split half reliability for the 30 x 30 RSMs
 """
 
+import argparse
+import itertools
+
 import numpy as np
+from tabulate import tabulate
 
 from submm.constants import PATHS, FSID_SESSIONS, PARTITIONS
+from submm.utils.reliability import RELIABILITY_STATISTICS, split_half_reliability
 from submm.utils.rsm_utils import load_rsms
 from submm.utils.stats import report_ttest_1_sample, report_ttest_2_sample
+from submm.utils.results_store import start_run
 
 
 def reliability(matrix):
@@ -24,22 +30,87 @@ def compute_reliability_full(corrmats):
     for partition_name, partition_corrmats in corrmats.items():
         rel = np.array([reliability(x) for x in partition_corrmats])
         print(f"Testing reliability in {partition_name} against 0.0")
-        report_ttest_1_sample(rel, print_mean_var=True)
+        report_ttest_1_sample(
+            rel, print_mean_var=True, label="reliability", partition=partition_name
+        )
 
         reliabilities[partition_name] = rel
 
     # paired t-test for lateral and medial
     print(f"Testing reliability between lateral and medial")
-    report_ttest_2_sample(reliabilities["VTC_lateral"], reliabilities["VTC_medial"])
+    report_ttest_2_sample(
+        reliabilities["VTC_lateral"],
+        reliabilities["VTC_medial"],
+        label="reliability: VTC_lateral vs. VTC_medial",
+    )
+
+
+def print_sweep_table(reliabilities, statistic="reliability"):
+    """
+    Prints the mean reliability across subjects and its bootstrap confidence
+    interval for every leaf of the RSM file, one row per setting and depth and one
+    column per partition
+
+    Inputs
+        reliabilities (LabelledArray): from split_half_reliability
+        statistic (str): one of RELIABILITY_STATISTICS
+    """
+    reliabilities = reliabilities.sel(statistic=statistic)
+    setting_dims = [
+        dim for dim in reliabilities.dims if dim not in ["bound", "partition"]
+    ]
+    partitions = reliabilities.coords["partition"]
+
+    table_rows = []
+    for setting in itertools.product(*[reliabilities.coords[d] for d in setting_dims]):
+        setting_reliabilities = reliabilities.sel(**dict(zip(setting_dims, setting)))
+
+        row = list(setting)
+        for partition in partitions:
+            estimate, low, high = np.asarray(
+                setting_reliabilities.sel(partition=partition).values
+            )
+            if np.isnan(estimate):
+                row.append("")
+                continue
+            row.append(f"{estimate:.3f} [{low:.3f}, {high:.3f}]")
+        table_rows.append(row)
+
+    print(tabulate(table_rows, headers=setting_dims + partitions, tablefmt="github"))
 
 
 def main():
     """
     Entry point for analysis
     """
+    if ARGS.sweep:
+        print(
+            f"Mean split half {ARGS.statistic} and {ARGS.n_boot} sample bootstrap "
+            "95% CI for every setting"
+        )
+        reliabilities = split_half_reliability(PATHS["rsms"], n_boot=ARGS.n_boot)
+        print_sweep_table(reliabilities, ARGS.statistic)
+        return
+
     rsms = load_rsms()
     compute_reliability_full(rsms)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sweep",
+        action="store_true",
+        help="summarize every GLM, metric, noise type, threshold and depth",
+    )
+    parser.add_argument(
+        "--statistic",
+        type=str,
+        choices=RELIABILITY_STATISTICS,
+        help="split half or Spearman-Brown corrected reliability in the sweep",
+        default="reliability",
+    )
+    parser.add_argument("--n_boot", type=int, default=10000)
+    ARGS, _ = parser.parse_known_args()
+    start_run(vars(ARGS))
     main()
@@ -20,11 +20,34 @@ PATHS = {
     "figures": f"{base}/figures/python_outputs",
     "figures_misc": f"{base}/figures/figures_misc",
     "r_scripts": f"{base}/stats/R_scripts",
+    "artifact_cache": f"{base}/.artifact_cache",
+    "tables": f"{outputs_path}/tables",
+    "results": f"{base}/results.sqlite",
 }
 
 # statistical threshold
 ALPHA = 0.05
 
+# which backend fits the ANOVAs of stats/R_scripts: "r" (Rscript), "python" (in
+# process, see submm.utils.anova), or "both" to cross-check them
+STATS_BACKEND = "r"
+
+# number of R processes kept running to fit models with the "r" backend
+R_WORKERS = 2
+
+# seconds an R script may take before its worker is killed and the job fails
+R_TIMEOUT = 600
+
+# whether reported statistics are also written to the results store (PATHS["results"],
+# see submm.utils.results_store)
+RECORD_RESULTS = True
+
+# memory budget (in bytes) for caching loaded data within a single process
+LOAD_CACHE_BYTES = 512 * 1024 ** 2
+
+# size cap (in bytes) of the on-disk cache of derived artifacts
+ARTIFACT_CACHE_BYTES = 1024 ** 3
+
 # figure saving resolution
 DPI = 300
 
@@ -105,8 +128,21 @@ PARTITION_NAMES = ["Lateral\nVTC", "Medial\nVTC", "V1"]
 # which metrics to iterate over in analysis scripts
 METRICS = ["tstat", "zscore", "znorm"]
 
+# bias_mask_thresholds to iterate over in analysis scripts
+THRESHOLDS = ["thr_0", "thr_75"]
+
 # main metric that, e.g., RDM fits should be computed for
 PRIMARY_METRIC = "znorm"
 
 # partitions (or ROIs) to analyze
 PARTITIONS = ["VTC_lateral", "VTC_medial", "hOc1"]
+
+# layout of the conditions in each RSM: every domain (characters, bodies, faces,
+# objects, places) has the same number of categories, and conditions are ordered by
+# category, then by cortical depth (superficial to deep)
+N_DOMAINS = 5
+CATEGORIES_PER_DOMAIN = 2
+N_DEPTHS = 3
+
+# marker for each depth when plotting conditions, superficial first
+DEPTH_MARKERS = ["^", "s", "v", "o", "D", "p"]
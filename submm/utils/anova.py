@@ -0,0 +1,336 @@
+"""
+In-process ANOVAs for the models in stats/R_scripts
+
+Each R script fits a model with aov(), which gives sequential (type I) sums of squares,
+and reports F tests and eta squared. The same models are specified here by copying
+their R formulas, so they can be run without spawning Rscript. Which backend runs is
+set by STATS_BACKEND in submm.constants: 'r' (the R scripts, run on the worker pool
+of submm.utils.r_worker), 'python', or 'both' (to cross-check the two).
+
+Note: the R formulas include a '(1 | subjects)' term. Inside aov() this is not a
+random effect; it evaluates to a constant that is aliased with the intercept and
+dropped, so it is ignored here as well. Post-hoc tests (TukeyHSD, glht) and the lme
+fit in rdm_fit_diffs_script.r are only available from R.
+"""
+
+import re
+import itertools
+from collections import namedtuple
+
+import numpy as np
+
+from submm.constants import STATS_BACKEND
+from submm.utils.r_worker import get_worker_pool
+from submm.utils.results_store import record_result
+
+# results of one model: a pd.DataFrame from aov (None if not run in Python) and an
+# RResult (None if not run in R)
+AnovaResult = namedtuple("AnovaResult", ["python", "r"])
+
+# for each R script (named without the _script.r suffix): names the script gives to
+# the columns of the data, its aov formula, and which variables are numeric (all
+# others are factors)
+ANOVA_MODELS = {
+    "fits_by_domain": {
+        "columns": [
+            "partitions",
+            "subjects",
+            "domains",
+            "wb_membership",
+            "depth",
+            "values",
+        ],
+        "formula": (
+            "values ~ partitions + domains + wb_membership + depth"
+            " + partitions*domains + partitions*wb_membership + partitions*depth"
+            " + domains*wb_membership + domains*depth + wb_membership*depth"
+            " + partitions*wb_membership*domains + partitions*domains*depth"
+            " + domains*wb_membership*depth + partitions*domains*wb_membership*depth"
+            " + (1 | subjects)"
+        ),
+        "numeric": ["depth"],
+    },
+    "mean_abs_rdm": {
+        "columns": ["partitions", "subjects", "data_srcs", "values"],
+        "formula": (
+            "values ~ partitions + data_srcs + partitions*data_srcs + (1 | subjects)"
+        ),
+        "numeric": [],
+    },
+    "metrics_by_depth": {
+        "columns": ["partitions", "subjects", "depths", "values"],
+        "formula": "values ~ partitions + depths + partitions*depths + (1 | subjects)",
+        "numeric": ["depths"],
+    },
+    "raw_betas": {
+        "columns": ["partitions", "categories", "depths", "subjects", "betas"],
+        "formula": (
+            "betas ~ partitions + categories + depths + partitions*categories"
+            " + partitions*depths + categories*depths + partitions*categories*depths"
+            " + (1 | subjects)"
+        ),
+        "numeric": ["depths"],
+    },
+    "rdm_fit_diffs": {
+        "columns": ["partitions", "subjects", "diffs"],
+        "formula": "diffs ~ factor(partitions) + (1 | subjects)",
+        "numeric": [],
+    },
+    "rdm_fit_slopes": {
+        "columns": ["partitions", "subjects", "slopes", "regressors"],
+        "formula": (
+            "slopes ~ factor(partitions) + factor(regressors)"
+            " + factor(partitions)*factor(regressors) + (1 | subjects)"
+        ),
+        "numeric": [],
+    },
+    "rdm_fit_weights": {
+        "columns": ["partitions", "subjects", "regressors", "weights"],
+        "formula": (
+            "weights ~ factor(partitions) + factor(regressors)"
+            " + factor(partitions)*factor(regressors) + (1 | subjects)"
+        ),
+        "numeric": [],
+    },
+    "rdm_fits_by_depth": {
+        "columns": ["partitions", "subjects", "betas", "depths", "regressors"],
+        "formula": (
+            "betas ~ partitions + regressors + depths + partitions * regressors"
+            " + partitions * depths + regressors * depths"
+            " + partitions * regressors * depths + (1 | subjects)"
+        ),
+        "numeric": ["depths"],
+    },
+    "rescomp": {
+        "columns": ["partitions", "subjects", "regressors", "data_srcs", "values"],
+        "formula": (
+            "values ~ partitions + data_srcs + regressors + partitions*data_srcs"
+            " + partitions*regressors + data_srcs*regressors"
+            " + partitions*data_srcs*regressors + (1 | subjects)"
+        ),
+        "numeric": [],
+    },
+}
+
+
+def parse_formula(formula):
+    """
+    Expands an R model formula into its response and terms, ordered as R does:
+    by the number of variables in the term, then by first appearance
+
+    Inputs
+        formula (str): e.g., 'y ~ a + b + a*b + (1 | subjects)'. Terms with '|' are
+            dropped (see the module docstring).
+
+    Returns
+        response (str)
+        terms (list): each term is a tuple of variable names, e.g., ('a', 'b')
+    """
+    response, rhs = [x.strip() for x in formula.split("~")]
+    rhs = re.sub(r"factor\((\w+)\)", r"\1", rhs)
+
+    variables, terms = [], []
+    for chunk in rhs.split("+"):
+        if "|" in chunk:
+            continue
+
+        chunk_variables = [v.strip() for v in re.split(r"[*:]", chunk)]
+        variables += [v for v in chunk_variables if v not in variables]
+
+        # a*b expands to a + b + a:b, while a:b is just the interaction
+        sizes = [len(chunk_variables)] if ":" in chunk else []
+        sizes = sizes or range(1, len(chunk_variables) + 1)
+        for size in sizes:
+            for combo in itertools.combinations(chunk_variables, size):
+                term = tuple(sorted(combo, key=variables.index))
+                if term not in terms:
+                    terms.append(term)
+
+    return response, sorted(terms, key=len)
+
+
+def _term_columns(data, term, numeric):
+    """
+    Model matrix columns for one term, using treatment contrasts for factors
+    """
+    columns = np.ones((len(data), 1))
+    for variable in term:
+        # an ndarray even for extension dtypes, e.g., pandas' string dtype
+        values = np.asarray(data[variable])
+        if variable in numeric:
+            coded = values.astype(float)[:, None]
+        else:
+            levels = sorted(set(values))
+            coded = (values[:, None] == np.array(levels[1:])[None, :]).astype(float)
+
+        columns = (columns[:, :, None] * coded[:, None, :]).reshape(len(data), -1)
+
+    return columns
+
+
+def aov(data, formula, numeric=()):
+    """
+    Sequential (type I) sums of squares ANOVA, as with summary(aov(...)) in R
+
+    Inputs
+        data (pd.DataFrame): one row per observation
+        formula (str): R formula, see parse_formula
+        numeric (list): variables to treat as numeric, all others are factors
+
+    Returns
+        pd.DataFrame with a row per term and one for the residuals, and columns Df,
+            Sum Sq, Mean Sq, F value, Pr(>F), and eta_sq
+    """
+    # imported here so that importing this module stays cheap
+    import pandas as pd
+    from scipy.stats import f as f_distribution
+
+    response, terms = parse_formula(formula)
+    y = data[response].values.astype(float)
+    n_obs = len(y)
+
+    # orthonormal basis of the model so far, starting from the intercept
+    basis = np.ones((n_obs, 1)) / np.sqrt(n_obs)
+    rows = []
+    for term in terms:
+        columns = _term_columns(data, term, numeric)
+        columns = columns - basis @ (basis.T @ columns)
+
+        # keep only the directions not already spanned by earlier terms
+        u, s, _ = np.linalg.svd(columns, full_matrices=False)
+        tol = max(columns.shape) * np.finfo(float).eps * max(s.max(initial=0), 1)
+        new_basis = u[:, s > tol]
+        if new_basis.shape[1] == 0:
+            continue
+
+        rows.append(
+            (":".join(term), new_basis.shape[1], np.sum((new_basis.T @ y) ** 2))
+        )
+        basis = np.hstack((basis, new_basis))
+
+    residual_df = n_obs - basis.shape[1]
+    residual_ss = np.sum((y - basis @ (basis.T @ y)) ** 2)
+    total_ss = np.sum((y - y.mean()) ** 2)
+
+    table = pd.DataFrame(
+        rows + [("Residuals", residual_df, residual_ss)],
+        columns=["term", "Df", "Sum Sq"],
+    ).set_index("term")
+    table["Mean Sq"] = table["Sum Sq"] / table["Df"]
+
+    residual_ms = residual_ss / residual_df
+    effects = table.index != "Residuals"
+    table["F value"] = np.where(effects, table["Mean Sq"] / residual_ms, np.nan)
+    table["Pr(>F)"] = np.where(
+        effects,
+        f_distribution.sf(table["F value"], table["Df"], residual_df),
+        np.nan,
+    )
+    table["eta_sq"] = np.where(effects, table["Sum Sq"] / total_ss, np.nan)
+
+    return table
+
+
+def run_python_anova(data, name):
+    """
+    Fits the model of stats/R_scripts/<name>_script.r to data in process
+
+    Inputs
+        data (pd.DataFrame): the data that would be passed to the R script, with
+            columns in the same order
+        name (str): key of ANOVA_MODELS, e.g., 'rdm_fit_weights'
+
+    Returns
+        pd.DataFrame, see aov
+    """
+    model = ANOVA_MODELS[name]
+    assert len(data.columns) == len(model["columns"]), f"unexpected columns for {name}"
+
+    # the R scripts rename columns by position, so do the same
+    data = data.copy()
+    data.columns = model["columns"]
+    return aov(data, model["formula"], numeric=model["numeric"])
+
+
+def run_anovas(jobs, backend=None):
+    """
+    Runs the models of several R scripts with the chosen backend(s). Models run in R
+    are fit concurrently on the shared pool of R workers.
+
+    Inputs
+        jobs (list): (data, name) pairs, where data (pd.DataFrame) is the data for the
+            model and name (str) is the name of the R script, without the _script.r
+            suffix
+        backend (str): 'r', 'python', or 'both'; defaults to STATS_BACKEND
+
+    Returns
+        list of AnovaResult, in the order of jobs
+    """
+    if backend is None:
+        backend = STATS_BACKEND
+    if backend not in ["r", "python", "both"]:
+        raise Exception(f"Stats backend {backend} not recognized")
+
+    python_results = [None] * len(jobs)
+    if backend in ["python", "both"]:
+        python_results = [run_python_anova(data, name) for data, name in jobs]
+
+    r_results = [None] * len(jobs)
+    if backend in ["r", "both"]:
+        pool = get_worker_pool()
+        futures = [pool.submit(data, name) for data, name in jobs]
+        missing_rscript = False
+        for job_idx, future in enumerate(futures):
+            # a worker that dies fails only its own job (with ok=False)
+            try:
+                r_results[job_idx] = future.result()
+            except FileNotFoundError:
+                missing_rscript = True
+        if missing_rscript:
+            print("Rscript not found, skipping R (see STATS_BACKEND in constants.py)")
+
+    results = [AnovaResult(*x) for x in zip(python_results, r_results)]
+    for (_, name), result in zip(jobs, results):
+        record_anova(result, name)
+
+    return results
+
+
+def record_anova(result, name):
+    """
+    Writes each row of the tables of an AnovaResult to the results store, labelled
+    with the term, and with the model and backend as details
+    """
+    tables = {"python": result.python}
+    if result.r is not None:
+        tables["r"] = result.r.table
+
+    for backend, table in tables.items():
+        if table is None:
+            continue
+        for term, row in table.iterrows():
+            record_result(
+                "anova", row.to_dict(), label=term, model=name, backend=backend
+            )
+
+
+def print_anova(result):
+    """
+    Prints the Python table and the R output of an AnovaResult
+    """
+    if result.python is not None:
+        print(result.python.to_string(float_format=lambda x: f"{x:.6g}"))
+    if result.r is not None:
+        print(result.r.output)
+
+
+def run_anova(data, name, backend=None):
+    """
+    Runs and prints the model of stats/R_scripts/<name>_script.r, see run_anovas
+
+    Returns
+        AnovaResult
+    """
+    result = run_anovas([(data, name)], backend=backend)[0]
+    print_anova(result)
+    return result
@@ -0,0 +1,159 @@
+"""
+Subject-resampling bootstrap confidence intervals
+
+Resampling indices are drawn once and can be reused for every quantity computed on
+the same subjects (fit weights, reliabilities, intersubject correlations, ...). Each
+tensor is resampled with a single gather along its subject axis, so every partition,
+metric and depth in the tensor is bootstrapped at once.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from submm.utils.labelled import LabelledArray
+
+# estimate and interval bounds, each with the shape of the statistic
+BootstrapCI = namedtuple("BootstrapCI", ["estimate", "low", "high"])
+
+
+def draw_bootstrap_indices(n_subjects, n_boot=10000, seed=0):
+    """
+    Draws subjects with replacement
+
+    Inputs
+        n_subjects (int): number of subjects to resample
+        n_boot (int): number of bootstrap resamples
+        seed (int): seed for the random draws
+
+    Returns
+        indices (n_boot, n_subjects)
+    """
+    return np.random.RandomState(seed).randint(0, n_subjects, (n_boot, n_subjects))
+
+
+def bootstrap_distribution(values, indices, axis=0, statistic=np.mean):
+    """
+    Applies a statistic to every bootstrap resample of a tensor
+
+    Inputs
+        values (np.ndarray): tensor with subjects along axis
+        indices (n_boot, n_subjects): from draw_bootstrap_indices
+        axis (int): subject axis of values
+        statistic (callable): reduces along an axis, called as statistic(x, axis=...)
+
+    Returns
+        (n_boot, ...) statistic of each resample, the subject axis removed
+    """
+    values = np.moveaxis(np.asarray(values), axis, 0)
+    assert indices.max() < values.shape[0], "more subjects in indices than in values"
+
+    # (n_boot, n_subjects, ...)
+    resampled = values[indices]
+    return statistic(resampled, axis=1)
+
+
+def _jackknife(values, statistic):
+    """
+    Leave-one-subject-out values of a statistic, subjects along axis 0
+    """
+    n_subjects = values.shape[0]
+    keep = ~np.eye(n_subjects, dtype=bool)
+    return np.array([statistic(values[mask], axis=0) for mask in keep])
+
+
+def _quantiles(distribution, probabilities):
+    """
+    Linearly interpolated quantiles along axis 0, with a separate probability for
+    each element
+    """
+    sorted_distribution = np.sort(distribution, axis=0)
+    position = probabilities * (distribution.shape[0] - 1)
+    lower = np.floor(position).astype(int)
+    upper = np.minimum(lower + 1, distribution.shape[0] - 1)
+    fraction = position - lower
+
+    low_values = np.take_along_axis(sorted_distribution, lower[None], axis=0)[0]
+    high_values = np.take_along_axis(sorted_distribution, upper[None], axis=0)[0]
+    return low_values + fraction * (high_values - low_values)
+
+
+def bootstrap_ci(
+    values, indices=None, axis=0, statistic=np.mean, alpha=0.05, method="bca"
+):
+    """
+    Bootstrap confidence interval of a statistic across subjects, computed for
+    every element of a stacked result tensor at once
+
+    Inputs
+        values (np.ndarray or LabelledArray): tensor with subjects along axis (for a
+            LabelledArray, subjects must be one of the unlabelled trailing axes)
+        indices (n_boot, n_subjects): from draw_bootstrap_indices, drawn here with
+            default arguments if None
+        axis (int): subject axis of values
+        statistic (callable): reduces along an axis, called as statistic(x, axis=...)
+        alpha (float): the interval covers 1 - alpha
+        method (str):
+            percentile: percentiles of the bootstrap distribution
+            bca: bias-corrected and accelerated (acceleration from the jackknife)
+
+    Returns
+        BootstrapCI of estimate, low and high, LabelledArrays if values was one
+    """
+    # imported here so that importing this module doesn't load scipy
+    from scipy.special import ndtr, ndtri
+
+    labelled = values if isinstance(values, LabelledArray) else None
+    values = np.asarray(values)
+    axis = axis % values.ndim
+    if labelled is not None:
+        assert axis >= len(labelled.dims), "subjects must be an unlabelled axis"
+
+    if indices is None:
+        indices = draw_bootstrap_indices(values.shape[axis])
+
+    estimate = statistic(values, axis=axis)
+    distribution = bootstrap_distribution(values, indices, axis, statistic)
+    probabilities = np.array([alpha / 2, 1 - alpha / 2])
+
+    if method == "percentile":
+        low, high = np.percentile(distribution, 100 * probabilities, axis=0)
+    elif method == "bca":
+        n_boot = distribution.shape[0]
+
+        # bias correction: how much of the bootstrap distribution is below the
+        # estimate, clipped so that it stays finite. Resamples that only reorder the
+        # subjects tie with the estimate up to rounding, which depends on how the
+        # tensor is laid out, so ties are compared with a tolerance.
+        is_tie = np.isclose(distribution, estimate, rtol=1e-12, atol=0)
+        proportion = (
+            np.sum((distribution < estimate) & ~is_tie, axis=0)
+            + 0.5 * np.sum(is_tie, axis=0)
+        ) / n_boot
+        proportion = np.clip(proportion, 1 / (n_boot + 1), n_boot / (n_boot + 1))
+        z0 = ndtri(proportion)
+
+        # acceleration from the skewness of the jackknife distribution
+        jackknife = _jackknife(np.moveaxis(values, axis, 0), statistic)
+        deviations = jackknife.mean(axis=0) - jackknife
+        numerator = np.sum(deviations ** 3, axis=0)
+        denominator = 6 * np.sum(deviations ** 2, axis=0) ** 1.5
+        with np.errstate(divide="ignore", invalid="ignore"):
+            acceleration = np.where(denominator > 0, numerator / denominator, 0)
+
+        bounds = []
+        for z_alpha in ndtri(probabilities):
+            shifted = z0 + z_alpha
+            adjusted = ndtr(z0 + shifted / (1 - acceleration * shifted))
+            bounds.append(_quantiles(distribution, np.asarray(adjusted)))
+        low, high = bounds
+    else:
+        raise Exception(f"Method {method} not recognized")
+
+    if labelled is not None:
+        dims, coords = labelled.dims, labelled.coords
+        estimate, low, high = [
+            LabelledArray(np.asarray(x), dims, coords) for x in [estimate, low, high]
+        ]
+
+    return BootstrapCI(estimate=estimate, low=low, high=high)
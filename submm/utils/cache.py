@@ -0,0 +1,176 @@
+"""
+In-process memoization for data loaded from analysis_outputs
+"""
+
+import os
+import inspect
+import functools
+from collections import OrderedDict
+
+import numpy as np
+
+from submm.constants import LOAD_CACHE_BYTES
+from submm.utils.labelled import LabelledArray
+
+
+class LRUCache:
+    """
+    Least-recently-used cache with a budget on the total number of bytes held
+
+    Inputs
+        max_bytes (int): once the cached values exceed this many bytes, the least
+            recently used entries are evicted
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key):
+        """
+        Returns the value stored for key and marks it as most recently used
+        """
+        value, nbytes = self._entries.pop(key)
+        self._entries[key] = (value, nbytes)
+        return value
+
+    def put(self, key, value, nbytes):
+        """
+        Stores value under key, evicting older entries as needed. Values larger than
+        the whole budget are not stored.
+        """
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key)[1]
+
+        if nbytes > self.max_bytes:
+            return
+
+        self._entries[key] = (value, nbytes)
+        self.nbytes += nbytes
+        self.evict()
+
+    def evict(self):
+        """
+        Drops least recently used entries until the cache is within budget
+        """
+        while self.nbytes > self.max_bytes:
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self.nbytes -= nbytes
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+
+# single cache shared by every loader in the process
+_LOAD_CACHE = LRUCache(LOAD_CACHE_BYTES)
+
+
+def set_load_cache_budget(max_bytes):
+    """
+    Changes the memory budget of the load cache, evicting entries if necessary
+
+    Inputs
+        max_bytes (int): new budget in bytes, 0 disables caching
+    """
+    _LOAD_CACHE.max_bytes = max_bytes
+    _LOAD_CACHE.evict()
+
+
+def clear_load_cache():
+    """
+    Empties the load cache
+    """
+    _LOAD_CACHE.clear()
+
+
+def _hashable(value):
+    """
+    Converts lists (e.g., of partitions) to tuples so arguments can be dict keys
+    """
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(x) for x in value)
+    return value
+
+
+def _freeze(value):
+    """
+    Returns value with every array replaced by a read-only view of itself.
+    Containers are copied so callers can't modify what's stored in the cache.
+    """
+    if isinstance(value, np.ndarray):
+        view = value.view()
+        view.flags.writeable = False
+        return view
+    if isinstance(value, LabelledArray):
+        return LabelledArray(_freeze(value.values), value.dims, value.coords)
+    if isinstance(value, dict):
+        return {k: _freeze(v) for (k, v) in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_freeze(x) for x in value)
+    return value
+
+
+def _nbytes(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, LabelledArray):
+        return value.values.nbytes
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_nbytes(x) for x in value)
+    return 0
+
+
+def cached_load(get_path):
+    """
+    Decorator that memoizes a loading function in the shared LRU cache. Results are
+    keyed by the path of the file being read, its modification time, and the
+    arguments to the function, so rewriting the file invalidates old entries.
+    Arrays are returned as read-only views.
+
+    Inputs
+        get_path (callable): maps a dict of the decorated function's arguments
+            (with defaults filled in) to the path of the file it reads
+    """
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            path = get_path(bound.arguments)
+
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                # let the loader raise its own error for missing files
+                return func(*args, **kwargs)
+
+            key = (
+                func.__module__,
+                func.__qualname__,
+                path,
+                mtime,
+                _hashable(tuple(bound.arguments.items())),
+            )
+            if key not in _LOAD_CACHE:
+                value = _freeze(func(*args, **kwargs))
+                _LOAD_CACHE.put(key, value, _nbytes(value))
+                return _freeze(value)
+
+            return _freeze(_LOAD_CACHE.get(key))
+
+        return wrapper
+
+    return decorator
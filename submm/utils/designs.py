@@ -0,0 +1,173 @@
+"""
+Layouts of the conditions in each RDM, and registry of the model designs (domain,
+category, depth, intercept) fit to RDMs
+
+Each layout and design is built once per process and shared by every script and
+fitter. Their arrays (index maps, regressor matrices, the lower-triangle design
+matrix and its pseudo-inverse) are read-only so that the shared objects can't be
+modified.
+"""
+
+import functools
+from collections import namedtuple
+
+import numpy as np
+
+from submm.constants import N_DOMAINS, CATEGORIES_PER_DOMAIN, N_DEPTHS
+
+Design = namedtuple(
+    "Design",
+    [
+        "names",  # name of each regressor
+        "matrices",  # (m, n, n) full regressor matrices
+        "tril_indices",  # (rows, cols) of the cells that are fit
+        "X",  # (n_cells, m) design matrix
+        "pinv",  # (m, n_cells) pseudo-inverse of X
+        "gram",  # (m, m) Gram matrix X.T @ X
+        "condition_number",  # condition number of X
+        "n_conditions",  # number of rows of the RDMs
+        "with_diagonal",  # whether the diagonal is part of the fit cells
+        "add_intercept",  # whether the last regressor is an intercept
+    ],
+)
+
+
+def _read_only(x):
+    x = np.array(x)
+    x.flags.writeable = False
+    return x
+
+
+class ConditionLayout:
+    """
+    Order of the conditions of an RDM: each domain has the same number of
+    categories, and conditions are ordered by category, then by depth
+
+    Inputs
+        n_domains (int): number of domains
+        categories_per_domain (int): number of categories in each domain
+        n_depths (int): number of cortical depths, 1 for single-depth RDMs
+
+    Attributes
+        n_categories, n_conditions (int)
+        domain_labels, category_labels, depth_labels (n_conditions,): the domain,
+            category, and depth of each condition
+        depth_indices (n_depths, n_categories): conditions at each depth, in
+            category order
+        domain_blocks (n_domains, categories_per_domain): categories of each domain
+    """
+
+    def __init__(self, n_domains, categories_per_domain, n_depths):
+        self.n_domains = n_domains
+        self.categories_per_domain = categories_per_domain
+        self.n_depths = n_depths
+        self.n_categories = n_domains * categories_per_domain
+        self.n_conditions = self.n_categories * n_depths
+
+        conditions = np.arange(self.n_conditions)
+        self.category_labels = _read_only(conditions // n_depths)
+        self.domain_labels = _read_only(self.category_labels // categories_per_domain)
+        self.depth_labels = _read_only(conditions % n_depths)
+        self.depth_indices = _read_only(conditions.reshape(self.n_categories, -1).T)
+        self.domain_blocks = _read_only(
+            np.arange(self.n_categories).reshape(n_domains, categories_per_domain)
+        )
+
+    def __repr__(self):
+        return (
+            f"ConditionLayout(n_domains={self.n_domains}, "
+            f"categories_per_domain={self.categories_per_domain}, "
+            f"n_depths={self.n_depths})"
+        )
+
+    def model_labels(self):
+        """
+        Returns the labels that define each model regressor: keys are regressor
+        names, values are the label of each condition. Single-depth layouts have
+        no depth regressor.
+        """
+        labels = {"domain": self.domain_labels, "category": self.category_labels}
+        if self.n_depths > 1:
+            labels["depth"] = self.depth_labels
+        return labels
+
+    def single_depth(self):
+        """
+        Returns the layout of the RDM at one depth
+        """
+        return get_layout(1, self.n_domains, self.categories_per_domain)
+
+
+@functools.lru_cache(maxsize=None)
+def get_layout(
+    n_depths=N_DEPTHS,
+    n_domains=N_DOMAINS,
+    categories_per_domain=CATEGORIES_PER_DOMAIN,
+):
+    """
+    Returns the (shared) layout with the given number of depths, domains, and
+    categories per domain
+    """
+    return ConditionLayout(n_domains, categories_per_domain, n_depths)
+
+
+def get_layout_for_size(n_conditions):
+    """
+    Returns the layout of an RDM with n_conditions rows, e.g., 30 (3 depths), 60 (6
+    depths) or 10 (a single depth)
+    """
+    n_categories = N_DOMAINS * CATEGORIES_PER_DOMAIN
+    if n_conditions % n_categories != 0:
+        raise Exception(f"No layout for {n_conditions} x {n_conditions} RDMs")
+
+    return get_layout(n_conditions // n_categories)
+
+
+def get_design(n_conditions=30, with_diagonal=True, add_intercept=True):
+    """
+    Returns the (shared, immutable) design for fitting RDMs of a given size. Each
+    regressor is 0 for pairs of conditions that share a label and 1 otherwise.
+
+    Inputs
+        n_conditions (int): number of rows of the RDMs, e.g., 30 (all 3 depths), 60
+            (all 6 depths) or 10 (one depth), see get_layout_for_size
+        with_diagonal (bool): if True, the diagonal is part of the fit cells
+        add_intercept (bool): if True, a constant regressor is added last
+
+    Returns
+        design (Design)
+    """
+    # normalize arguments so that equivalent calls share one cached design
+    return _build_design(int(n_conditions), bool(with_diagonal), bool(add_intercept))
+
+
+@functools.lru_cache(maxsize=None)
+def _build_design(n_conditions, with_diagonal, add_intercept):
+    layout = get_layout_for_size(n_conditions)
+
+    names, matrices = [], []
+    for name, indices in layout.model_labels().items():
+        xx, yy = np.meshgrid(indices, indices)
+        names.append(name)
+        matrices.append((xx != yy).astype(float))
+
+    if add_intercept:
+        names.append("intercept")
+        matrices.append(np.ones((n_conditions, n_conditions)))
+
+    matrices = np.array(matrices)
+    rows, cols = np.tril_indices(n_conditions, k=0 if with_diagonal else -1)
+    X = matrices[:, rows, cols].T
+
+    return Design(
+        names=tuple(names),
+        matrices=_read_only(matrices),
+        tril_indices=(_read_only(rows), _read_only(cols)),
+        X=_read_only(X),
+        pinv=_read_only(np.linalg.pinv(X)),
+        gram=_read_only(X.T @ X),
+        condition_number=np.linalg.cond(X),
+        n_conditions=n_conditions,
+        with_diagonal=with_diagonal,
+        add_intercept=add_intercept,
+    )
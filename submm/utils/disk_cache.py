@@ -0,0 +1,324 @@
+"""
+Persistent, content-addressed cache for derived analysis artifacts
+
+Artifacts (e.g., RDM fit weights and MDS embeddings) are stored as compressed .npz
+files alongside a small JSON file of metadata. Each artifact is keyed by a hash of
+the contents of the input files it was computed from, the parameters of the
+computation, the code of the function that computed it (bytecode, constants and
+names), the source of any modules or functions it is declared to depend on, and the
+versions of numpy and any libraries it names (e.g., sklearn for MDS embeddings), so
+an artifact is reused across runs until something upstream changes.
+"""
+
+import os
+import json
+import time
+import hashlib
+import inspect
+import importlib
+import functools
+
+import numpy as np
+
+from submm.constants import PATHS, ARTIFACT_CACHE_BYTES
+from submm.utils.labelled import LabelledArray
+
+# digests of input files, keyed by (path, size, mtime) so files are hashed only once
+_FILE_DIGESTS = {}
+
+# modules every cached function depends on, e.g., through the sessions and partitions
+# in submm.constants
+ALWAYS_DEPENDS_ON = ["submm.constants"]
+
+
+def file_digest(path):
+    """
+    Returns the SHA-256 hex digest of the contents of a file
+    """
+    stat = os.stat(path)
+    stamp = (path, stat.st_size, stat.st_mtime)
+    if stamp not in _FILE_DIGESTS:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(2 ** 20), b""):
+                digest.update(chunk)
+        _FILE_DIGESTS[stamp] = digest.hexdigest()
+
+    return _FILE_DIGESTS[stamp]
+
+
+def _update_hash(digest, value):
+    """
+    Feeds a (possibly nested) parameter value into a hashlib object
+    """
+    if isinstance(value, np.ndarray):
+        digest.update(f"ndarray{value.dtype.str}{value.shape}".encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, LabelledArray):
+        digest.update(f"LabelledArray{value.dims}{value.coords}".encode())
+        _update_hash(digest, np.asarray(value.values))
+    elif isinstance(value, dict):
+        digest.update(b"dict")
+        for k in sorted(value.keys(), key=str):
+            digest.update(repr(k).encode())
+            _update_hash(digest, value[k])
+    elif isinstance(value, (list, tuple)):
+        digest.update(type(value).__name__.encode())
+        for x in value:
+            _update_hash(digest, x)
+    else:
+        digest.update(repr(value).encode())
+
+
+def code_digest(code):
+    """
+    Returns the SHA-256 hex digest of a code object: its bytecode, the names it
+    refers to and its constants (including the code of nested functions), so that
+    editing a literal argument, e.g., with_diagonal=True, changes the digest
+    """
+    digest = hashlib.sha256(code.co_code)
+    digest.update(repr(code.co_names).encode())
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            digest.update(code_digest(const).encode())
+        else:
+            digest.update(repr(const).encode())
+    return digest.hexdigest()
+
+
+def source_digest(obj):
+    """
+    Returns the SHA-256 hex digest of the source of a module or function, given as
+    the object itself or as a dotted module name, e.g., 'submm.utils.rsm_utils'
+    """
+    if isinstance(obj, str):
+        obj = importlib.import_module(obj)
+    return hashlib.sha256(inspect.getsource(obj).encode()).hexdigest()
+
+
+def _flatten(value, arrays):
+    """
+    Splits a nested artifact into a JSON-able structure and a dict of arrays
+    """
+    if isinstance(value, np.ndarray):
+        key = f"arr_{len(arrays)}"
+        arrays[key] = value
+        return {"type": "array", "key": key}
+    if isinstance(value, LabelledArray):
+        return {
+            "type": "labelled",
+            "values": _flatten(np.asarray(value.values), arrays),
+            "dims": list(value.dims),
+            "coords": value.coords,
+        }
+    if isinstance(value, dict):
+        return {
+            "type": "dict",
+            "items": [[k, _flatten(v, arrays)] for (k, v) in value.items()],
+        }
+    if isinstance(value, (list, tuple)):
+        return {
+            "type": type(value).__name__,
+            "items": [_flatten(x, arrays) for x in value],
+        }
+    return {"type": "scalar", "value": value}
+
+
+def _unflatten(structure, arrays):
+    kind = structure["type"]
+    if kind == "array":
+        return arrays[structure["key"]]
+    if kind == "labelled":
+        values = _unflatten(structure["values"], arrays)
+        return LabelledArray(values, structure["dims"], structure["coords"])
+    if kind == "dict":
+        return {k: _unflatten(v, arrays) for (k, v) in structure["items"]}
+    if kind in ["list", "tuple"]:
+        items = [_unflatten(x, arrays) for x in structure["items"]]
+        return tuple(items) if kind == "tuple" else items
+    return structure["value"]
+
+
+class ArtifactCache:
+    """
+    On-disk cache of derived arrays with a size cap and least-recently-used eviction
+
+    Inputs
+        root (str): directory to store artifacts in
+        max_bytes (int): total size of stored artifacts above which the least
+            recently used ones are deleted
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def _paths(self, key):
+        return f"{self.root}/{key}.npz", f"{self.root}/{key}.json"
+
+    def key(self, name, files=(), **params):
+        """
+        Computes the cache key for an artifact
+
+        Inputs
+            name (str): name of the artifact, e.g., 'figure_7b_partition_weights'
+            files (list): paths of the files the artifact is derived from
+            params: any other inputs to the computation, including arrays
+        """
+        digest = hashlib.sha256(name.encode())
+        for path in files:
+            digest.update(file_digest(path).encode())
+        _update_hash(digest, params)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Returns the artifact stored under key, or None if there isn't one
+        """
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "r") as f:
+                metadata = json.load(f)
+            with np.load(data_path) as npz:
+                arrays = {k: npz[k] for k in npz.files}
+        except (OSError, ValueError):
+            return None
+
+        # mark as recently used
+        os.utime(data_path)
+        return _unflatten(metadata["structure"], arrays)
+
+    def put(self, key, value, metadata=None):
+        """
+        Stores an artifact (an array, or dicts/lists/tuples of arrays) under key
+        """
+        if self.max_bytes <= 0:
+            return
+
+        os.makedirs(self.root, exist_ok=True)
+        data_path, meta_path = self._paths(key)
+
+        arrays = {}
+        structure = _flatten(value, arrays)
+        metadata = dict(metadata or {})
+        metadata.update({"structure": structure, "created": time.time()})
+
+        # write to temporary files first so readers never see partial artifacts
+        tmp_data_path = f"{data_path}.{os.getpid()}.tmp"
+        with open(tmp_data_path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        with open(f"{meta_path}.{os.getpid()}.tmp", "w") as f:
+            json.dump(metadata, f, default=repr)
+        os.replace(f"{meta_path}.{os.getpid()}.tmp", meta_path)
+        os.replace(tmp_data_path, data_path)
+
+        self.evict()
+
+    def evict(self):
+        """
+        Deletes least recently used artifacts until the cache is within its size cap
+        """
+        if not os.path.isdir(self.root):
+            return
+
+        entries = []
+        for fname in os.listdir(self.root):
+            if fname.endswith(".npz"):
+                stat = os.stat(f"{self.root}/{fname}")
+                entries.append((stat.st_mtime, stat.st_size, fname[: -len(".npz")]))
+
+        total = sum(size for (_, size, _) in entries)
+        for _, size, key in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for path in self._paths(key):
+                if os.path.isfile(path):
+                    os.remove(path)
+            total -= size
+
+    def get_or_compute(self, name, compute, files=(), **params):
+        """
+        Returns the cached artifact for (name, files, params), computing and storing
+        it with compute(**params) if it isn't cached yet
+        """
+        key = self.key(name, files=files, **params)
+        value = self.get(key)
+        if value is None:
+            value = compute(**params)
+            self.put(key, value, {"name": name, "files": list(files), "params": params})
+
+        return value
+
+
+_ARTIFACT_CACHE = ArtifactCache(PATHS["artifact_cache"], ARTIFACT_CACHE_BYTES)
+
+
+def get_artifact_cache():
+    """
+    Returns the artifact cache shared by every script
+    """
+    return _ARTIFACT_CACHE
+
+
+def disk_cached(name, files=None, depends_on=(), libraries=()):
+    """
+    Decorator that stores the outputs of a function in the artifact cache. The
+    function's code is part of the key, so editing it invalidates old artifacts.
+    Code it calls is only part of the key if listed in depends_on (submm.constants
+    always is, see ALWAYS_DEPENDS_ON).
+
+    Inputs
+        name (str): unique name for the artifact, e.g., 'figure_7b_partition_weights'
+        files (callable): maps a dict of the decorated function's arguments (with
+            defaults filled in) to a list of the input files it reads
+        depends_on (list): modules or functions (or dotted module names) the
+            function calls, whose source is part of the key, e.g.,
+            ['submm.utils.rsm_utils', 'submm.utils.designs']
+        libraries (list): names of the packages whose results the artifact depends
+            on, e.g., ['sklearn'], whose versions are part of the key (numpy's
+            always is)
+    """
+
+    def decorator(func):
+        signature = inspect.signature(func)
+        code = code_digest(func.__code__)
+        # hashed on first call, the source can't change within a run
+        dependencies = []
+        versions = {}
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = dict(bound.arguments)
+            input_files = files(params) if files is not None else []
+
+            if not dependencies:
+                dependencies[:] = [
+                    source_digest(obj) for obj in ALWAYS_DEPENDS_ON + list(depends_on)
+                ]
+            if not versions:
+                versions.update(
+                    (library, importlib.import_module(library).__version__)
+                    for library in ["numpy"] + list(libraries)
+                )
+
+            cache = get_artifact_cache()
+            key = cache.key(
+                name,
+                files=input_files,
+                code=code,
+                depends_on=dependencies,
+                versions=versions,
+                **params,
+            )
+            value = cache.get(key)
+            if value is None:
+                value = func(*args, **kwargs)
+                cache.put(key, value, {"name": name, "files": input_files})
+
+            return value
+
+        return wrapper
+
+    return decorator
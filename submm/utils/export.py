@@ -0,0 +1,252 @@
+"""
+Exports the .mat files in analysis_outputs/ to long-format columnar tables
+
+Each file becomes one table with a column per level of its group hierarchy (e.g.,
+session, metric, partition), a column per axis of its datasets (e.g., row and col of
+an RSM), and a single 'value' column. Label columns are dictionary-encoded.
+
+Tables are written as hive-partitioned Parquet datasets, with a directory per
+partition and metric (e.g., rsms/partition=VTC_lateral/metric=znorm/), so filters on
+those columns only open the matching files. Within each file rows are sorted by
+session and every session starts a new row group, so the statistics of each row
+group cover a single session and filters on session skip the others.
+
+Requires pyarrow (pip install -e .[parquet]).
+
+Usage
+    python -m submm.utils.export [output_directory]
+"""
+
+import os
+import sys
+import shutil
+
+import h5py
+import numpy as np
+
+from submm.constants import PATHS, FSID_SESSIONS
+from submm.utils.rsm_cube import H5_LEVELS
+from submm.utils.metric_utils import MEANS_LEVELS
+
+# for each file in PATHS: the root group, the names of the group levels beneath it,
+# and the names of the (non-singleton) axes of each dataset
+TABLE_LAYOUTS = {
+    "rsms": ("corrmats", H5_LEVELS, ["row", "col"]),
+    "rsms_r2_control": ("corrmats", H5_LEVELS, ["row", "col"]),
+    "rsms_6depth": ("corrmats", H5_LEVELS, ["row", "col"]),
+    "metric_means": ("means", MEANS_LEVELS, ["depth"]),
+    "metric_means_r2control": ("means", MEANS_LEVELS, ["depth"]),
+    "tsnr": ("tsnr_struct", ["partition"], ["depth", "subject"]),
+    "r2": ("r2_struct", ["split", "partition"], ["depth", "subject"]),
+}
+
+# dataset axes that index a list of labels, exported as a dictionary-encoded column
+# of the labels: keys are axis names, values are (column name, labels). Subjects of
+# tsnr.mat and r_squared.mat are in the order of FSID_SESSIONS, and r_squared.mat
+# also has the 3T session last.
+AXIS_LABELS = {"subject": ("session", FSID_SESSIONS + ["C1051_20161006"])}
+
+# columns to sort rows by (when present) so row group statistics are selective
+SORT_COLUMNS = ["partition", "metric", "session", "glm_dir", "noise_type", "thresh"]
+
+# columns (when present) that each get a directory level of the dataset
+PARTITION_COLUMNS = ["partition", "metric"]
+
+# column whose blocks of rows each start a new row group (when present)
+ROW_GROUP_COLUMN = "session"
+
+# most rows per Parquet row group, a session with more rows is split
+ROW_GROUP_SIZE = 2 ** 16
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa:F401
+    except ImportError:
+        raise ImportError(
+            "Exporting columnar tables requires pyarrow: pip install -e .[parquet]"
+        )
+
+
+def _squeeze_to(values, ndim):
+    """
+    Drops trailing singleton axes of values until it has ndim axes
+    """
+    singletons = [i for i, n in enumerate(values.shape) if n == 1]
+    n_drop = values.ndim - ndim
+    assert 0 <= n_drop <= len(singletons), f"can't squeeze {values.shape} to {ndim}D"
+    return values.squeeze(axis=tuple(singletons[len(singletons) - n_drop :]))
+
+
+def h5_to_long_frame(h5_path, root, levels, axis_names):
+    """
+    Flattens every dataset under an .h5 group into one long-format table
+
+    Inputs
+        h5_path (str): path to the .mat/.h5 file
+        root (str): name of the group to flatten
+        levels (list): names of the group levels beneath root
+        axis_names (list): names of the non-singleton axes of each dataset
+
+    Returns
+        pd.DataFrame with one categorical column per level, one integer column per
+            dataset axis (categorical for axes in AXIS_LABELS), and a float 'value'
+            column
+    """
+    import pandas as pd
+
+    leaves = []
+
+    def collect(name, obj):
+        if isinstance(obj, h5py.Dataset):
+            leaves.append((name.split("/"), obj[()]))
+
+    with h5py.File(h5_path, "r") as f:
+        f[root].visititems(collect)
+
+    # drop singleton axes, e.g., of the (3, 1) metric means
+    leaves = [(key, _squeeze_to(values, len(axis_names))) for (key, values) in leaves]
+    sizes = np.array([values.size for (_, values) in leaves])
+
+    columns = {}
+    for level_idx, level in enumerate(levels):
+        labels = [key[level_idx] for (key, _) in leaves]
+        categories = sorted(set(labels))
+        codes = np.array([categories.index(x) for x in labels])
+        columns[level] = pd.Categorical.from_codes(
+            np.repeat(codes, sizes), categories=categories
+        )
+
+    for axis_idx, axis_name in enumerate(axis_names):
+        positions = np.concatenate(
+            [np.indices(values.shape)[axis_idx].ravel() for (_, values) in leaves]
+        ).astype(np.int16)
+        if axis_name not in AXIS_LABELS:
+            columns[axis_name] = positions
+            continue
+
+        column, labels = AXIS_LABELS[axis_name]
+        labels = labels[: positions.max() + 1]
+        columns[column] = pd.Categorical.from_codes(positions, categories=labels)
+
+    columns["value"] = np.concatenate([values.ravel() for (_, values) in leaves])
+
+    frame = pd.DataFrame(columns)
+    axis_columns = [AXIS_LABELS.get(a, (a,))[0] for a in axis_names]
+    sort_columns = [c for c in SORT_COLUMNS if c in levels + axis_columns]
+    sort_columns += [c for c in axis_columns if c not in sort_columns]
+    return frame.sort_values(sort_columns).reset_index(drop=True)
+
+
+def get_table_path(name, out_dir=None):
+    """
+    Returns the directory of the dataset written for a table
+    """
+    if out_dir is None:
+        out_dir = PATHS["tables"]
+    return f"{out_dir}/{name}"
+
+
+def write_partitioned_table(frame, path):
+    """
+    Writes a long-format table as a hive-partitioned Parquet dataset, with a file per
+    combination of PARTITION_COLUMNS and a row group per block of ROW_GROUP_COLUMN
+
+    Inputs
+        frame (pd.DataFrame): from h5_to_long_frame, sorted by SORT_COLUMNS
+        path (str): directory of the dataset, replaced if it exists
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+
+    partition_columns = [c for c in PARTITION_COLUMNS if c in frame.columns]
+    groups = frame.groupby(partition_columns, observed=True, sort=False)
+    for labels, group in groups:
+        labels = labels if isinstance(labels, tuple) else (labels,)
+        group_dir = "/".join(
+            [path] + [f"{c}={label}" for c, label in zip(partition_columns, labels)]
+        )
+        os.makedirs(group_dir)
+
+        group = group.drop(columns=partition_columns)
+        if ROW_GROUP_COLUMN in group.columns:
+            # rows are sorted, so each block is one contiguous slice
+            codes = group[ROW_GROUP_COLUMN].cat.codes.values
+            starts = np.flatnonzero(np.diff(codes, prepend=-1))
+        else:
+            starts = np.array([0])
+        stops = np.append(starts[1:], len(group))
+
+        table = pa.Table.from_pandas(group, preserve_index=False)
+        with pq.ParquetWriter(f"{group_dir}/part-0.parquet", table.schema) as writer:
+            for start, stop in zip(starts, stops):
+                writer.write_table(
+                    table.slice(start, stop - start), row_group_size=ROW_GROUP_SIZE
+                )
+
+
+def export_analysis_outputs(out_dir=None, names=None):
+    """
+    Writes a Parquet table for each file of analysis_outputs that exists
+
+    Inputs
+        out_dir (str): directory to write tables to, defaults to PATHS['tables']
+        names (list): keys of TABLE_LAYOUTS to export, defaults to all of them
+
+    Returns
+        paths (dict): keys are names, values are paths of the written tables
+    """
+    _require_pyarrow()
+
+    if out_dir is None:
+        out_dir = PATHS["tables"]
+    if names is None:
+        names = list(TABLE_LAYOUTS.keys())
+    os.makedirs(out_dir, exist_ok=True)
+
+    paths = {}
+    for name in names:
+        if not os.path.isfile(PATHS[name]):
+            continue
+
+        root, levels, axis_names = TABLE_LAYOUTS[name]
+        frame = h5_to_long_frame(PATHS[name], root, levels, axis_names)
+        paths[name] = get_table_path(name, out_dir)
+        write_partitioned_table(frame, paths[name])
+
+    return paths
+
+
+def read_long_table(name, filters=None, columns=None, out_dir=None):
+    """
+    Reads an exported table, only opening the files and decoding the row groups that
+    match the filters
+
+    Inputs
+        name (str): key of TABLE_LAYOUTS, e.g., 'rsms'
+        filters (list): pyarrow filters, e.g., [("partition", "==", "VTC_lateral")]
+        columns (list): subset of columns to read
+        out_dir (str): directory tables were written to, defaults to PATHS['tables']
+
+    Returns
+        pd.DataFrame
+    """
+    import pandas as pd
+
+    _require_pyarrow()
+    return pd.read_parquet(
+        get_table_path(name, out_dir),
+        engine="pyarrow",
+        filters=filters,
+        columns=columns,
+        partitioning="hive",
+    )
+
+
+if __name__ == "__main__":
+    out_dir = sys.argv[1] if len(sys.argv) > 1 else None
+    for name, path in export_analysis_outputs(out_dir).items():
+        print(f"Wrote {name} to {path}")
@@ -0,0 +1,102 @@
+"""
+Lightweight container for arrays whose leading axes carry string labels
+"""
+
+import numpy as np
+
+
+class LabelledArray:
+    """
+    Pairs an ndarray with a name for each of its leading axes and the labels along
+    each of those axes. Any trailing axes (e.g., the two axes of an RSM) are left
+    unlabelled.
+
+    Inputs
+        values (np.ndarray): the underlying data, which may be an np.memmap
+        dims (list): names of the labelled leading axes of values
+        coords (dict): keys are entries of dims, values are lists of labels
+    """
+
+    def __init__(self, values, dims, coords):
+        dims = tuple(dims)
+        assert len(dims) <= values.ndim, "more dims than axes in values"
+        for axis, dim in enumerate(dims):
+            assert (
+                len(coords[dim]) == values.shape[axis]
+            ), f"{dim} has {len(coords[dim])} labels but {values.shape[axis]} entries"
+
+        self.values = values
+        self.dims = dims
+        self.coords = {dim: list(coords[dim]) for dim in dims}
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def __array__(self, dtype=None):
+        return np.asarray(self.values, dtype=dtype)
+
+    def __repr__(self):
+        axes = ", ".join(f"{dim}: {len(self.coords[dim])}" for dim in self.dims)
+        return f"LabelledArray({axes}; shape={self.values.shape})"
+
+    def axis(self, dim):
+        """
+        Returns the integer axis corresponding to the named dim
+        """
+        return self.dims.index(dim)
+
+    def index(self, dim, label):
+        """
+        Returns the integer position of label along the named dim
+        """
+        try:
+            return self.coords[dim].index(label)
+        except ValueError:
+            raise KeyError(f"{label} is not a label of {dim}")
+
+    def sel(self, **selectors):
+        """
+        Label-based selection. A single label drops its axis, a list of labels keeps
+        it. Runs of consecutive labels are turned into slices, so that selections
+        on a memory-mapped array remain views rather than copies.
+
+        Inputs
+            selectors: keys are dims, values are a label or a list of labels
+
+        Returns
+            LabelledArray if any labelled axes remain, otherwise an np.ndarray
+        """
+        for dim in selectors:
+            assert dim in self.dims, f"{dim} is not one of {self.dims}"
+
+        basic_index = []
+        fancy_indices = {}
+        dims, coords = [], {}
+        for dim in self.dims:
+            if dim not in selectors:
+                basic_index.append(slice(None))
+                dims.append(dim)
+                coords[dim] = self.coords[dim]
+                continue
+
+            selector = selectors[dim]
+            if isinstance(selector, (list, tuple, np.ndarray)):
+                positions = np.array([self.index(dim, x) for x in selector], dtype=int)
+                dims.append(dim)
+                coords[dim] = list(selector)
+                if positions.size > 0 and np.all(np.diff(positions) == 1):
+                    basic_index.append(slice(positions[0], positions[-1] + 1))
+                else:
+                    basic_index.append(slice(None))
+                    fancy_indices[len(dims) - 1] = positions
+            else:
+                basic_index.append(self.index(dim, selector))
+
+        values = self.values[tuple(basic_index)]
+        for axis, positions in fancy_indices.items():
+            values = np.take(values, positions, axis=axis)
+
+        if len(dims) == 0:
+            return values
+        return LabelledArray(values, dims, coords)
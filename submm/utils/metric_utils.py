@@ -0,0 +1,128 @@
+"""
+Utilities for reading ROI-averaged GLM metrics
+"""
+
+import h5py
+import numpy as np
+
+from submm.constants import PATHS, FSID_SESSIONS
+from submm.utils.cache import cached_load
+from submm.utils.labelled import LabelledArray
+from submm.utils.rsm_cube import order_sessions
+
+# order of the group levels under /means in the metric means files
+MEANS_LEVELS = ["session", "glm_dir", "metric", "partition", "contrast", "abs"]
+
+# order of the axes of the array returned by load_metric_means
+MEANS_DIMS = ["session", "contrast", "metric", "partition", "abs", "depth"]
+
+
+@cached_load(
+    lambda args: PATHS["metric_means_r2control"]
+    if args["r2_control"]
+    else PATHS["metric_means"]
+)
+def load_metric_means(r2_control=False, glm_dir="GLM_vanilla"):
+    """
+    Reads every ROI-averaged metric in a metric means file in one pass
+
+    Inputs
+        r2_control (bool): if True, load from PATHS['metric_means_r2control']
+        glm_dir (str): the name of the GLM to get data for, like 'GLM_vanilla'
+
+    Returns
+        means (LabelledArray): session x contrast x metric x partition x abs x depth,
+            NaN wherever the file has no entry (e.g., metrics that weren't saved)
+    """
+    mm_path = PATHS["metric_means_r2control"] if r2_control else PATHS["metric_means"]
+
+    leaves = {}
+
+    def collect(name, obj):
+        if isinstance(obj, h5py.Dataset):
+            key = dict(zip(MEANS_LEVELS, name.split("/")))
+            if key["glm_dir"] == glm_dir:
+                leaves[name] = (key, obj[()].ravel())
+
+    with h5py.File(mm_path, "r") as f:
+        f["means"].visititems(collect)
+    assert len(leaves) > 0, f"no metric means for {glm_dir} in {mm_path}"
+
+    n_depths = max(values.shape[0] for (_, values) in leaves.values())
+    coords = {
+        dim: sorted({key[dim] for (key, _) in leaves.values()})
+        for dim in MEANS_DIMS[:-1]
+    }
+    coords["session"] = order_sessions(coords["session"])
+    coords["depth"] = list(range(n_depths))
+
+    means = np.full([len(coords[dim]) for dim in MEANS_DIMS], np.nan)
+    for key, values in leaves.values():
+        idx = tuple(coords[dim].index(key[dim]) for dim in MEANS_DIMS[:-1])
+        means[idx][: values.shape[0]] = values
+
+    return LabelledArray(means, MEANS_DIMS, coords)
+
+
+def _read_partition_arrays(group):
+    """
+    Reads every partition's depths x subjects dataset under an .h5 group
+
+    Returns
+        partitions (list): partition names in sorted order
+        values (n_depths, n_subjects, n_partitions)
+    """
+    partitions = sorted(group.keys())
+    values = np.stack([group[partition][()] for partition in partitions], axis=-1)
+    return partitions, values
+
+
+@cached_load(lambda args: PATHS["tsnr"])
+def _load_tsnr_tensor():
+    with h5py.File(PATHS["tsnr"], "r") as f:
+        partitions, tsnr = _read_partition_arrays(f["tsnr_struct"])
+
+    return partitions, tsnr
+
+
+@cached_load(lambda args: PATHS["r2"])
+def _load_r2_tensor():
+    with h5py.File(PATHS["r2"], "r") as f:
+        odd_partitions, odd_r2 = _read_partition_arrays(f["r2_struct"]["odd"])
+        even_partitions, even_r2 = _read_partition_arrays(f["r2_struct"]["even"])
+    assert odd_partitions == even_partitions, "odd and even partitions differ"
+
+    # convert back to fraction and average the odd and even splits
+    r2 = (odd_r2 + even_r2) / 200.0
+    return odd_partitions, r2
+
+
+def load_signal_metrics():
+    """
+    Loads tSNR and R-squared for every partition, with each file opened once.
+    R-squared is averaged over the odd and even splits and converted to a fraction.
+
+    NB
+        These are computed on stone and transferred over, not computed over
+            vertices here. See analyses/02_tsnr and analyses/07_variance_explained.
+
+    Returns
+        metrics (dict): keys are 'tSNR' and 'R2', values are LabelledArrays of
+            depth x subject x partition. Only subjects in FSID_SESSIONS are kept
+            (the 3T session is dropped from R-squared).
+    """
+    metrics = {}
+    for name, (partitions, values) in zip(
+        ["tSNR", "R2"], [_load_tsnr_tensor(), _load_r2_tensor()]
+    ):
+        n_subjects = min(values.shape[1], len(FSID_SESSIONS))
+        coords = {
+            "depth": list(range(values.shape[0])),
+            "subject": FSID_SESSIONS[:n_subjects],
+            "partition": list(partitions),
+        }
+        metrics[name] = LabelledArray(
+            values[:, :n_subjects, :], ["depth", "subject", "partition"], coords
+        )
+
+    return metrics
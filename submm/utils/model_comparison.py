@@ -0,0 +1,156 @@
+"""
+Leave-one-subject-out cross-validation of RDM model fits
+
+Every subject's RDM is fit with the same design, so the least-squares fit to the RDMs
+of N-1 subjects is the mean of their individual weights. Held-out weights are then a
+downdate of the sum over all subjects, (sum_w - w_i) / (N - 1), and each nested
+sub-model needs only one factorization per design, shared by every fold, metric
+and partition, and one matrix multiply.
+"""
+
+import functools
+import itertools
+
+import numpy as np
+
+from submm.constants import METRICS, PARTITIONS
+from submm.utils.designs import get_design
+from submm.utils.labelled import LabelledArray
+from submm.utils.rsm_utils import load_rsms, get_lower_tri, split_by_depth
+
+
+def get_submodels(design):
+    """
+    Lists every nested sub-model of a design. The intercept (if the design has one)
+    is part of every sub-model.
+
+    Inputs
+        design (Design): full model, see submm.utils.designs
+
+    Returns
+        submodels (dict): keys are model names, e.g., 'domain+depth' (or 'intercept'
+            for the intercept-only model), values are column indices into design.X
+    """
+    intercept = [i for i, name in enumerate(design.names) if name == "intercept"]
+    effects = [i for i, name in enumerate(design.names) if name != "intercept"]
+
+    submodels = {}
+    for n_effects in range(len(effects) + 1):
+        for columns in itertools.combinations(effects, n_effects):
+            if len(columns) + len(intercept) == 0:
+                continue
+            name = "+".join(design.names[i] for i in columns) or "intercept"
+            submodels[name] = list(columns) + intercept
+
+    return submodels
+
+
+def get_submodel_pinvs(design):
+    """
+    Returns the columns and pseudo-inverse of every nested sub-model of a design,
+    computed once per design
+
+    Inputs
+        design (Design): full model, see submm.utils.designs
+
+    Returns
+        submodels (dict): keys are model names (see get_submodels), values are
+            (columns, pinv), where pinv is the read-only (len(columns), n_cells)
+            pseudo-inverse of design.X[:, columns]
+    """
+    # keyed like the design registry, see submm.utils.designs.get_design
+    return _build_submodel_pinvs(
+        design.n_conditions, design.with_diagonal, design.add_intercept
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _build_submodel_pinvs(n_conditions, with_diagonal, add_intercept):
+    design = get_design(n_conditions, with_diagonal, add_intercept)
+
+    submodels = {}
+    for name, columns in get_submodels(design).items():
+        pinv = np.linalg.pinv(design.X[:, columns])
+        pinv.flags.writeable = False
+        submodels[name] = (columns, pinv)
+
+    return submodels
+
+
+def loso_scores(rdms, design):
+    """
+    Cross-validated variance explained for every nested sub-model of a design
+
+    Inputs
+        rdms (subjects, ..., N): lower triangles of each subject's RDMs, with the
+            same cells as the design
+        design (Design): full model, see submm.utils.designs
+
+    Returns
+        LabelledArray over (model,), trailing axes are (subjects, ...): R^2 of each
+            held-out subject's RDM predicted from the other subjects' weights
+    """
+    rdms = np.asarray(rdms)
+    n_subjects = rdms.shape[0]
+    assert n_subjects > 1, "need at least two subjects to cross-validate"
+
+    tss = np.sum((rdms - rdms.mean(axis=-1, keepdims=True)) ** 2, axis=-1)
+
+    submodels = get_submodel_pinvs(design)
+    scores = np.empty((len(submodels),) + rdms.shape[:-1])
+    for model_idx, (columns, pinv) in enumerate(submodels.values()):
+        X = design.X[:, columns]
+        weights = rdms @ pinv.T
+
+        # downdate the sum of weights to leave each subject out in turn
+        held_out_weights = (weights.sum(axis=0) - weights) / (n_subjects - 1)
+        residuals = rdms - held_out_weights @ X.T
+        scores[model_idx] = 1 - np.sum(residuals ** 2, axis=-1) / tss
+
+    return LabelledArray(scores, ["model"], {"model": list(submodels.keys())})
+
+
+def loso_model_comparison(
+    design,
+    metrics=METRICS,
+    partitions=PARTITIONS,
+    by_depth=False,
+    **load_kwargs,
+):
+    """
+    Runs leave-one-subject-out model comparison for each metric and partition
+
+    Inputs
+        design (Design): full model; 30 x 30 designs are fit to whole RDMs and 10 x 10
+            designs to the RDM at each depth
+        metrics (list): metrics to load RSMs for
+        partitions (list): partitions to load RSMs for
+        by_depth (bool): if True, fits the RDMs of each depth separately
+        load_kwargs: passed on to load_rsms, e.g., thresh, glm_dir, r2_control
+
+    Returns
+        LabelledArray over (model, metric, partition), trailing axes are subjects
+            (and depths if by_depth)
+    """
+    scores = []
+    for metric in metrics:
+        rsms = load_rsms(metric=metric, partitions=partitions, **load_kwargs)
+
+        metric_scores = []
+        for partition in partitions:
+            rdms = 1 - rsms[partition]
+            if by_depth:
+                rdms = split_by_depth(rdms)
+            assert rdms.shape[-1] == design.n_conditions, "design doesn't fit RDMs"
+
+            lower_tri_rdms = get_lower_tri(rdms, with_diagonal=design.with_diagonal)
+            metric_scores.append(loso_scores(lower_tri_rdms, design).values)
+
+        scores.append(np.stack(metric_scores, axis=1))
+
+    models = list(get_submodels(design).keys())
+    return LabelledArray(
+        np.stack(scores, axis=1),
+        ["model", "metric", "partition"],
+        {"model": models, "metric": list(metrics), "partition": list(partitions)},
+    )
@@ -0,0 +1,160 @@
+"""
+Noise ceilings for RDM model fits
+
+The lower bound of the ceiling for a subject is how well the mean RDM of the other
+subjects predicts theirs, and the upper bound is how well the mean of every subject
+(their own included) does. Both means come from one running sum over subjects: the
+group mean is sum / N and each leave-one-out mean is the downdate (sum - rdm_i) /
+(N - 1), so no mean is recomputed from scratch.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from submm.constants import METRICS, PARTITIONS, THRESHOLDS
+from submm.utils.labelled import LabelledArray
+from submm.utils.rsm_utils import load_rsms, get_lower_tri, split_by_depth
+from submm.utils.similarity import rank_data
+
+# correlations between each subject's RDM and the leave-one-out (lower) or full
+# (upper) group mean RDM, each (subjects, ...)
+NoiseCeiling = namedtuple("NoiseCeiling", ["lower", "upper"])
+
+# names of the bounds when stored with fit statistics, as squared correlations so
+# that they are in the units of R^2 (negative correlations count as a ceiling of 0)
+NOISE_CEILING_STATISTICS = ["noise_ceiling_lower", "noise_ceiling_upper"]
+
+
+def _correlate(x, y):
+    """
+    Pearson correlation along the last axis
+    """
+    x = x - x.mean(axis=-1, keepdims=True)
+    y = y - y.mean(axis=-1, keepdims=True)
+    return np.sum(x * y, axis=-1) / np.sqrt(
+        np.sum(x ** 2, axis=-1) * np.sum(y ** 2, axis=-1)
+    )
+
+
+def noise_ceiling(rdms, method="pearson"):
+    """
+    Lower and upper noise ceiling of every subject's RDM
+
+    Inputs
+        rdms (subjects, ..., n): lower triangles of each subject's RDMs
+        method (str): 'pearson' or 'spearman' correlation
+
+    Returns
+        NoiseCeiling of lower and upper bounds, each (subjects, ...)
+    """
+    rdms = np.asarray(rdms, dtype=float)
+    n_subjects = rdms.shape[0]
+    assert n_subjects > 1, "need at least two subjects for a noise ceiling"
+
+    total = rdms.sum(axis=0)
+    group_mean = total / n_subjects
+    held_out_means = (total - rdms) / (n_subjects - 1)
+
+    if method == "spearman":
+        rdms, group_mean, held_out_means = [
+            rank_data(x) for x in [rdms, group_mean, held_out_means]
+        ]
+    elif method != "pearson":
+        raise Exception(f"Method {method} not recognized")
+
+    return NoiseCeiling(
+        lower=_correlate(rdms, held_out_means), upper=_correlate(rdms, group_mean)
+    )
+
+
+def with_noise_ceiling(fit_statistics, partition_rdms):
+    """
+    Adds the noise ceiling of each partition to its fit statistics
+
+    Inputs
+        fit_statistics (LabelledArray): from stack_fit_statistics
+        partition_rdms (dict): keys are partitions, values are the lower triangles
+            that were fit, (subjects, ..., n)
+
+    Returns
+        LabelledArray like fit_statistics, with NOISE_CEILING_STATISTICS appended
+            (squared Pearson correlations, comparable to r2)
+    """
+    partitions = fit_statistics.coords["partition"]
+
+    # clip at 0 before squaring, otherwise a negative correlation (common for the
+    # lower bound of noisy subjects) would become a positive ceiling
+    ceilings = np.array(
+        [np.clip(noise_ceiling(partition_rdms[p]), 0, None) ** 2 for p in partitions]
+    )
+
+    # (partitions, bounds, ...) -> (bounds, partitions, ...)
+    values = np.concatenate((fit_statistics.values, np.swapaxes(ceilings, 0, 1)))
+    statistics = fit_statistics.coords["statistic"] + NOISE_CEILING_STATISTICS
+    return LabelledArray(
+        values,
+        ["statistic", "partition"],
+        {"statistic": statistics, "partition": partitions},
+    )
+
+
+def noise_ceilings(
+    metrics=METRICS,
+    partitions=PARTITIONS,
+    threshes=THRESHOLDS,
+    by_depth=False,
+    with_diagonal=True,
+    method="pearson",
+    **load_kwargs,
+):
+    """
+    Noise ceilings for each metric, partition and threshold (and depth)
+
+    Inputs
+        metrics (list): metrics to load RSMs for
+        partitions (list): partitions to load RSMs for
+        threshes (list): bias_mask_thresholds to load RSMs for
+        by_depth (bool): if True, computes ceilings for the RDM at each depth
+        with_diagonal (bool): whether to include the diagonal of the RDMs, as in
+            the fits of figures 7b and 8gh
+        method (str): 'pearson' or 'spearman' correlation
+        load_kwargs: passed on to load_rsms, e.g., glm_dir, r2_control
+
+    Returns
+        LabelledArray over (bound, metric, partition, thresh), trailing axes are
+            subjects (and depths if by_depth)
+    """
+    ceilings = []
+    for metric in metrics:
+        metric_ceilings = []
+        for thresh in threshes:
+            rsms = load_rsms(
+                metric=metric, thresh=thresh, partitions=partitions, **load_kwargs
+            )
+
+            thresh_ceilings = []
+            for partition in partitions:
+                rdms = 1 - rsms[partition]
+                if by_depth:
+                    rdms = split_by_depth(rdms)
+                lower_tri_rdms = get_lower_tri(rdms, with_diagonal=with_diagonal)
+                thresh_ceilings.append(noise_ceiling(lower_tri_rdms, method=method))
+
+            # (partitions, bounds, subjects, ...)
+            metric_ceilings.append(np.array(thresh_ceilings))
+        # (partitions, thresholds, bounds, subjects, ...)
+        ceilings.append(np.stack(metric_ceilings, axis=1))
+
+    # (metrics, partitions, thresholds, bounds, ...) -> bounds first
+    values = np.moveaxis(np.array(ceilings), 3, 0)
+    return LabelledArray(
+        values,
+        ["bound", "metric", "partition", "thresh"],
+        {
+            "bound": list(NoiseCeiling._fields),
+            "metric": list(metrics),
+            "partition": list(partitions),
+            "thresh": list(threshes),
+        },
+    )
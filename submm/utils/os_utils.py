@@ -4,12 +4,6 @@ Operating system utils
 import os
 from submm.constants import DPI
 
-# MPL imports
-import matplotlib
-
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt  # noqa
-
 
 def mkdirquiet(path):
     """
@@ -30,4 +24,10 @@ def savefig(save_path, transparent=False):
         save_path (str): path to save file to
         transparent (bool): if True, PNG background will be transparent (alpha = 0)
     """
+    # imported here so that scripts which never plot don't pay for matplotlib
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt  # noqa:E402
+
     plt.savefig(save_path, dpi=DPI, bbox_inches="tight", transparent=transparent)
@@ -0,0 +1,166 @@
+"""
+Permutation tests for RDM fit weights
+
+Condition labels are shuffled consistently across the rows and columns of each RDM,
+which amounts to gathering the design's cells from permuted positions of the full
+RDM. Every permuted RDM is then refit with the shared design in one batched solve.
+
+Permutation i is always drawn from np.random.RandomState([seed, i]), so a long run
+can be split across processes (each taking a different range of permutations) and
+the combined null is identical to that of a single run.
+"""
+
+import numpy as np
+
+from submm.utils.rsm_utils import fit_rdms
+
+
+def draw_permutations(n_conditions, n_permutations, seed=0, start=0):
+    """
+    Draws condition permutations from independent, reproducible streams
+
+    Inputs
+        n_conditions (int): number of conditions (rows) of the RDMs
+        n_permutations (int): number of permutations to draw
+        seed (int): seed shared by every worker
+        start (int): index of the first permutation, e.g., 5000 for a worker
+            computing the second half of 10000 permutations
+
+    Returns
+        permutations (n_permutations, n_conditions)
+    """
+    return np.array(
+        [
+            np.random.RandomState([seed, idx]).permutation(n_conditions)
+            for idx in range(start, start + n_permutations)
+        ],
+        dtype=int,
+    ).reshape(n_permutations, n_conditions)
+
+
+def get_permuted_cells(permutations, design):
+    """
+    Returns, for each permutation, the flat indices of the full RDM that land in the
+    design's cells once rows and columns are permuted
+
+    Inputs
+        permutations (P, N): condition permutations
+        design (Design): see submm.utils.designs
+
+    Returns
+        cells (P, n_cells)
+    """
+    rows, cols = design.tril_indices
+    n_conditions = design.matrices.shape[-1]
+    return permutations[:, rows] * n_conditions + permutations[:, cols]
+
+
+def permutation_null(
+    rdms,
+    design,
+    n_permutations=10000,
+    seed=0,
+    start=0,
+    chunk_size=256,
+    method="lsq",
+):
+    """
+    Builds the null distribution of fit weights by permuting condition labels. The
+    same permutation is applied to every RDM in the stack, so nulls of statistics
+    that combine RDMs (e.g., means across subjects) can be computed from the output.
+
+    Permuting rows and columns together never moves the diagonal, so the design must
+    be built without it (with_diagonal=False) for the null to be valid.
+
+    Inputs
+        rdms (..., N, N): stack of full RDMs (e.g., partitions x subjects)
+        design (Design): see submm.utils.designs, without the diagonal
+        n_permutations (int): number of permutations to compute
+        seed (int): seed shared by every worker
+        start (int): index of the first permutation for this worker
+        chunk_size (int): number of permutations fit at once, limits memory use
+        method (str): passed on to fit_rdms
+
+    Returns
+        null (n_permutations, ..., m)
+    """
+    rdms = np.asarray(rdms)
+    n_conditions = design.matrices.shape[-1]
+    assert rdms.shape[-2:] == (n_conditions, n_conditions), "design doesn't fit RDMs"
+    rows, cols = design.tril_indices
+    assert np.all(rows != cols), "design includes the diagonal, which isn't permuted"
+
+    batch_shape = rdms.shape[:-2]
+    flat_rdms = rdms.reshape(-1, n_conditions ** 2)
+    n_regressors = design.X.shape[1]
+
+    null = np.empty((n_permutations, flat_rdms.shape[0], n_regressors))
+    for chunk_start in range(0, n_permutations, chunk_size):
+        n_chunk = min(chunk_size, n_permutations - chunk_start)
+        permutations = draw_permutations(
+            n_conditions, n_chunk, seed=seed, start=start + chunk_start
+        )
+        cells = get_permuted_cells(permutations, design)
+
+        # (rdms, permutations, cells) -> (rdms, permutations, regressors)
+        weights = fit_rdms(flat_rdms[:, cells], design, method=method)
+        null[chunk_start : chunk_start + n_chunk] = weights.transpose(1, 0, 2)
+
+    return null.reshape((n_permutations,) + batch_shape + (n_regressors,))
+
+
+def get_pairwise_contrasts(design):
+    """
+    Returns contrasts for the differences between every pair of (non-intercept)
+    regressors of a design, e.g., 'domain-category'
+
+    Returns
+        contrasts (dict): keys are names, values are (m,) weight vectors
+    """
+    effects = [i for i, name in enumerate(design.names) if name != "intercept"]
+
+    contrasts = {}
+    for a_idx, a in enumerate(effects):
+        for b in effects[a_idx + 1 :]:
+            contrast = np.zeros(len(design.names))
+            contrast[a], contrast[b] = 1, -1
+            contrasts[f"{design.names[a]}-{design.names[b]}"] = contrast
+
+    return contrasts
+
+
+def apply_contrasts(weights, contrasts):
+    """
+    Inputs
+        weights (..., m): fit weights, observed or null
+        contrasts (dict): keys are names, values are (m,) weight vectors
+
+    Returns
+        (..., k) array with one entry per contrast, in the order of contrasts
+    """
+    return weights @ np.array(list(contrasts.values())).T
+
+
+def permutation_p_values(observed, null, tail="two-sided"):
+    """
+    Computes permutation p-values, counting the observed statistic as one of the
+    permutations so that p is never 0
+
+    Inputs
+        observed (...): observed statistics
+        null (P, ...): statistics for each permutation
+        tail (str): 'greater', 'less', or 'two-sided' (compares absolute values)
+
+    Returns
+        p (...)
+    """
+    if tail == "greater":
+        n_extreme = np.sum(null >= observed, axis=0)
+    elif tail == "less":
+        n_extreme = np.sum(null <= observed, axis=0)
+    elif tail == "two-sided":
+        n_extreme = np.sum(np.abs(null) >= np.abs(observed), axis=0)
+    else:
+        raise Exception(f"Tail {tail} not recognized")
+
+    return (n_extreme + 1) / (null.shape[0] + 1)
@@ -4,11 +4,11 @@ Plotting utility functions
 
 import numpy as np
 from matplotlib.colors import LinearSegmentedColormap
-from sklearn.manifold import MDS
-from scipy.spatial import procrustes
 
 from submm.utils.stats import sem
-from submm.constants import CATEGORY_COLORS
+from submm.utils.disk_cache import disk_cached
+from submm.utils.designs import get_layout_for_size
+from submm.constants import CATEGORY_COLORS, DEPTH_MARKERS
 
 # define colormap to be imported elsewhere
 blueblackred_colors = np.array(
@@ -85,7 +85,7 @@ def plot_rdms(axes, rdms, cmap=None, clim=None, add_titles=False):
 
 
 def plot_embeddings(
-    axes, embeddings, point_size=110, alpha=1.0, plot_dashed_lines=False
+    axes, embeddings, point_size=110, alpha=1.0, plot_dashed_lines=False, layout=None
 ):
     """
     Plots embedded RSMs
@@ -97,6 +97,8 @@ def plot_embeddings(
         alpha (float): opacity of points
         plot_dashed_lines (bool): if True, connects centroids of same-domain pairs
              with a dashed line
+        layout (ConditionLayout): order of the embedded conditions, inferred from
+            the number of embedded points if None
     """
 
     if len(axes) > 1:
@@ -104,16 +106,18 @@ def plot_embeddings(
             embeddings.keys()
         ), "number of axes and embeddings does not match"
 
-    colors = np.repeat([CATEGORY_COLORS[i, :] for i in range(10)], 3, axis=0)
-    markers = np.tile(["^", "s", "v"], 10)
+    if layout is None:
+        first = embeddings[0] if len(axes) == 1 else next(iter(embeddings.values()))
+        layout = get_layout_for_size(first.shape[0])
+
+    colors = CATEGORY_COLORS[layout.category_labels]
+    markers = np.array(DEPTH_MARKERS)[layout.depth_labels]
 
     # Helper function to compute centroids for each category
     def get_centroids(emb):
-        centroids = np.zeros((10, 2))
-        for cat_idx in range(10):
-            start = cat_idx * 3
-            end = start + 3
-            points = emb[start:end, :]
+        centroids = np.zeros((layout.n_categories, emb.shape[1]))
+        for cat_idx in range(layout.n_categories):
+            points = emb[layout.category_labels == cat_idx, :]
             centroids[cat_idx, :] = np.mean(points, axis=0)
 
         return centroids
@@ -135,19 +139,20 @@ def plot_embeddings(
         # draw centroid lines
         if plot_dashed_lines:
             centroids = get_centroids(emb)
-            for idx1 in [0, 2, 4, 6, 8]:
-                idx2 = idx1 + 1
-                ctr1 = centroids[idx1, :]
-                ctr2 = centroids[idx2, :]
-
-                axis.plot(
-                    [ctr1[0], ctr2[0]],
-                    [ctr1[1], ctr2[1]],
-                    c=colors[idx1 * 3],
-                    linestyle="dashed",
-                    linewidth=4,
-                    alpha=0.4,
-                )
+            for domain_categories in layout.domain_blocks:
+                idx1 = domain_categories[0]
+                for idx2 in domain_categories[1:]:
+                    ctr1 = centroids[idx1, :]
+                    ctr2 = centroids[idx2, :]
+
+                    axis.plot(
+                        [ctr1[0], ctr2[0]],
+                        [ctr1[1], ctr2[1]],
+                        c=CATEGORY_COLORS[idx1],
+                        linestyle="dashed",
+                        linewidth=4,
+                        alpha=0.4,
+                    )
 
         axis.set_xticks([])
         axis.set_yticks([])
@@ -165,6 +170,7 @@ def plot_embeddings(
             ax.spines["right"].set_visible(False)
 
 
+@disk_cached("mds_embeddings", libraries=["sklearn", "scipy"])
 def embed_rsms(rsms, alignment_anchor=None, n_components=2):
     """
     computes MDS embeddings aligned to that for the anchor_key
@@ -175,6 +181,10 @@ def embed_rsms(rsms, alignment_anchor=None, n_components=2):
             align
         n_components (int): how many dimensions to embed into
     """
+    # imported here to keep sklearn and scipy out of module import time
+    from sklearn.manifold import MDS
+    from scipy.spatial import procrustes
+
     # fix random seed
     SEED = 0
 
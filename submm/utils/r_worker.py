@@ -0,0 +1,204 @@
+"""
+Pool of long-lived R processes that run the scripts in stats/R_scripts
+
+Each worker starts Rscript once, with the scripts' libraries loaded (see
+stats/R_scripts/worker.r), and then fits models on data streamed over its stdin, so a
+pipeline run pays R's start-up cost once per worker rather than once per model.
+Requests are queued on a small thread pool, so independent models are fit
+concurrently, and each returns the printed output and the ANOVA table of its script.
+A worker that dies, replies out of protocol or takes longer than R_TIMEOUT is
+killed and replaced, and only the job it was running fails.
+"""
+
+import io
+import atexit
+import queue
+import threading
+import subprocess
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from submm.constants import PATHS, R_TIMEOUT, R_WORKERS
+
+# output (str): everything the script printed, or the error message if it failed
+# table (pd.DataFrame): the script's aov table with eta squared, None if it failed
+RResult = namedtuple("RResult", ["name", "ok", "output", "table"])
+
+
+class RWorkerError(Exception):
+    """
+    An R worker died (e.g., a library failed to load at start-up) or its reply
+    didn't follow the protocol of stats/R_scripts/worker.r
+    """
+
+
+class RWorker:
+    """
+    One Rscript process running stats/R_scripts/worker.r
+    """
+
+    def __init__(self):
+        self.process = subprocess.Popen(
+            ["Rscript", "--vanilla", f"{PATHS['r_scripts']}/worker.r"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+
+    @property
+    def alive(self):
+        return self.process.poll() is None
+
+    def _read_line(self):
+        line = self.process.stdout.readline()
+        if not line:
+            raise RWorkerError("R worker exited unexpectedly")
+        return line.decode("utf-8").strip()
+
+    def run(self, data, name, timeout=R_TIMEOUT):
+        """
+        Runs stats/R_scripts/<name>_script.r on data
+
+        Inputs
+            data (pd.DataFrame): data for the script, as it would be written to CSV
+            name (str): name of the R script, without the _script.r suffix
+            timeout (float): seconds to wait for the reply, after which the worker
+                is killed and RWorkerError is raised; None to wait forever
+
+        Returns
+            RResult
+        """
+        if timeout is None:
+            return self._run(data, name)
+
+        # killing the worker ends any blocked read with end of file
+        timer = threading.Timer(timeout, self.process.kill)
+        timer.start()
+        try:
+            return self._run(data, name)
+        except RWorkerError:
+            if not timer.is_alive():
+                raise RWorkerError(f"R worker timed out after {timeout} s")
+            raise
+        finally:
+            timer.cancel()
+
+    def _run(self, data, name):
+        # imported here so that importing this module stays cheap
+        import pandas as pd
+
+        script = f"{PATHS['r_scripts']}/{name}_script.r"
+        payload = data.to_csv().encode("utf-8")
+        try:
+            self.process.stdin.write(f"{script}\n{len(payload)}\n".encode("utf-8"))
+            self.process.stdin.write(payload)
+            self.process.stdin.flush()
+        except BrokenPipeError:
+            raise RWorkerError("R worker exited unexpectedly")
+
+        status = self._read_line()
+        try:
+            n_output, n_table = int(self._read_line()), int(self._read_line())
+        except ValueError:
+            status = None
+        if status not in ["ok", "error"]:
+            raise RWorkerError("R worker replied out of protocol")
+
+        output = self.process.stdout.read(n_output)
+        table = self.process.stdout.read(n_table)
+        if len(output) + len(table) < n_output + n_table:
+            raise RWorkerError("R worker exited unexpectedly")
+        output, table = output.decode("utf-8"), table.decode("utf-8")
+
+        ok = status == "ok"
+        table = pd.read_csv(io.StringIO(table), index_col=0) if table else None
+        return RResult(name=name, ok=ok, output=output, table=table)
+
+    def close(self):
+        # closing stdin ends the worker's read loop
+        self.process.stdin.close()
+        self.process.wait()
+
+    def kill(self):
+        """
+        Stops the worker without waiting for it to finish its current request
+        """
+        self.process.kill()
+        self.process.wait()
+        for pipe in [self.process.stdin, self.process.stdout]:
+            # a dead worker can't take the rest of a request
+            try:
+                pipe.close()
+            except BrokenPipeError:
+                pass
+
+
+class RWorkerPool:
+    """
+    Queues R script runs onto up to n_workers R processes, started as needed
+    """
+
+    def __init__(self, n_workers=R_WORKERS):
+        self.n_workers = n_workers
+        self._workers = []
+        self._idle = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=n_workers)
+
+    def _run(self, data, name):
+        # the executor never runs more than n_workers of these at once, so a new
+        # worker is only started while there are fewer than n_workers
+        try:
+            worker = self._idle.get_nowait()
+        except queue.Empty:
+            worker = RWorker()
+            self._workers.append(worker)
+
+        try:
+            result = worker.run(data, name)
+        except RWorkerError as e:
+            # fail this job only, like a single Rscript call that errors
+            self._workers.remove(worker)
+            worker.kill()
+            message = f"R failed to run {name}: {e}"
+            return RResult(name=name, ok=False, output=message, table=None)
+        except BaseException:
+            # the worker's output may no longer line up with the requests, so it
+            # can't be reused; a fresh one is started for the next request
+            self._workers.remove(worker)
+            worker.kill()
+            raise
+
+        if worker.alive:
+            self._idle.put(worker)
+        else:
+            self._workers.remove(worker)
+        return result
+
+    def submit(self, data, name):
+        """
+        Queues a run of stats/R_scripts/<name>_script.r on data, see RWorker.run
+
+        Returns
+            concurrent.futures.Future of an RResult
+        """
+        return self._executor.submit(self._run, data, name)
+
+    def run(self, data, name):
+        return self.submit(data, name).result()
+
+    def close(self):
+        self._executor.shutdown()
+        for worker in self._workers:
+            if worker.alive:
+                worker.close()
+        self._workers = []
+
+
+@lru_cache(maxsize=None)
+def get_worker_pool():
+    """
+    Returns the pool shared by a pipeline run, closed when Python exits
+    """
+    pool = RWorkerPool()
+    atexit.register(pool.close)
+    return pool
@@ -0,0 +1,111 @@
+"""
+Split-half reliability of the RSMs for every leaf of a corrmats file
+
+Each RSM correlates the conditions of one half of the runs with those of the other
+half, so its diagonal is the split-half reliability of each condition. The mean of
+the diagonal is computed for the whole RSM and for the diagonal block of each depth,
+for every subject and leaf at once, then Spearman-Brown corrected to the reliability
+of the full data, 2r / (1 + r). Confidence intervals come from resampling subjects,
+with the same resamples for every leaf.
+"""
+
+import numpy as np
+
+from submm.constants import FSID_SESSIONS, PATHS
+from submm.utils.bootstrap import bootstrap_ci, draw_bootstrap_indices
+from submm.utils.designs import get_layout_for_size
+from submm.utils.labelled import LabelledArray
+from submm.utils.rsm_utils import RSMStore, split_by_depth
+
+RELIABILITY_STATISTICS = ["reliability", "spearman_brown"]
+RELIABILITY_BOUNDS = ["estimate", "low", "high"]
+
+
+def _depth_names(n_depths):
+    if n_depths == 3:
+        return ["superficial", "middle", "deep"]
+    return [f"depth_{idx}" for idx in range(n_depths)]
+
+
+def spearman_brown(r):
+    """
+    Reliability of the full data from the correlation between its two halves
+    """
+    return 2 * r / (1 + r)
+
+
+def diagonal_reliability(rsms):
+    """
+    Mean of the diagonal of each RSM, over all conditions and within each depth
+
+    Inputs
+        rsms (..., N, N): stack of RSMs
+
+    Returns
+        reliability (..., 1 + n_depths): the whole diagonal first, then each depth
+    """
+    rsms = np.asarray(rsms)
+    whole = np.mean(np.diagonal(rsms, axis1=-2, axis2=-1), axis=-1)
+    by_depth = np.mean(np.diagonal(split_by_depth(rsms), axis1=-2, axis2=-1), axis=-1)
+    return np.concatenate((whole[..., None], by_depth), axis=-1)
+
+
+def split_half_reliability(
+    rsm_file=None,
+    sessions=FSID_SESSIONS,
+    n_boot=10000,
+    seed=0,
+    alpha=0.05,
+    method="bca",
+    **selectors,
+):
+    """
+    Split-half reliability, Spearman-Brown corrected reliability, and subject
+    bootstrap confidence intervals of their means for every leaf of an RSM file
+
+    Inputs
+        rsm_file (str): defaults to PATHS['rsms']
+        sessions (list): sessions (subjects) to include
+        n_boot (int): number of bootstrap resamples
+        seed (int): seed for the bootstrap resamples
+        alpha (float): the intervals cover 1 - alpha
+        method (str): 'bca' or 'percentile' intervals, see bootstrap_ci
+        selectors: restrict any other level of the file, see RSMStore.sel, e.g.,
+            metric='znorm' (a single label drops that level)
+
+    Returns
+        LabelledArray over (statistic, bound, <selected levels>, depth), where
+            statistic is one of RELIABILITY_STATISTICS, bound is one of
+            RELIABILITY_BOUNDS (mean across subjects and its interval), and depth
+            is 'all' followed by each depth. Leaves missing from the file are NaN.
+    """
+    store = RSMStore(rsm_file or PATHS["rsms"])
+    rsms = store.sel(fill_missing=True, session=list(sessions), **selectors)
+
+    # (session, <levels>, depth) -> (<levels>, depth, session)
+    reliability = np.moveaxis(diagonal_reliability(rsms.values), 0, -1)
+    levels = [dim for dim in rsms.dims if dim != "session"]
+    n_depths = get_layout_for_size(rsms.shape[-1]).n_depths
+    dims = levels + ["depth"]
+    coords = {dim: rsms.coords[dim] for dim in levels}
+    coords["depth"] = ["all"] + _depth_names(n_depths)
+
+    indices = draw_bootstrap_indices(len(sessions), n_boot=n_boot, seed=seed)
+    statistics = []
+    for values in [reliability, spearman_brown(reliability)]:
+        # leaves missing from the file stay NaN
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ci = bootstrap_ci(
+                LabelledArray(values, dims, coords),
+                indices,
+                axis=-1,
+                alpha=alpha,
+                method=method,
+            )
+        statistics.append([np.asarray(x) for x in ci])
+
+    return LabelledArray(
+        np.array(statistics),
+        ["statistic", "bound"] + dims,
+        dict(coords, statistic=RELIABILITY_STATISTICS, bound=RELIABILITY_BOUNDS),
+    )
@@ -0,0 +1,201 @@
+"""
+Append-only store of every statistic reported by the analysis scripts
+
+Each reported statistic is written to a SQLite database (PATHS['results']) together
+with the parameters of the run that produced it, so that runs with different
+parameters (e.g., thr_0 vs. thr_75, or r2_control) can be compared with a query
+rather than by diffing logs. Scripts start a run with their arguments, e.g.,
+start_run(vars(ARGS)); results recorded without a run go to one started with no
+parameters. Within a run, results are numbered in the order they were reported, so
+the same result can be matched across runs of a script even without a label.
+
+Set RECORD_RESULTS in submm.constants to False to turn recording off.
+"""
+
+import os
+import sys
+import json
+import uuid
+import atexit
+import sqlite3
+import datetime
+from contextlib import closing
+
+import numpy as np
+
+from submm.constants import PATHS, RECORD_RESULTS
+
+# run parameters that get their own (indexed) column in the results table; any can
+# also be given with an individual result, e.g., the partition it was computed for
+CONTEXT_COLUMNS = ["glm_dir", "noise_type", "thresh", "metric", "partition"]
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    script TEXT,
+    started TEXT,
+    params TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id TEXT,
+    script TEXT,
+    result_idx INTEGER,
+    test TEXT,
+    label TEXT,
+    {", ".join(f"{column} TEXT" for column in CONTEXT_COLUMNS)},
+    statistic TEXT,
+    value REAL,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS results_by_run ON results (run_id);
+CREATE INDEX IF NOT EXISTS results_by_context ON results (
+    script, {", ".join(CONTEXT_COLUMNS)}, statistic
+);
+"""
+
+# the run that results are currently recorded to
+_CURRENT_RUN = {}
+
+# connections that results are written to, keyed by path, opened (and their tables
+# created) once per process rather than once per result
+_CONNECTIONS = {}
+
+
+def connect(path=None):
+    """
+    Opens the results store, creating its tables if needed
+    """
+    connection = sqlite3.connect(path or PATHS["results"])
+    connection.executescript(_SCHEMA)
+    return connection
+
+
+def _get_connection():
+    """
+    Returns the shared connection to PATHS['results'], opening it on first use
+    """
+    path = PATHS["results"]
+    if path not in _CONNECTIONS:
+        _CONNECTIONS[path] = connect(path)
+    return _CONNECTIONS[path]
+
+
+@atexit.register
+def _close_connections():
+    for connection in _CONNECTIONS.values():
+        connection.close()
+    _CONNECTIONS.clear()
+
+
+def _to_json(x):
+    return json.dumps(x, sort_keys=True, default=str)
+
+
+def start_run(params=None, script=None):
+    """
+    Starts a new run, which every following result is recorded to
+
+    Inputs
+        params (dict): parameters of the run, e.g., vars(ARGS)
+        script (str): name of the script, defaults to the one being run
+
+    Returns
+        run_id (str)
+    """
+    script = script or os.path.basename(sys.argv[0])
+    started = datetime.datetime.now()
+    run_id = f"{started:%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+    _CURRENT_RUN.clear()
+    _CURRENT_RUN.update(
+        run_id=run_id, script=script, params=dict(params or {}), n_results=0
+    )
+
+    if RECORD_RESULTS:
+        connection = _get_connection()
+        with connection:
+            connection.execute(
+                "INSERT INTO runs VALUES (?, ?, ?, ?)",
+                (run_id, script, started.isoformat(), _to_json(params or {})),
+            )
+
+    return run_id
+
+
+def record_result(test, values, label=None, **context):
+    """
+    Appends a reported result to the store
+
+    Inputs
+        test (str): what was reported, e.g., 'ttest_rel' or 'anova'
+        values (dict): keys are statistics, values are numbers, e.g., {'t': 3.2}
+        label (str): what was tested, e.g., 'VTC_lateral vs. VTC_medial'
+        context: overrides of the run's parameters for this result (see
+            CONTEXT_COLUMNS); other keys are kept as JSON details
+    """
+    # nothing to record, and the result isn't numbered
+    if not RECORD_RESULTS or not values:
+        return
+    if not _CURRENT_RUN:
+        start_run()
+
+    result_idx = _CURRENT_RUN["n_results"]
+    _CURRENT_RUN["n_results"] += 1
+
+    merged = dict(_CURRENT_RUN["params"], **context)
+    context_values = [
+        None if merged.get(column) is None else str(merged[column])
+        for column in CONTEXT_COLUMNS
+    ]
+    details = {k: v for k, v in context.items() if k not in CONTEXT_COLUMNS}
+
+    rows = [
+        (
+            _CURRENT_RUN["run_id"],
+            _CURRENT_RUN["script"],
+            result_idx,
+            test,
+            label,
+            *context_values,
+            statistic,
+            float(np.asarray(value)),
+            _to_json(details) if details else None,
+        )
+        for statistic, value in values.items()
+    ]
+    connection = _get_connection()
+    with connection:
+        connection.executemany(
+            f"INSERT INTO results VALUES ({', '.join(['?'] * len(rows[0]))})", rows
+        )
+
+
+def load_results(path=None, **filters):
+    """
+    Reads results from the store, with the parameters of their runs
+
+    Inputs
+        path (str): database to read, defaults to PATHS['results']
+        filters: keep only rows where these columns equal the given values, e.g.,
+            script='figure_7b_rdm_fits.py', statistic='p'
+
+    Returns
+        pd.DataFrame with a row per statistic
+    """
+    # imported here so that importing this module stays cheap
+    import pandas as pd
+
+    columns = ["run_id", "script", "result_idx", "test", "label", "statistic"]
+    for column in filters:
+        assert column in columns + CONTEXT_COLUMNS, f"can't filter on {column}"
+
+    query = (
+        "SELECT results.*, runs.started, runs.params FROM results"
+        " JOIN runs USING (run_id)"
+    )
+    if filters:
+        query += " WHERE " + " AND ".join(f"results.{k} = ?" for k in filters)
+    query += " ORDER BY results.rowid"
+
+    with closing(connect(path)) as connection:
+        return pd.read_sql_query(query, connection, params=list(filters.values()))
@@ -0,0 +1,179 @@
+"""
+Consolidates the nested RSM .h5 trees into one contiguous, memory-mapped array
+
+Every leaf of a corrmats file (session/glm_dir/metric/noise_type/partition/thresh)
+is written into a single float array stored as a .npy file next to the .mat file,
+along with a small JSON index of the labels along each axis. Sessions are the last
+labelled axis, so selecting all sessions for one metric/partition/threshold is a
+contiguous, zero-copy view into the memory map.
+
+Usage (one time, or whenever analysis_outputs change)
+    python -m submm.utils.rsm_cube
+"""
+
+import os
+import json
+
+import h5py
+import numpy as np
+
+from submm.constants import FSID_SESSIONS, PATHS
+from submm.utils.labelled import LabelledArray
+
+# order of the labelled axes in the cube, sessions last so they are contiguous
+CUBE_DIMS = ["glm_dir", "metric", "noise_type", "partition", "thresh", "session"]
+
+# order of the group levels in the .h5 files
+H5_LEVELS = ["session", "glm_dir", "metric", "noise_type", "partition", "thresh"]
+
+
+class RSMCube:
+    """
+    Memory-mapped view of every RSM in a corrmats file
+
+    Attributes
+        rsms (LabelledArray): labelled over CUBE_DIMS, trailing axes are the RSM
+        present (LabelledArray): boolean mask over CUBE_DIMS, False where the .h5
+            file has no dataset for that leaf (such leaves are NaN in rsms)
+    """
+
+    def __init__(self, rsms, present):
+        self.rsms = rsms
+        self.present = present
+
+    def sel(self, **selectors):
+        """
+        Selects a sub-cube by label, see LabelledArray.sel. Raises a KeyError if
+        any of the selected leaves are missing from the original .h5 file.
+        """
+        if not np.all(self.present.sel(**selectors)):
+            raise KeyError(f"Not all RSMs exist for selection {selectors}")
+
+        return self.rsms.sel(**selectors)
+
+
+def get_cube_paths(rsm_file):
+    """
+    Returns the paths of the data (.npy) and index (.json) files for an RSM file
+    """
+    base = os.path.splitext(rsm_file)[0]
+    return f"{base}_cube.npy", f"{base}_cube.json"
+
+
+def order_sessions(sessions):
+    """
+    Orders session labels as in FSID_SESSIONS, followed by any others (e.g., the 3T
+    session) in sorted order
+    """
+    sessions = set(sessions)
+    return [s for s in FSID_SESSIONS if s in sessions] + sorted(
+        sessions - set(FSID_SESSIONS)
+    )
+
+
+def _source_signature(rsm_file):
+    stat = os.stat(rsm_file)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def build_rsm_cube(rsm_file):
+    """
+    Converts an RSM .h5 file to a memory-mappable cube. Only needs to be run once
+    per file; load_rsm_cube ignores the cube if the .h5 file changes afterwards.
+
+    Inputs
+        rsm_file (str): path to .h5 file to convert
+
+    Returns
+        cube (RSMCube): the newly-written cube, opened read-only
+    """
+    leaves = {}
+
+    def collect(name, obj):
+        if isinstance(obj, h5py.Dataset):
+            key = tuple(name.split("/"))
+            assert len(key) == len(H5_LEVELS), f"unexpected depth for {name}"
+            leaves[key] = obj
+
+    data_path, index_path = get_cube_paths(rsm_file)
+    with h5py.File(rsm_file, "r") as f:
+        f["corrmats"].visititems(collect)
+        assert len(leaves) > 0, f"no RSMs found in {rsm_file}"
+
+        # collect labels, putting sessions in the same order as FSID_SESSIONS
+        coords = {
+            level: sorted({key[i] for key in leaves})
+            for i, level in enumerate(H5_LEVELS)
+        }
+        coords["session"] = order_sessions(coords["session"])
+
+        matrix_shape = next(iter(leaves.values())).shape
+        cube_shape = tuple(len(coords[dim]) for dim in CUBE_DIMS)
+        data = np.lib.format.open_memmap(
+            data_path, mode="w+", dtype=np.float64, shape=cube_shape + matrix_shape
+        )
+        data[:] = np.nan
+        present = np.zeros(cube_shape, dtype=bool)
+
+        for key, dataset in leaves.items():
+            labels = dict(zip(H5_LEVELS, key))
+            idx = tuple(coords[dim].index(labels[dim]) for dim in CUBE_DIMS)
+            data[idx] = dataset[()]
+            present[idx] = True
+
+        data.flush()
+        del data
+
+    index = {
+        "dims": CUBE_DIMS,
+        "coords": coords,
+        "present": present.astype(int).tolist(),
+        "source": _source_signature(rsm_file),
+    }
+    with open(index_path, "w") as f:
+        json.dump(index, f)
+
+    return load_rsm_cube(rsm_file)
+
+
+def load_rsm_cube(rsm_file, mmap_mode="r"):
+    """
+    Opens the cube for an RSM file as a memory map
+
+    Inputs
+        rsm_file (str): path to the .h5 file the cube was built from
+        mmap_mode (str): mode passed to np.load, read-only by default
+
+    Returns
+        cube (RSMCube), or None if no cube exists or the .h5 file has changed since
+            the cube was built
+    """
+    data_path, index_path = get_cube_paths(rsm_file)
+    if not (os.path.isfile(data_path) and os.path.isfile(index_path)):
+        return None
+
+    with open(index_path, "r") as f:
+        index = json.load(f)
+
+    if os.path.isfile(rsm_file) and index["source"] != _source_signature(rsm_file):
+        return None
+
+    dims, coords = index["dims"], index["coords"]
+    rsms = LabelledArray(np.load(data_path, mmap_mode=mmap_mode), dims, coords)
+    present = LabelledArray(np.array(index["present"], dtype=bool), dims, coords)
+
+    return RSMCube(rsms, present)
+
+
+def main():
+    """
+    Builds cubes for every RSM file that exists in analysis_outputs
+    """
+    for key in ["rsms", "rsms_r2_control", "rsms_6depth"]:
+        if os.path.isfile(PATHS[key]):
+            print(f"Building cube for {PATHS[key]}")
+            build_rsm_cube(PATHS[key])
+
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,29 @@
 Utilities for reading, parsing, and manipulating RSMs
 """
 
+import itertools
+from collections import namedtuple
+
 import h5py
 import numpy as np
 
-from scipy.optimize import nnls, lsq_linear
 from submm.constants import PARTITIONS, FSID_SESSIONS, PATHS, PRIMARY_METRIC
+from submm.utils.rsm_cube import load_rsm_cube, order_sessions, H5_LEVELS
+from submm.utils.cache import cached_load
+from submm.utils.designs import Design, get_layout_for_size
+from submm.utils.labelled import LabelledArray
+
+# outputs of fit_rdms(..., return_fit=True); all but residuals have the shape of the
+# stack of RDMs without its last axis
+FitResult = namedtuple(
+    "FitResult", ["weights", "r2", "adj_r2", "rss", "aic", "bic", "residuals"]
+)
 
+# goodness-of-fit statistics collected by stack_fit_statistics
+FIT_STATISTICS = ["r2", "adj_r2", "rss", "aic", "bic"]
 
+
+@cached_load(lambda args: args["rsm_file"])
 def load_single_rsm(
     rsm_file,
     fsid_session,
@@ -38,6 +54,68 @@ def load_single_rsm(
     return matrix
 
 
+@cached_load(lambda args: args["rsm_file"])
+def load_rsm_stack(
+    rsm_file,
+    fsid_sessions=FSID_SESSIONS,
+    partitions=PARTITIONS,
+    glm_dir="GLM_vanilla",
+    metric=PRIMARY_METRIC,
+    noise_type="none",
+    thresh="thr_75",
+    use_cube=True,
+):
+    """
+    Loads the RSMs for every requested partition and session while opening the .h5
+    file only once. Each session's group path is resolved a single time and every
+    dataset is read directly into one preallocated array.
+
+    If a memory-mapped cube has been built for rsm_file (see submm.utils.rsm_cube),
+    the RSMs are instead returned as read-only views into that cube.
+
+    Inputs
+        rsm_file (str): path to .h5 file to read
+        fsid_sessions (list): FSID/session strings to load, in order
+        partitions (list): partitions to load, in order
+        use_cube (bool): if True, read from the cube for rsm_file when it exists
+        [see documentation for load_single_rsm for the remaining inputs]
+
+    Returns
+        rsms (dict): keys are partitions, values are n_sessions x 30 x 30 arrays
+    """
+    cube = load_rsm_cube(rsm_file) if use_cube else None
+    if cube is not None:
+        return {
+            partition: cube.sel(
+                glm_dir=glm_dir,
+                metric=metric,
+                noise_type=noise_type,
+                partition=partition,
+                thresh=thresh,
+                session=list(fsid_sessions),
+            ).values
+            for partition in partitions
+        }
+
+    with h5py.File(rsm_file, "r") as f:
+        noise_groups = [
+            f["corrmats"][fsid_session][glm_dir][metric][noise_type]
+            for fsid_session in fsid_sessions
+        ]
+        datasets = [
+            [noise_group[partition][thresh] for noise_group in noise_groups]
+            for partition in partitions
+        ]
+
+        matrix_shape = datasets[0][0].shape if datasets and datasets[0] else (0, 0)
+        stack = np.empty((len(partitions), len(fsid_sessions)) + matrix_shape)
+        for partition_idx, partition_datasets in enumerate(datasets):
+            for session_idx, dataset in enumerate(partition_datasets):
+                dataset.read_direct(stack[partition_idx, session_idx])
+
+    return {partition: stack[idx] for idx, partition in enumerate(partitions)}
+
+
 def load_rsms(
     metric=PRIMARY_METRIC,
     thresh="thr_75",
@@ -45,6 +123,7 @@ def load_rsms(
     noise_type="none",
     r2_control=False,
     partitions=PARTITIONS,
+    six_depth=False,
 ):
     """
     Retrieve correlation matrices
@@ -53,64 +132,236 @@ def load_rsms(
         [see documentation for load_single_rsm]
         noise_type (str): can be one of "gaussian" or "none"
         r2_control (bool): If true, load from PATHS['rsms_r2_control']
+        six_depth (bool): If true, load 60x60 matrices (6 depths) from
+            PATHS['rsms_6depth']
     """
+    if r2_control and six_depth:
+        raise Exception("No r2 control RSMs exist for six depths")
+
+    if six_depth:
+        rsm_path = PATHS["rsms_6depth"]
+    else:
+        rsm_path = PATHS["rsms_r2_control"] if r2_control else PATHS["rsms"]
+    return load_rsm_stack(
+        rsm_path,
+        fsid_sessions=FSID_SESSIONS,
+        partitions=partitions,
+        glm_dir=glm_dir,
+        metric=metric,
+        noise_type=noise_type,
+        thresh=thresh,
+    )
+
+
+@cached_load(lambda args: args["rsm_file"])
+def _read_leaves(rsm_file, leaves):
+    """
+    Reads the datasets at each of the given leaves with a single open of the file
+
+    Inputs
+        rsm_file (str): path to .h5 file to read
+        leaves (tuple): each entry is a tuple of group names, one per H5_LEVELS
+
+    Returns
+        matrices (np.ndarray): len(leaves) x 30 x 30 stack, in the order of leaves
+    """
+    with h5py.File(rsm_file, "r") as f:
+        datasets = [f["corrmats"]["/".join(leaf)] for leaf in leaves]
+        matrices = np.empty((len(datasets),) + datasets[0].shape)
+        for idx, dataset in enumerate(datasets):
+            dataset.read_direct(matrices[idx])
+
+    return matrices
+
+
+class RSMStore:
+    """
+    Lazy, dict-like view over the whole corrmats hierarchy of an RSM file. The
+    hierarchy is treated as a set of labelled axes (session, glm_dir, metric,
+    noise_type, partition, thresh); data are only read when a selection is made.
+
+    Inputs
+        rsm_file (str): path to .h5 file, e.g., PATHS['rsms']
+
+    Example
+        store = RSMStore(PATHS["rsms"])
+        rsms = store.sel(metric=["znorm", "tstat"], partition="VTC_lateral")
+        store.missing(session="C1051_20161006")
+    """
+
+    dims = tuple(H5_LEVELS)
+
+    def __init__(self, rsm_file):
+        self.rsm_file = rsm_file
+
+        # walk the group names only; no datasets are read here
+        leaves = []
+
+        def collect(name, obj):
+            if isinstance(obj, h5py.Dataset):
+                leaves.append(tuple(name.split("/")))
+
+        with h5py.File(rsm_file, "r") as f:
+            f["corrmats"].visititems(collect)
+
+        self._leaves = frozenset(leaves)
+        self.coords = {
+            dim: sorted({leaf[i] for leaf in leaves}) for i, dim in enumerate(self.dims)
+        }
+        self.coords["session"] = order_sessions(self.coords["session"])
+
+    def __len__(self):
+        return len(self._leaves)
+
+    def __iter__(self):
+        return iter(sorted(self._leaves))
+
+    def __contains__(self, leaf):
+        return tuple(leaf) in self._leaves
+
+    def __getitem__(self, key):
+        """
+        Positional selection in the order of dims, e.g.,
+            store["C1051_20160212", "GLM_vanilla", :, "none", "hOc1", "thr_75"]
+        """
+        if not isinstance(key, tuple):
+            key = (key,)
+        assert len(key) <= len(self.dims), f"at most {len(self.dims)} labels allowed"
+
+        selectors = {}
+        for dim, selector in zip(self.dims, key):
+            if isinstance(selector, slice):
+                assert selector == slice(None), "only full slices (:) are supported"
+                continue
+            selectors[dim] = selector
+
+        return self.sel(**selectors)
+
+    def _selection(self, selectors):
+        """
+        Returns the labels to take along each dim, and the dims that are kept
+        """
+        for dim in selectors:
+            assert dim in self.dims, f"{dim} is not one of {self.dims}"
+
+        labels, kept_dims = [], []
+        for dim in self.dims:
+            selector = selectors.get(dim)
+            if selector is None:
+                labels.append(self.coords[dim])
+                kept_dims.append(dim)
+            elif isinstance(selector, (list, tuple, np.ndarray)):
+                labels.append(list(selector))
+                kept_dims.append(dim)
+            else:
+                labels.append([selector])
+
+        return labels, kept_dims
 
-    rsm_path = PATHS["rsms_r2_control"] if r2_control else PATHS["rsms"]
-    rsms = {}
-    for partition in partitions:
-        rsms_list = []
-        for fsid_session in FSID_SESSIONS:
-            rsms_list.append(
-                load_single_rsm(
-                    rsm_path,
-                    fsid_session,
-                    glm_dir=glm_dir,
-                    partition=partition,
-                    metric=metric,
-                    thresh=thresh,
-                    noise_type=noise_type,
-                )
+    def leaves(self, **selectors):
+        """
+        Returns the leaves (tuples of labels in the order of dims) that exist in the
+        file and match the selection. Unspecified dims match everything.
+        """
+        labels, _ = self._selection(selectors)
+        return [leaf for leaf in itertools.product(*labels) if leaf in self._leaves]
+
+    def missing(self, **selectors):
+        """
+        Returns the leaves that match the selection but do not exist in the file,
+        e.g., the simulated 2.4mm GLMs for the 3T session
+        """
+        labels, _ = self._selection(selectors)
+        return [leaf for leaf in itertools.product(*labels) if leaf not in self._leaves]
+
+    def exists(self, **selectors):
+        """
+        True if every leaf matching the selection exists in the file
+        """
+        return len(self.missing(**selectors)) == 0
+
+    def sel(self, fill_missing=False, **selectors):
+        """
+        Reads the sub-cube matching the selection. A single label drops that axis, a
+        list of labels keeps it, and unspecified dims keep every label.
+
+        Inputs
+            fill_missing (bool): if True, leaves missing from the file are NaN
+                instead of raising a KeyError
+            selectors: keys are dims, values are a label or a list of labels
+
+        Returns
+            LabelledArray over the kept dims (the RSM axes trail), or an ndarray if
+                every dim was given a single label
+        """
+        labels, kept_dims = self._selection(selectors)
+        leaves = list(itertools.product(*labels))
+        is_present = np.array([leaf in self._leaves for leaf in leaves])
+
+        if not np.all(is_present) and not fill_missing:
+            missing = [leaf for leaf, p in zip(leaves, is_present) if not p]
+            raise KeyError(
+                f"{len(missing)} selected RSMs do not exist, e.g., {missing[0]}"
             )
-        rsms[partition] = np.array(rsms_list)
+        assert np.any(is_present), "none of the selected RSMs exist"
+
+        present_leaves = tuple(leaf for leaf, p in zip(leaves, is_present) if p)
+        matrices = _read_leaves(self.rsm_file, present_leaves)
 
-    return rsms
+        values = np.full((len(leaves),) + matrices.shape[1:], np.nan)
+        values[is_present] = matrices
+        values = values.reshape(tuple(len(x) for x in labels) + matrices.shape[1:])
+        dropped_axes = tuple(
+            i for i, dim in enumerate(self.dims) if dim not in kept_dims
+        )
+        values = values.squeeze(axis=dropped_axes)
+
+        if len(kept_dims) == 0:
+            return values
+        coords = {dim: x for dim, x in zip(self.dims, labels) if dim in kept_dims}
+        return LabelledArray(values, kept_dims, coords)
 
 
 def get_lower_tri(x, with_diagonal=False):
     """
-    Returns the lower triangle of a provided matrix
+    Returns the lower triangle of a provided matrix, or of each matrix in a stack
 
     Inputs
-        x (np.ndarray): 2D matrix to get triangle from
+        x (np.ndarray): 2D matrix (or ... x N x N stack) to get triangle(s) from
         with_diagonal (bool): if True, keeps the diagonal as part of lower triangle
     """
+    assert x.shape[-1] == x.shape[-2], "matrices must be square"
     k = 0 if with_diagonal else -1
-    return x[np.tril_indices_from(x, k=k)]
+    rows, cols = np.tril_indices(x.shape[-1], k=k)
+    return x[..., rows, cols]
 
 
-def split_by_depth(rsm):
+def split_by_depth(rsm, layout=None):
     """
-    Splits a 30x30 rsm to 3 10x10 RSMS with alternating entries
+    Splits an rsm into one rsm per depth, e.g., a 30x30 rsm to 3 10x10 RSMS with
+    alternating entries. Works on whole stacks of rsms at once, and returns a
+    read-only view into rsm rather than a copy whenever rsm's last two axes can be
+    reshaped without copying (e.g., for contiguous arrays and memory maps).
 
     Inputs
-        rsm (30 x 30 matrix)
-    """
-
-    assert rsm.shape == (30, 30)
-    superficial_indices = np.arange(0, 30, 3)
-    middle_indices = np.arange(1, 30, 3)
-    deep_indices = np.arange(2, 30, 3)
-
-    superficial = rsm[superficial_indices, :]
-    superficial = superficial[:, superficial_indices]
+        rsm (... x N x N): matrix or stack of matrices
+        layout (ConditionLayout): order of the conditions of rsm, inferred from its
+            size (e.g., 30 for 3 depths, 60 for 6 depths) if None
 
-    middle = rsm[middle_indices, :]
-    middle = middle[:, middle_indices]
+    Returns
+        ... x n_depths x n_categories x n_categories
+    """
+    if layout is None:
+        layout = get_layout_for_size(rsm.shape[-1])
+    n_cat, n_depths = layout.n_categories, layout.n_depths
+    assert rsm.shape[-2:] == (layout.n_conditions, layout.n_conditions)
 
-    deep = rsm[deep_indices, :]
-    deep = deep[:, deep_indices]
+    # conditions are ordered by category, then depth, so split each axis into
+    # (category, depth) and keep the entries where the two depths match
+    blocks = rsm.reshape(rsm.shape[:-2] + (n_cat, n_depths, n_cat, n_depths))
+    same_depth = np.diagonal(blocks, axis1=-3, axis2=-1)
 
-    return np.vstack((superficial[None, :], middle[None, :], deep[None, :]))
+    return np.moveaxis(same_depth, -1, -3)
 
 
 def fit_rdm(rdm, regressors, method="lsq"):
@@ -122,6 +373,8 @@ def fit_rdm(rdm, regressors, method="lsq"):
             nnls: uses scipy.optimize.nnls
             lsq: uses scipy.optimize.lsq_linear (default)
     """
+    # imported here so scripts that only read matrices don't load scipy.optimize
+    from scipy.optimize import nnls, lsq_linear
 
     y = rdm.flatten()
     X = np.array([x.flatten() for x in regressors]).T
@@ -135,3 +388,182 @@ def fit_rdm(rdm, regressors, method="lsq"):
         raise Exception(f"Method {method} not recognized")
 
     return weights
+
+
+def _nnls_stack(gram, Xty, max_iter=None):
+    """
+    Lawson-Hanson non-negative least squares, run on every row of a batch at once.
+    Works entirely on the Gram matrix, so the cost per iteration doesn't depend on
+    the number of cells. Rows sharing a passive set are solved together.
+
+    Inputs
+        gram (m, m): X.T @ X for the shared design matrix X
+        Xty (B, m): X.T @ y for each of the B targets
+        max_iter (int): cap on the number of outer iterations, 3 * m by default
+            (as in scipy.optimize.nnls)
+
+    Returns
+        weights (B, m)
+    """
+    n_batch, m = Xty.shape
+    if max_iter is None:
+        max_iter = 3 * m
+    tol = 10 * max(m, 1) * np.finfo(float).eps * max(np.abs(gram).max(), 1)
+    tol = tol * np.maximum(np.abs(Xty).max(axis=1, initial=0), 1)[:, None]
+
+    weights = np.zeros((n_batch, m))
+    passive = np.zeros((n_batch, m), dtype=bool)
+    powers = 2 ** np.arange(m)
+
+    def solve_passive(rows):
+        # unconstrained solution restricted to each row's passive set
+        solution = np.zeros((len(rows), m))
+        codes = passive[rows] @ powers
+        for code in np.unique(codes):
+            members = np.flatnonzero(codes == code)
+            cols = np.flatnonzero(passive[rows[members[0]]])
+            if cols.size == 0:
+                continue
+            sub_gram = gram[np.ix_(cols, cols)]
+            rhs = Xty[np.ix_(rows[members], cols)]
+            solution[np.ix_(members, cols)] = np.linalg.solve(sub_gram, rhs.T).T
+        return solution
+
+    for _ in range(max_iter):
+        # dual variables, positive entries could still decrease the residual
+        dual = Xty - weights @ gram
+        candidates = ~passive & (dual > tol)
+        rows = np.flatnonzero(candidates.any(axis=1))
+        if rows.size == 0:
+            break
+
+        entering = np.argmax(np.where(candidates[rows], dual[rows], -np.inf), axis=1)
+        passive[rows, entering] = True
+
+        # inner loop: step back towards the feasible region until all weights > 0
+        while rows.size > 0:
+            solution = solve_passive(rows)
+            infeasible = passive[rows] & (solution <= tol[rows])
+            bad = infeasible.any(axis=1)
+
+            weights[rows[~bad]] = solution[~bad]
+
+            bad_rows = rows[bad]
+            current, solution = weights[bad_rows], solution[bad]
+            step = current - solution
+            step[step == 0] = 1
+            ratios = np.where(infeasible[bad], current / step, np.inf)
+            alpha = ratios.min(axis=1, initial=np.inf)[:, None]
+
+            current = current + alpha * (solution - current)
+            passive[bad_rows] &= current > tol[bad_rows]
+            weights[bad_rows] = np.where(passive[bad_rows], current, 0)
+
+            rows = bad_rows
+
+    return weights
+
+
+def fit_rdms(rdms, regressors, method="lsq", return_fit=False):
+    """
+    Fits every RDM in a stack with the same set of regressors, giving the same
+    result as fit_rdm for each RDM.
+
+    Inputs
+        rdms (..., N): stack of RDM vectors (e.g., lower triangles) to fit
+        regressors (Design or m x N array): a design from submm.utils.designs, whose
+            factorization is reused, or a set of m predictor vectors as for fit_rdm
+        method (str):
+            lsq: unconstrained least squares; the design is factorized once and all
+                weights come from a single matrix multiply (default)
+            nnls: non-negative least squares, with an active-set solver vectorized
+                over the stack
+        return_fit (bool): if True, also computes goodness of fit from the same
+            weights
+
+    Returns
+        weights (..., m), or if return_fit is True, a FitResult of
+            weights (..., m)
+            r2, adj_r2 (...): variance explained about the mean of each RDM, raw and
+                adjusted for the number of regressors, NaN for constant RDMs
+            rss (...): residual sum of squares
+            aic, bic (...): Akaike and Bayesian information criteria (Gaussian errors),
+                NaN for perfect fits
+            residuals (..., N)
+    """
+    if isinstance(regressors, Design):
+        X, pinv, gram = regressors.X, regressors.pinv, regressors.gram
+    else:
+        X = np.array([x.flatten() for x in regressors]).T
+        pinv, gram = np.linalg.pinv(X), X.T @ X
+
+    rdms = np.asarray(rdms)
+    assert rdms.shape[-1] == X.shape[0], "RDMs and regressors differ in length"
+
+    if method == "lsq":
+        weights = rdms @ pinv.T
+    elif method == "nnls":
+        Xty = rdms.reshape(-1, X.shape[0]) @ X
+        weights = _nnls_stack(gram, Xty)
+        weights = weights.reshape(rdms.shape[:-1] + (X.shape[1],))
+    else:
+        raise Exception(f"Method {method} not recognized")
+
+    if not return_fit:
+        return weights
+
+    n_cells, n_regressors = X.shape
+    residuals = rdms - weights @ X.T
+    rss = np.sum(residuals ** 2, axis=-1)
+    tss = np.sum((rdms - rdms.mean(axis=-1, keepdims=True)) ** 2, axis=-1)
+
+    # sums of squares at the level of rounding error count as 0
+    rounding = np.finfo(float).eps * np.sum(rdms ** 2, axis=-1)
+
+    # constant RDMs have no variance to explain, so their r2 is NaN
+    is_constant = tss <= rounding
+    r2 = np.where(is_constant, np.nan, 1 - rss / np.where(is_constant, 1, tss))
+    adj_r2 = 1 - (1 - r2) * (n_cells - 1) / (n_cells - n_regressors)
+
+    # the likelihood of a perfect fit (e.g., of a constant RDM) is unbounded, so its
+    # AIC and BIC are NaN rather than -inf
+    is_perfect = rss <= rounding
+    log_likelihood_term = np.where(
+        is_perfect, np.nan, n_cells * np.log(np.where(is_perfect, 1, rss) / n_cells)
+    )
+
+    return FitResult(
+        weights=weights,
+        r2=r2,
+        adj_r2=adj_r2,
+        rss=rss,
+        aic=log_likelihood_term + 2 * n_regressors,
+        bic=log_likelihood_term + n_regressors * np.log(n_cells),
+        residuals=residuals,
+    )
+
+
+def stack_fit_statistics(partition_fits):
+    """
+    Collects the goodness-of-fit statistics of several fits into one labelled array
+
+    Inputs
+        partition_fits (dict): keys are partitions, values are FitResults of the
+            same shape
+
+    Returns
+        LabelledArray over (statistic, partition), trailing axes are the axes of the
+            fitted stack (e.g., subjects)
+    """
+    partitions = list(partition_fits.keys())
+    values = np.array(
+        [
+            [getattr(partition_fits[partition], stat) for partition in partitions]
+            for stat in FIT_STATISTICS
+        ]
+    )
+    return LabelledArray(
+        values,
+        ["statistic", "partition"],
+        {"statistic": FIT_STATISTICS, "partition": partitions},
+    )
@@ -0,0 +1,221 @@
+"""
+All-pairs similarity between the RDMs of different subjects
+
+Every pair of subjects is compared for every leaf of an RSM file (partition, metric,
+threshold, GLM, noise type) in one batched pass. Pearson and Spearman similarities
+are inner products of standardized (ranked, for Spearman) lower triangles. Kendall's
+tau-a uses the same ranks, computed once per RDM, and counts discordant pairs as the
+inversions of a merge sort, run for every pair of RDMs at once.
+"""
+
+import numpy as np
+
+from submm.constants import FSID_SESSIONS, PATHS
+from submm.utils.labelled import LabelledArray
+from submm.utils.rsm_utils import RSMStore, get_lower_tri
+
+SIMILARITY_METHODS = ["pearson", "spearman", "kendall"]
+
+
+def rank_data(x):
+    """
+    Ranks along the last axis, giving ties their average rank (as with
+    scipy.stats.rankdata)
+
+    Inputs
+        x (..., n)
+
+    Returns
+        ranks (..., n), from 1 to n
+    """
+    x = np.asarray(x, dtype=float)
+    order = np.argsort(x, axis=-1, kind="stable")
+    sorted_x = np.take_along_axis(x, order, axis=-1)
+
+    # first and last position of the tie group each sorted element belongs to
+    n = x.shape[-1]
+    positions = np.broadcast_to(np.arange(n), x.shape)
+    is_first = np.ones(x.shape, dtype=bool)
+    is_first[..., 1:] = sorted_x[..., 1:] != sorted_x[..., :-1]
+    is_last = np.ones(x.shape, dtype=bool)
+    is_last[..., :-1] = is_first[..., 1:]
+    first = np.maximum.accumulate(np.where(is_first, positions, 0), axis=-1)
+    last = np.flip(
+        np.minimum.accumulate(np.flip(np.where(is_last, positions, n), -1), axis=-1),
+        -1,
+    )
+
+    ranks = np.empty(x.shape)
+    np.put_along_axis(ranks, order, (first + last) / 2 + 1, axis=-1)
+    return ranks
+
+
+def _n_tied_pairs(sorted_keys):
+    """
+    Number of pairs with equal keys along the last axis of sorted keys
+    """
+    n = sorted_keys.shape[-1]
+    is_first = np.ones(sorted_keys.shape, dtype=bool)
+    is_first[..., 1:] = sorted_keys[..., 1:] != sorted_keys[..., :-1]
+
+    # each element is tied with every earlier element of its group
+    positions = np.broadcast_to(np.arange(n), sorted_keys.shape)
+    first = np.maximum.accumulate(np.where(is_first, positions, 0), axis=-1)
+    return np.sum(positions - first, axis=-1)
+
+
+def _count_inversions(x):
+    """
+    Number of pairs i < j with x[i] > x[j] along the last axis, by a bottom-up merge
+    sort of every row at once
+
+    Inputs
+        x (..., n)
+
+    Returns
+        inversions (...)
+    """
+    batch_shape, n = x.shape[:-1], x.shape[-1]
+    n_padded = 1 << max(n - 1, 0).bit_length()
+
+    # padding with +inf at the end adds no inversions
+    values = np.full((int(np.prod(batch_shape)), n_padded), np.inf)
+    values[:, :n] = x.reshape(-1, n)
+
+    inversions = np.zeros(values.shape[0], dtype=np.int64)
+    width = 1
+    while width < n_padded:
+        # merge sorted blocks of size width in adjacent pairs
+        blocks = values.reshape(values.shape[0], -1, 2 * width)
+        order = np.argsort(blocks, axis=-1, kind="stable")
+
+        # a right-hand element that lands at position p of the merged block has
+        # p - (its position in the right block) left-hand elements before it, so
+        # the rest of the left block is greater than it
+        is_right = order >= width
+        right_position = np.cumsum(is_right, axis=-1) - 1
+        n_left_before = np.arange(2 * width) - right_position
+        n_left_greater = np.where(is_right, width - n_left_before, 0)
+        inversions += n_left_greater.sum(axis=(-2, -1))
+
+        values = np.take_along_axis(blocks, order, axis=-1).reshape(values.shape)
+        width *= 2
+
+    return inversions.reshape(batch_shape)
+
+
+def kendall_tau_a(x_ranks, y_ranks):
+    """
+    Kendall's tau-a between paired rows of ranks, in O(n log n) per pair
+
+    Inputs
+        x_ranks, y_ranks (..., n): from rank_data, broadcastable against each other
+
+    Returns
+        tau (...): (concordant - discordant pairs) / (n choose 2)
+    """
+    x_ranks, y_ranks = np.broadcast_arrays(x_ranks, y_ranks)
+    n = x_ranks.shape[-1]
+    n_pairs = n * (n - 1) / 2
+
+    # average ranks are multiples of 0.5, so 2 * rank is an exact integer and the
+    # pair (x, y) can be sorted lexicographically with a single key
+    joint_key = 2 * x_ranks * (2 * n + 2) + 2 * y_ranks
+    order = np.argsort(joint_key, axis=-1, kind="stable")
+    sorted_x = np.take_along_axis(x_ranks, order, axis=-1)
+    sorted_y = np.take_along_axis(y_ranks, order, axis=-1)
+    sorted_joint = np.take_along_axis(joint_key, order, axis=-1)
+
+    x_ties = _n_tied_pairs(sorted_x)
+    y_ties = _n_tied_pairs(np.sort(y_ranks, axis=-1))
+    joint_ties = _n_tied_pairs(sorted_joint)
+
+    # with ties in x sorted by y, inversions of y are exactly the discordant pairs
+    discordant = _count_inversions(sorted_y)
+    concordant = n_pairs - x_ties - y_ties + joint_ties - discordant
+    return (concordant - discordant) / n_pairs
+
+
+def _standardize(x):
+    """
+    Centers each row and scales it to unit norm, along the last axis
+    """
+    centered = x - x.mean(axis=-1, keepdims=True)
+    return centered / np.linalg.norm(centered, axis=-1, keepdims=True)
+
+
+def subject_similarity(vectors, method="pearson"):
+    """
+    Similarity between every pair of subjects' vectors (e.g., RDM lower triangles)
+
+    Inputs
+        vectors (..., subjects, n): np.ndarray or LabelledArray (with subjects and
+            cells as unlabelled trailing axes)
+        method (str): one of SIMILARITY_METHODS
+
+    Returns
+        similarity (..., subjects, subjects), NaN for subjects with missing data
+    """
+    labelled = vectors if isinstance(vectors, LabelledArray) else None
+    vectors = np.asarray(vectors, dtype=float)
+    is_missing = np.any(np.isnan(vectors), axis=-1)
+
+    if method == "pearson":
+        standardized = _standardize(vectors)
+        similarity = standardized @ np.swapaxes(standardized, -1, -2)
+    elif method == "spearman":
+        standardized = _standardize(rank_data(vectors))
+        similarity = standardized @ np.swapaxes(standardized, -1, -2)
+    elif method == "kendall":
+        ranks = rank_data(vectors)
+        n_subjects = vectors.shape[-2]
+        rows, cols = np.triu_indices(n_subjects)
+        tau = kendall_tau_a(ranks[..., rows, :], ranks[..., cols, :])
+
+        similarity = np.empty(vectors.shape[:-1] + (n_subjects,))
+        similarity[..., rows, cols] = tau
+        similarity[..., cols, rows] = tau
+    else:
+        raise Exception(f"Method {method} not recognized")
+
+    similarity[is_missing[..., :, None] | is_missing[..., None, :]] = np.nan
+
+    if labelled is not None:
+        return LabelledArray(similarity, labelled.dims, labelled.coords)
+    return similarity
+
+
+def intersubject_similarity(
+    rsm_file=None,
+    method="pearson",
+    with_diagonal=True,
+    sessions=FSID_SESSIONS,
+    **selectors,
+):
+    """
+    Subject x subject RDM similarity for every leaf of an RSM file
+
+    Inputs
+        rsm_file (str): defaults to PATHS['rsms']
+        method (str): one of SIMILARITY_METHODS
+        with_diagonal (bool): whether to include the diagonal of the RDMs
+        sessions (list): sessions (subjects) to compare
+        selectors: restrict any other level of the file, see RSMStore.sel, e.g.,
+            metric='znorm' (a single label drops that level)
+
+    Returns
+        LabelledArray over the selected levels (of glm_dir, metric, noise_type,
+            partition, thresh), trailing axes are subjects x subjects. Leaves
+            missing from the file are NaN.
+    """
+    store = RSMStore(rsm_file or PATHS["rsms"])
+    rsms = store.sel(fill_missing=True, session=list(sessions), **selectors)
+
+    # sessions are the first level of the file, move them next to the RDM axes
+    session_axis = rsms.axis("session")
+    dims = [dim for dim in rsms.dims if dim != "session"]
+    values = np.moveaxis(np.asarray(rsms.values), session_axis, len(rsms.dims) - 1)
+
+    lower_tris = get_lower_tri(1 - values, with_diagonal=with_diagonal)
+    similarity = subject_similarity(lower_tris, method=method)
+    return LabelledArray(similarity, dims, {dim: rsms.coords[dim] for dim in dims})
@@ -2,8 +2,17 @@
 Statistical utilities
 """
 
+from collections import namedtuple
+
 import numpy as np
-import scipy.stats as ss
+
+from submm.utils.labelled import LabelledArray
+from submm.utils.results_store import record_result
+
+# each field has the shape of the tested stack with the test axis removed
+# effect_size is Cohen's d (d_z for paired tests), p_adjusted is corrected across
+# every test in the stack
+TTestResult = namedtuple("TTestResult", ["t", "df", "p", "effect_size", "p_adjusted"])
 
 
 def sem(vals, axis=0):
@@ -13,20 +22,178 @@ def sem(vals, axis=0):
     return np.std(vals, axis=axis) / np.sqrt(vals.shape[axis])
 
 
-def report_mn_sem(x):
+def adjust_p_values(p, method="fdr_bh"):
+    """
+    Corrects p-values for multiple comparisons across every element of p (NaNs are
+    ignored)
+
+    Inputs
+        p (np.ndarray): p-values of any shape
+        method (str):
+            fdr_bh: Benjamini-Hochberg false discovery rate
+            holm: Holm-Bonferroni step-down
+            bonferroni: Bonferroni
+
+    Returns
+        adjusted p-values, same shape as p
+    """
+    p = np.asarray(p, dtype=float)
+    flat_p = p.ravel()
+    valid = ~np.isnan(flat_p)
+    n_tests = np.sum(valid)
+
+    order = np.argsort(flat_p[valid])
+    ranked = flat_p[valid][order]
+    if method == "bonferroni":
+        adjusted = ranked * n_tests
+    elif method == "holm":
+        adjusted = np.maximum.accumulate(ranked * (n_tests - np.arange(n_tests)))
+    elif method == "fdr_bh":
+        adjusted = ranked * n_tests / np.arange(1, n_tests + 1)
+        adjusted = np.minimum.accumulate(adjusted[::-1])[::-1]
+    else:
+        raise Exception(f"Method {method} not recognized")
+
+    flat_adjusted = np.full(flat_p.shape, np.nan)
+    valid_adjusted = np.empty(n_tests)
+    valid_adjusted[order] = np.minimum(adjusted, 1)
+    flat_adjusted[valid] = valid_adjusted
+    return flat_adjusted.reshape(p.shape)
+
+
+def ttest_1samp(x, population_mean=0.0, axis=0, correction="fdr_bh"):
+    """
+    One-sample t tests along an axis, for every element of a stacked array at once
+
+    Inputs
+        x (np.ndarray or LabelledArray): samples (e.g., subjects) along axis; for a
+            LabelledArray, axis must be one of the unlabelled trailing axes
+        population_mean (float): the mean against which to compare the mean of x
+        axis (int): axis of the samples
+        correction (str): multiple comparison correction, see adjust_p_values
+
+    Returns
+        TTestResult, with LabelledArrays if x was one
+    """
+    # imported here so that importing this module doesn't load scipy
+    from scipy.special import stdtr
+
+    labelled = x if isinstance(x, LabelledArray) else None
+    x = np.asarray(x, dtype=float)
+    axis = axis % x.ndim
+    if labelled is not None:
+        assert axis >= len(labelled.dims), "samples must be an unlabelled axis"
+
+    n_samples = x.shape[axis]
+    deviations = x - population_mean
+    mean = deviations.mean(axis=axis)
+    std = deviations.std(axis=axis, ddof=1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = mean / (std / np.sqrt(n_samples))
+        effect_size = mean / std
+    df = np.full(t.shape, n_samples - 1)
+    p = 2 * stdtr(df, -np.abs(t))
+    p_adjusted = p if correction is None else adjust_p_values(p, correction)
+
+    fields = [t, df, p, effect_size, p_adjusted]
+    if labelled is not None:
+        fields = [LabelledArray(f, labelled.dims, labelled.coords) for f in fields]
+    else:
+        # scalars rather than 0-d arrays for a single test
+        fields = [f[()] for f in fields]
+
+    return TTestResult(*fields)
+
+
+def ttest_rel(x, y, axis=0, correction="fdr_bh"):
+    """
+    Paired t tests along an axis, for every element of stacked arrays at once
+
+    Inputs
+        x, y (np.ndarray or LabelledArray): matched samples along axis, see
+            ttest_1samp
+
+    Returns
+        TTestResult of x - y
+    """
+    labelled = [z for z in [x, y] if isinstance(z, LabelledArray)]
+    if len(labelled) == 2:
+        assert x.dims == y.dims and x.coords == y.coords, "x and y labels differ"
+
+    difference = np.asarray(x, dtype=float) - np.asarray(y, dtype=float)
+    if labelled:
+        difference = LabelledArray(difference, labelled[0].dims, labelled[0].coords)
+
+    return ttest_1samp(difference, axis=axis, correction=correction)
+
+
+def ttest_table(result):
+    """
+    Flattens a TTestResult into a table with a row per test
+
+    Returns
+        pd.DataFrame indexed by the labels (or positions) of each test
+    """
+    # imported here so that importing this module stays cheap
+    import pandas as pd
+
+    t = result.t
+    if isinstance(t, LabelledArray):
+        n_labelled = len(t.dims)
+        names = list(t.dims)
+        levels = [t.coords[dim] for dim in t.dims]
+    else:
+        n_labelled = 0
+        names, levels = [], []
+    shape = np.shape(t)
+    names += [f"axis_{axis}" for axis in range(n_labelled, len(shape))]
+    levels += [range(n) for n in shape[n_labelled:]]
+
+    columns = {
+        field: np.asarray(getattr(result, field)).ravel() for field in result._fields
+    }
+    index = pd.MultiIndex.from_product(levels, names=names) if levels else None
+    return pd.DataFrame(columns, index=index)
+
+
+def format_ttest(result):
+    """
+    Formats a single test as, e.g., 't(6) = 3.2, p = 0.0187'
+    """
+    return f"t({int(result.df)}) = {result.t:.3}, p = {result.p:.3}"
+
+
+def _ttest_values(result):
+    """
+    Statistics of a single test, for the results store
+    """
+    return {field: getattr(result, field) for field in ["t", "df", "p", "effect_size"]}
+
+
+def report_mn_sem(x, label=None, **context):
     """
     Reports mean and standard deviation of a vector, x
+
+    Inputs:
+        label (str), context: recorded with the result, see
+            submm.utils.results_store.record_result
     """
     x = np.array(x)
-    print(f"{np.mean(x):.3f} +/- {np.std(x) / np.sqrt(x.shape[0]):.3f}")
+    mn, se = np.mean(x), np.std(x) / np.sqrt(x.shape[0])
+    print(f"{mn:.3f} +/- {se:.3f}")
+    record_result("mean_sem", {"mean": mn, "sem": se}, label=label, **context)
 
 
-def report_ttest_2_sample(x, y, print_mean_var=False):
+def report_ttest_2_sample(x, y, print_mean_var=False, label=None, **context):
     """
     Reports results of a 2-sample matched pairs t test
+
+    Inputs:
+        label (str), context: recorded with the result, see
+            submm.utils.results_store.record_result
     """
-    t, p = ss.ttest_rel(x, y)
-    df = x.shape[0] - 1
+    result = ttest_rel(x, y, correction=None)
 
     mu_x = x.mean()
     sem_x = sem(x)
@@ -36,10 +203,17 @@ def report_ttest_2_sample(x, y, print_mean_var=False):
 
     if print_mean_var:
         print(f"{mu_x:.3} +/- {sem_x:.3} vs. {mu_y:.3} +/- {sem_y:.3}")
-    print(f"t({df}) = {t:.3}, p = {p:.3}")
+    print(format_ttest(result))
+
+    values = dict(
+        _ttest_values(result), mean_x=mu_x, sem_x=sem_x, mean_y=mu_y, sem_y=sem_y
+    )
+    record_result("ttest_rel", values, label=label, **context)
 
 
-def report_ttest_1_sample(x, population_mean=0.0, print_mean_var=False):
+def report_ttest_1_sample(
+    x, population_mean=0.0, print_mean_var=False, label=None, **context
+):
     """
     Reports results of a 2-sample matched pairs t test
 
@@ -47,13 +221,17 @@ def report_ttest_1_sample(x, population_mean=0.0, print_mean_var=False):
         x (array): vector whose mean is to be compared against the population mean
         population_mean (float): the mean against which to compare the mean of x
         print_mean_var (bool): whether or not to also print mean and variance of x
+        label (str), context: recorded with the result, see
+            submm.utils.results_store.record_result
     """
-    t, p = ss.ttest_1samp(x, population_mean)
-    df = x.shape[0] - 1
+    result = ttest_1samp(x, population_mean, correction=None)
 
     mu_x = x.mean()
     sem_x = sem(x)
 
     if print_mean_var:
         print(f"{mu_x:.2} +/- {sem_x:.3}")
-    print(f"t({df}) = {t:.3}, p = {p:.3}")
+    print(format_ttest(result))
+
+    values = dict(_ttest_values(result), mean_x=mu_x, sem_x=sem_x)
+    record_result("ttest_1samp", values, label=label, **context)
@@ -0,0 +1,78 @@
+"""
+Sequential ANOVA against nested least-squares fits
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.stats import f as f_distribution
+
+from submm.utils.anova import aov, parse_formula
+
+
+def _rss(X, y):
+    weights = np.linalg.lstsq(X, y, rcond=None)[0]
+    return np.sum((y - X @ weights) ** 2), np.linalg.matrix_rank(X)
+
+
+def test_aov_matches_nested_fits():
+    random_state = np.random.RandomState(0)
+
+    # unbalanced, so that sequential sums of squares depend on the term order
+    n_obs = 53
+    data = pd.DataFrame(
+        {
+            "group": random_state.choice(["a", "b", "c"], n_obs, p=[0.5, 0.3, 0.2]),
+            "site": random_state.choice(["x", "y"], n_obs),
+            "depth": random_state.rand(n_obs),
+        }
+    )
+    data["values"] = (
+        (data["group"] == "b") + 2 * data["depth"] * (data["site"] == "y")
+    ) + random_state.randn(n_obs)
+
+    table = aov(
+        data,
+        "values ~ group + site + depth + group*site + site*depth + (1 | subjects)",
+        numeric=["depth"],
+    )
+
+    # reference: add the columns of each term in order and take the drop in RSS
+    group = pd.get_dummies(data["group"], drop_first=True).values.astype(float)
+    site = pd.get_dummies(data["site"], drop_first=True).values.astype(float)
+    depth = data[["depth"]].values
+    term_columns = {
+        "group": group,
+        "site": site,
+        "depth": depth,
+        "group:site": group * site,
+        "site:depth": site * depth,
+    }
+    y = data["values"].values
+
+    X = np.ones((n_obs, 1))
+    previous_rss, previous_rank = _rss(X, y)
+    for term, columns in term_columns.items():
+        X = np.hstack((X, columns))
+        rss, rank = _rss(X, y)
+        assert table.loc[term, "Df"] == rank - previous_rank
+        assert np.isclose(table.loc[term, "Sum Sq"], previous_rss - rss)
+        previous_rss, previous_rank = rss, rank
+
+    residual_df = n_obs - previous_rank
+    assert table.loc["Residuals", "Df"] == residual_df
+    assert np.isclose(table.loc["Residuals", "Sum Sq"], previous_rss)
+
+    F = table.loc["group", "Mean Sq"] / (previous_rss / residual_df)
+    assert np.isclose(table.loc["group", "F value"], F)
+    assert np.isclose(
+        table.loc["group", "Pr(>F)"], f_distribution.sf(F, 2, residual_df)
+    )
+    assert np.isclose(table["eta_sq"].sum(), 1 - previous_rss / np.var(y) / n_obs)
+
+
+def test_parse_formula_orders_terms_by_degree():
+    response, terms = parse_formula("v ~ a + b + a*b*c + (1 | subjects)")
+    assert response == "v"
+    assert terms[:3] == [("a",), ("b",), ("c",)]
+    assert terms[-1] == ("a", "b", "c")
+    assert all(len(a) <= len(b) for a, b in zip(terms, terms[1:]))
@@ -0,0 +1,48 @@
+"""
+Batched bootstrap confidence intervals against scipy.stats.bootstrap
+"""
+
+import numpy as np
+import pytest
+from scipy.stats import bootstrap
+
+from submm.utils.bootstrap import bootstrap_ci, draw_bootstrap_indices
+
+N_BOOT = 20000
+
+
+@pytest.mark.parametrize(
+    "method, scipy_method", [("bca", "BCa"), ("percentile", "percentile")]
+)
+def test_intervals_match_scipy(method, scipy_method):
+    # skewed samples, so that the BCa corrections matter
+    values = np.random.RandomState(0).gamma(2, size=(12, 4))
+
+    ci = bootstrap_ci(
+        values, draw_bootstrap_indices(12, N_BOOT, seed=1), axis=0, method=method
+    )
+    expected = bootstrap(
+        (values,),
+        np.mean,
+        axis=0,
+        n_resamples=N_BOOT,
+        method=scipy_method,
+        random_state=np.random.RandomState(2),
+    ).confidence_interval
+
+    # different resamples, so the bounds agree up to Monte Carlo error
+    width = expected.high - expected.low
+    assert np.allclose(ci.estimate, values.mean(axis=0))
+    assert np.all(np.abs(ci.low - expected.low) < 0.05 * width)
+    assert np.all(np.abs(ci.high - expected.high) < 0.05 * width)
+
+
+def test_every_element_is_bootstrapped_separately():
+    values = np.random.RandomState(3).rand(3, 2, 9)
+    indices = draw_bootstrap_indices(9, 500, seed=0)
+
+    ci = bootstrap_ci(values, indices, axis=-1)
+
+    for idx in np.ndindex(3, 2):
+        single = bootstrap_ci(values[idx], indices)
+        assert np.allclose([x[idx] for x in ci], single)
@@ -0,0 +1,65 @@
+"""
+Batched RDM fits against scipy and numpy references
+"""
+
+import numpy as np
+from scipy.optimize import nnls
+
+from submm.utils.designs import get_design
+from submm.utils.rsm_utils import fit_rdms
+
+
+def test_lsq_matches_lstsq():
+    design = get_design(30, with_diagonal=True)
+    rdms = np.random.RandomState(0).rand(4, 5, design.X.shape[0])
+
+    weights = fit_rdms(rdms, design)
+
+    expected = np.linalg.lstsq(design.X, rdms.reshape(-1, rdms.shape[-1]).T, rcond=None)
+    assert np.allclose(weights.reshape(-1, design.X.shape[1]), expected[0].T)
+
+
+def test_nnls_matches_scipy():
+    random_state = np.random.RandomState(0)
+    design = get_design(10, with_diagonal=False)
+
+    # targets from weights of mixed sign, so that some constraints are active
+    true_weights = random_state.randn(200, design.X.shape[1])
+    rdms = true_weights @ design.X.T + 0.5 * random_state.randn(200, design.X.shape[0])
+
+    weights = fit_rdms(rdms, design, method="nnls")
+
+    expected = np.array([nnls(design.X, rdm)[0] for rdm in rdms])
+    assert np.all(weights >= 0)
+    assert np.any(expected == 0), "no active constraints were tested"
+    assert np.allclose(weights, expected, atol=1e-8)
+
+
+def test_nnls_with_regressor_arrays():
+    random_state = np.random.RandomState(1)
+    regressors = random_state.rand(3, 45)
+    rdms = random_state.randn(20, 45)
+
+    weights = fit_rdms(rdms, regressors, method="nnls")
+
+    expected = np.array([nnls(regressors.T, rdm)[0] for rdm in rdms])
+    assert np.allclose(weights, expected, atol=1e-8)
+
+
+def test_fit_statistics_of_perfect_and_constant_fits():
+    design = get_design(30, with_diagonal=True)
+    random_state = np.random.RandomState(2)
+    rdms = np.array(
+        [
+            random_state.rand(design.X.shape[0]),
+            np.full(design.X.shape[0], 0.7),
+            design.X @ [1.0, 2.0, 3.0, 0.5],
+        ]
+    )
+
+    with np.errstate(all="raise"):
+        fit = fit_rdms(rdms, design, return_fit=True)
+
+    assert np.all(np.isfinite([fit.r2[0], fit.aic[0], fit.bic[0]]))
+    assert np.isnan(fit.r2[1]) and np.isclose(fit.r2[2], 1)
+    assert np.all(np.isnan(fit.aic[1:])) and np.all(np.isnan(fit.bic[1:]))
@@ -0,0 +1,78 @@
+"""
+Importing the utilities used by the stats scripts, or the scripts themselves, must
+not load the heavy dependencies, which are imported by the functions that need them
+"""
+
+import glob
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+LIGHT_MODULES = [
+    "submm.utils.rsm_utils",
+    "submm.utils.stats",
+    "submm.utils.os_utils",
+    "submm.utils.reliability",
+    "submm.utils.bootstrap",
+    "submm.utils.designs",
+    "submm.utils.results_store",
+    "submm.utils.labelled",
+]
+HEAVY_MODULES = ["scipy", "matplotlib", "sklearn"]
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATS_SCRIPTS = sorted(glob.glob(f"{REPO_DIR}/stats/*.py"))
+
+# loose budget in seconds for importing everything a stats script imports, about
+# ten times what it takes without the heavy dependencies
+IMPORT_TIME_BUDGET = 2.0
+
+
+def _import_in_fresh_interpreter(statements, cwd=REPO_DIR):
+    """
+    Runs import statements in a new interpreter, so modules imported by other tests
+    don't count
+
+    Returns
+        loaded (list): the HEAVY_MODULES that were imported
+        seconds (float): time taken by the statements
+    """
+    code = "\n".join(
+        [
+            "import json, sys, time",
+            "start = time.perf_counter()",
+            *statements,
+            "seconds = time.perf_counter() - start",
+            f"loaded = [m for m in {HEAVY_MODULES!r} if m in sys.modules]",
+            "print(json.dumps([loaded, seconds]))",
+        ]
+    )
+    env = dict(os.environ, PYTHONPATH=REPO_DIR)
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=cwd,
+        env=env,
+        check=True,
+        stdout=subprocess.PIPE,
+    ).stdout.decode()
+    return json.loads(output.splitlines()[-1])
+
+
+def test_heavy_modules_not_imported():
+    loaded, _ = _import_in_fresh_interpreter(
+        [f"import {module}" for module in LIGHT_MODULES]
+    )
+    assert loaded == [], f"importing {LIGHT_MODULES} loaded {loaded}"
+
+
+@pytest.mark.parametrize("script", STATS_SCRIPTS, ids=os.path.basename)
+def test_stats_scripts_import_quickly(script):
+    # runs the script's imports and definitions, but not main()
+    loaded, seconds = _import_in_fresh_interpreter(
+        ["import runpy", f"runpy.run_path({script!r}, run_name='imports_only')"],
+        cwd=os.path.dirname(script),
+    )
+    assert loaded == [], f"importing {os.path.basename(script)} loaded {loaded}"
+    assert seconds < IMPORT_TIME_BUDGET, f"imports took {seconds:.2f} s"
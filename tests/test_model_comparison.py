@@ -0,0 +1,31 @@
+"""
+Leave-one-subject-out scores against refitting each fold from scratch
+"""
+
+import numpy as np
+
+from submm.utils.designs import get_design
+from submm.utils.model_comparison import get_submodels, loso_scores
+
+
+def test_loso_scores_match_refitting_each_fold():
+    design = get_design(10, with_diagonal=False)
+    rdms = np.random.RandomState(0).rand(6, 3, design.X.shape[0])
+
+    scores = loso_scores(rdms, design)
+
+    for model_idx, columns in enumerate(get_submodels(design).values()):
+        X = design.X[:, columns]
+        for subject in range(rdms.shape[0]):
+            for rdm_idx in range(rdms.shape[1]):
+                # fit the concatenated RDMs of the other subjects
+                others = np.delete(rdms[:, rdm_idx], subject, axis=0)
+                weights = np.linalg.lstsq(
+                    np.tile(X, (len(others), 1)), others.ravel(), rcond=None
+                )[0]
+
+                held_out = rdms[subject, rdm_idx]
+                rss = np.sum((held_out - X @ weights) ** 2)
+                tss = np.sum((held_out - held_out.mean()) ** 2)
+                expected = 1 - rss / tss
+                assert np.isclose(scores.values[model_idx, subject, rdm_idx], expected)
@@ -0,0 +1,30 @@
+"""
+Noise ceilings against recomputing each group mean
+"""
+
+import numpy as np
+import pytest
+from scipy.stats import pearsonr, spearmanr
+
+from submm.utils.noise_ceiling import noise_ceiling
+
+
+@pytest.mark.parametrize(
+    "method, correlate",
+    [
+        ("pearson", lambda a, b: pearsonr(a, b)[0]),
+        ("spearman", lambda a, b: spearmanr(a, b)[0]),
+    ],
+)
+def test_noise_ceiling_matches_brute_force(method, correlate):
+    rdms = np.random.RandomState(0).rand(6, 3, 45)
+
+    ceiling = noise_ceiling(rdms, method=method)
+
+    for subject in range(6):
+        others = np.delete(rdms, subject, axis=0)
+        for idx in range(3):
+            lower = correlate(rdms[subject, idx], others[:, idx].mean(axis=0))
+            upper = correlate(rdms[subject, idx], rdms[:, idx].mean(axis=0))
+            assert np.isclose(ceiling.lower[subject, idx], lower)
+            assert np.isclose(ceiling.upper[subject, idx], upper)
@@ -0,0 +1,42 @@
+"""
+Permutation nulls against refitting explicitly permuted RDMs
+"""
+
+import numpy as np
+import pytest
+
+from submm.utils.designs import get_design
+from submm.utils.permutation import draw_permutations, permutation_null
+from submm.utils.rsm_utils import fit_rdms, get_lower_tri
+
+
+def test_null_matches_refitting_permuted_rdms():
+    design = get_design(30, with_diagonal=False)
+    random_state = np.random.RandomState(0)
+    rdms = random_state.rand(2, 3, 30, 30)
+    rdms = (rdms + np.swapaxes(rdms, -1, -2)) / 2
+
+    null = permutation_null(rdms, design, n_permutations=20, seed=3, chunk_size=7)
+
+    for idx, permutation in enumerate(draw_permutations(30, 20, seed=3)):
+        permuted = rdms[..., permutation, :][..., permutation]
+        expected = fit_rdms(get_lower_tri(permuted, with_diagonal=False), design)
+        assert np.allclose(null[idx], expected)
+
+
+def test_null_can_be_split_across_workers():
+    design = get_design(10, with_diagonal=False)
+    rdms = np.random.RandomState(1).rand(4, 10, 10)
+
+    whole = permutation_null(rdms, design, n_permutations=30, seed=5)
+    parts = [
+        permutation_null(rdms, design, n_permutations=n, seed=5, start=start)
+        for start, n in [(0, 12), (12, 18)]
+    ]
+    assert np.array_equal(whole, np.concatenate(parts))
+
+
+def test_null_rejects_designs_with_the_diagonal():
+    design = get_design(10, with_diagonal=True)
+    with pytest.raises(AssertionError):
+        permutation_null(np.zeros((2, 10, 10)), design, n_permutations=1)
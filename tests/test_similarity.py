@@ -0,0 +1,67 @@
+"""
+Intersubject similarities against scipy.stats and brute force
+"""
+
+import itertools
+
+import numpy as np
+import pytest
+from scipy.stats import kendalltau, pearsonr, rankdata, spearmanr
+
+from submm.utils.similarity import kendall_tau_a, rank_data, subject_similarity
+
+
+def _with_ties(random_state, shape):
+    # few distinct values, so that there are ties within and across vectors
+    return random_state.randint(0, 6, shape).astype(float)
+
+
+def _kendall_tau_a_brute_force(x, y):
+    pairs = list(itertools.combinations(range(len(x)), 2))
+    signs = [np.sign(x[i] - x[j]) * np.sign(y[i] - y[j]) for i, j in pairs]
+    return np.sum(signs) / len(pairs)
+
+
+def test_rank_data_matches_scipy():
+    x = _with_ties(np.random.RandomState(0), (4, 3, 37))
+    assert np.array_equal(rank_data(x), rankdata(x, axis=-1))
+
+
+@pytest.mark.parametrize("n", [2, 7, 16, 33])
+def test_kendall_tau_a_matches_brute_force(n):
+    random_state = np.random.RandomState(n)
+    x, y = _with_ties(random_state, (2, 5, n))
+
+    tau = kendall_tau_a(rank_data(x), rank_data(y))
+
+    for idx in range(5):
+        assert np.isclose(tau[idx], _kendall_tau_a_brute_force(x[idx], y[idx]))
+
+
+def test_kendall_tau_a_matches_scipy_without_ties():
+    x, y = np.random.RandomState(1).rand(2, 10, 45)
+    tau = kendall_tau_a(rank_data(x), rank_data(y))
+    expected = [kendalltau(a, b).statistic for a, b in zip(x, y)]
+    assert np.allclose(tau, expected)
+
+
+@pytest.mark.parametrize(
+    "method, reference",
+    [
+        ("pearson", lambda a, b: pearsonr(a, b)[0]),
+        ("spearman", lambda a, b: spearmanr(a, b)[0]),
+        ("kendall", _kendall_tau_a_brute_force),
+    ],
+)
+def test_subject_similarity_matches_pairwise_references(method, reference):
+    vectors = _with_ties(np.random.RandomState(2), (2, 5, 40))
+    vectors[1, 3] = np.nan
+
+    similarity = subject_similarity(vectors, method=method)
+
+    for batch, a, b in itertools.product(range(2), range(5), range(5)):
+        if batch == 1 and 3 in [a, b]:
+            assert np.isnan(similarity[batch, a, b])
+            continue
+        expected = reference(vectors[batch, a], vectors[batch, b])
+        assert np.isclose(similarity[batch, a, b], expected)